@@ -1,10 +1,21 @@
 import streamlit as st
-from script import create_rules_list, inference
-from groq_models import groq_inference, video_card_generation
-from video_processing import transcribe_audio_with_whisper, extract_audio_from_video, video_media_processing
+from script import create_rules_list
+from groq_models import video_card_generation
+from pipeline import Pipeline
+from review_pipeline import add_media_tasks, add_rule_tasks
+from routing import get_router
+from retrieval import DEFAULT_RETRIEVAL_TOP_N, RETRIEVAL_MIN_TOKENS
+from clients import get_connection_stats
+from cache import get_cache
+from artifact_store import get_artifact_store
+from settings import get_settings
+from tracing import export_spans, prometheus_text, span, start_metrics_server, trace_breakdown
+import json
 import time
 import os
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import uuid
+from contextlib import closing
 
 
 default_sales_deck="""Welcome to BrightFuture Investments! We are dedicated to providing top-notch investment opportunities tailored to your financial goals. With our expert team and innovative strategies, your financial future is in safe hands. At BrightFuture Investments, we understand the complexities of the financial market and strive to simplify the investment process for you. Our mission is to help you achieve your financial aspirations with confidence and ease.
@@ -42,8 +53,124 @@ Ensure the output is following this JSON schema:
 default_rules = """Fair and Balanced Representation of Risks and Benefits##Clear Disclosure of Fees and Costs"""
 
 
+def render_rule_verdict(elm):
+    """Display the verdict of one rule."""
+    rule = elm['rule_name']
+    label = elm['label']
+    parts_list = elm['part']
+    suggestion_list = elm['suggestion']
+    st.write(f"Rule name {rule}")
+    if elm.get("error"):
+        st.warning(f"The rule could not be reviewed: {elm['error']}")
+    elif label:
+        st.write("Respected: ✔️")
+    else:
+        st.write("Not Respected: ❌")
+        for i in range(len(parts_list)):
+            part = parts_list[i]
+            with st.expander(f"Part {i+1}: {part}"):
+                suggestion = suggestion_list[i]
+                st.write(f"Responsible text part: {part}")
+                st.write(f"Suggestion: {suggestion}")
+
+
+def render_disclaimer(video_review_output):
+    """Display the result of the disclaimer check."""
+    disclaimer_status = video_review_output["disclaimer_is_exist"]
+    disclaimer_text = video_review_output["disclaimer_text"]
+    if video_review_output.get("error"):
+        st.warning(f"The disclaimer check failed: {video_review_output['error']}")
+    elif disclaimer_status:
+        st.write("Disclaimer Exist ✔️")
+        st.write("Disclaimer: ", disclaimer_text)
+    else:
+        st.write("No disclaimer found! Please add one ⚠️")
+
+
+def get_upload_path(video_file):
+    """Return the artifact store path of the uploaded video, stored once per upload rather than on every rerun."""
+    artifact_store = get_artifact_store()
+    current = st.session_state.get("upload")
+    if current is not None and current[0] == video_file.file_id and os.path.exists(current[1]):
+        artifact_store.touch(current[1])
+        return current[1]
+    # Stream the upload to the artifact store, identical uploads are stored once
+    with span("upload_write", filename=video_file.name, bytes=video_file.size):
+        path = artifact_store.save_upload(video_file, video_file.name)
+    st.session_state["upload"] = (video_file.file_id, path)
+    return path
+
+
+def get_media_pipeline(video_path, audio_path, video_hash):
+    """Return the pipeline of the uploaded video, started on upload so the transcription and the
+    frame OCR run while the user sets up the review. A new upload cancels the previous one's."""
+    current = st.session_state.get("media_pipeline")
+    if current is not None and current[0] == video_hash:
+        return current[1]
+    if current is not None:
+        current[1].cancel()
+    pipeline = Pipeline()
+    add_media_tasks(pipeline, video_path, audio_path, video_hash)
+    st.session_state["media_pipeline"] = (video_hash, pipeline)
+    return pipeline
+
+
+def render_timings(pipeline):
+    """Display the duration of each task of the pipeline and its critical path."""
+    path, total = pipeline.critical_path()
+    with st.expander(f"Task timings (critical path {total:.2f}s: {' → '.join(path)})"):
+        for name, timing in pipeline.timings().items():
+            if timing["finished"] is None:
+                st.write(f"{name}: {timing['status']}")
+            else:
+                st.write(f"{name}: {timing['status']}, started at {timing['started'] or 0:.2f}s, "
+                         f"finished at {timing['finished']:.2f}s ({timing['run_seconds'] or 0:.2f}s)")
+
+
+def render_critical_path(pipeline):
+    """Display where the time of the last review went: the tasks of its critical path and the stages inside each."""
+    path, total = pipeline.critical_path()
+    timings = pipeline.timings()
+    with st.expander(f"Critical path of the last review ({total:.2f}s since upload)"):
+        for name in path:
+            timing = timings[name]
+            st.write(f"**{name}**: ready at {timing['ready'] or 0:.2f}s, ran for {timing['run_seconds'] or 0:.2f}s")
+            rows = trace_breakdown(pipeline.trace_id, timing["span_id"]) if timing["span_id"] else []
+            if rows:
+                st.dataframe(rows, hide_index=True)
+        st.download_button("Download spans (OTLP JSON)", json.dumps(export_spans(pipeline.trace_id)),
+                           file_name=f"trace-{pipeline.trace_id}.json", mime="application/json")
+        st.download_button("Download metrics (Prometheus)", prometheus_text(), file_name="metrics.prom", mime="text/plain")
+
+
+def render_routing_stats(stats):
+    """Display the rolling latency of every backend and how often requests were hedged."""
+    with st.expander(f"Routing: {stats['requests']} requests, {stats['hedged']} hedged ({stats['hedge_wins']} won by the copy), "
+                     f"{stats['failovers']} failed over"):
+        rows = [
+            {"backend": name, "samples": backend["samples"],
+             "p50 (s)": None if backend["p50"] is None else round(backend["p50"], 2),
+             "p95 (s)": None if backend["p95"] is None else round(backend["p95"], 2),
+             "error rate": f"{backend['error_rate']:.0%}"}
+            for name, backend in stats["backends"].items()
+        ]
+        st.dataframe(rows, hide_index=True)
+
+
+def get_session_id():
+    """Return an identifier unique to the current browser session."""
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+    return st.session_state["session_id"]
+
+
 # Define the main function
 def main():
+    # Prometheus /metrics and OTLP /traces endpoints, when a port is configured
+    settings = get_settings()
+    if settings.metrics_port:
+        start_metrics_server(settings.metrics_port, settings.metrics_host)
+
     # Set the title of the app
     st.title('Poc: Prompt Testing & Enhancement')
     st.divider()
@@ -53,31 +180,22 @@ def main():
     video_file = st.file_uploader("Upload a Video", type=["mp4", "mov", "avi", "mkv"])
 
     if video_file is not None:
-        # Create the directory if it doesn't exist
-        temp_video_dir = "temp_video"
-        os.makedirs(temp_video_dir, exist_ok=True)
-        # Save the uploaded video to the directory
-        temp_video_path = os.path.join(temp_video_dir, video_file.name)
-        with open(temp_video_path, "wb") as f:
-            f.write(video_file.read())
-        
-        if video_file is not None:
-            # Create the directory for the audio if it doesn't exist
-            temp_audio_dir = "temp_audio"
-            os.makedirs(temp_audio_dir, exist_ok=True)
-            # Define the path for the extracted audio file
-            temp_audio_path = os.path.join(temp_audio_dir, "extracted_audio.mp3")
-            # Extract audio from the video
-            audio_path = extract_audio_from_video(temp_video_path, temp_audio_path)
-        
-        st.success("Audio extracted successfully!")
+        artifact_store = get_artifact_store()
+        temp_video_path = get_upload_path(video_file)
+        video_hash = artifact_store.blob_hash(temp_video_path)
+        # The extracted audio is kept per session so concurrent users never overwrite each other
+        temp_audio_path = artifact_store.session_path(get_session_id(), f"{video_hash}.mp3")
 
         # Display the video
         st.video(video_file)
 
-        # Transcribe the audio using Whisper
-        st.write("Transcribing audio...")
-        sales_deck = transcribe_audio_with_whisper(audio_path)
+        # Transcription and frame OCR start right away and run concurrently
+        media_pipeline = get_media_pipeline(temp_video_path, temp_audio_path, video_hash)
+
+        # Extract and transcribe the audio using Whisper, unless this video was already transcribed
+        with st.spinner("Transcribing audio..."):
+            sales_deck = media_pipeline.result("transcript")
+        st.success("Audio transcribed successfully!")
         st.text_area("Video Transcript:", sales_deck, height=250)
     st.divider()
     st.subheader('✨ AI Model Selection')
@@ -101,6 +219,15 @@ def main():
         model_name = 'gemma2-9b-it'
         st.info("Rate limit: 30 Request Per Minute")
 
+    routing = st.checkbox("Route rules to the fastest model", value=False,
+                          help="Send each rule to the Groq or Gemini model with the lowest recent latency and rate limit "
+                               "headroom, keeping the selected model when comparable, and send a copy of slow requests "
+                               "to the next best model.")
+    retrieval = st.checkbox("Send each rule only the relevant passages of long transcripts", value=False,
+                            help=f"For transcripts over {RETRIEVAL_MIN_TOKENS} tokens, send each rule its "
+                                 f"{DEFAULT_RETRIEVAL_TOP_N} most relevant passages instead of the whole transcript; "
+                                 "inconclusive verdicts are checked again on the whole transcript.")
+
     # st.divider()
     # st.subheader('Enter Sales Deck to evaluate here: ')
     # sales_deck = st.text_area("Sales Deck:", value=default_sales_deck, height=250)
@@ -122,49 +249,79 @@ def main():
     st.subheader('Model Output')
     # Call the generate function
     generate_output = st.button('Generate output')
-    if generate_output:
-        start = time.time()
-        with st.spinner(text="Reviewing In progress..."):
-            with ThreadPoolExecutor() as executor:
-                # Submit both tasks to run in parallel
-                future_transcript = executor.submit(groq_inference, system_message, model_name, rules_list, sales_deck)
-                future_video = executor.submit(video_media_processing, temp_video_path)
-                
-                # Get results
-                transcript_review_output = future_transcript.result()
-                video_review_output = future_video.result()
-                output = {'transcript_review_output': transcript_review_output, 'video_review_output': video_review_output}
+    if generate_output and video_file is None:
+        st.warning("Upload a video to review first.")
+    elif generate_output:
+        # Cancel the review still running for previous inputs, if any
+        previous_cancel_event = st.session_state.get("review_cancel_event")
+        if previous_cancel_event is not None:
+            previous_cancel_event.set()
+        cancel_event = threading.Event()
+        st.session_state["review_cancel_event"] = cancel_event
 
-        end = time.time()
+        run_id = uuid.uuid4().hex[:8]
+        st.session_state["product_card"] = None
+        run_tasks = add_rule_tasks(media_pipeline, system_message, model_name, rules_list, run_id=run_id,
+                                   cancel_event=cancel_event, routing=routing,
+                                   retrieval_top_n=DEFAULT_RETRIEVAL_TOP_N if retrieval else None)
 
-        st.write(f"Reviewing Duration: {end-start:.2f} seconds")
+        start = time.time()
+        rules_progress = st.progress(0.0, text="Reviewing rules...")
+        frames_status = st.empty()
 
         st.subheader("Audio Media reviewing results")
-        for elm in output['transcript_review_output']:
-            rule = elm['rule_name']
-            label = elm['label']
-            parts_list = elm['part']
-            suggestion_list = elm['suggestion']
-            st.write(f"Rule name {rule}")
-            if label:
-                st.write("Respected: ✔️")
-            else:
-                st.write("Not Respected: ❌")
-                for i in range(len(parts_list)):
-                    part = parts_list[i]
-                    with st.expander(f"Part {i+1}: {part}"):
-                        suggestion = suggestion_list[i]
-                        st.write(f"Responsible text part: {part}")
-                        st.write(f"Suggestion: {suggestion}")
-                    
+        # One slot per rule so verdicts are displayed in rule order whatever order they arrive in
+        rule_slots = [st.empty() for _ in rules_list]
         st.subheader("Video Media reviewing results")
-        disclaimer_status = output['video_review_output']["disclaimer_is_exist"]
-        disclaimer_text = output['video_review_output']["disclaimer_text"]
-        if disclaimer_status:
-            st.write("Disclaimer Exist ✔️")
-            st.write("Disclaimer: ", disclaimer_text)
-        else:
-            st.write("No disclaimer found! Please add one ⚠️")
+        disclaimer_slot = st.empty()
+        disclaimer_slot.write("Extracting on-screen text...")
+        frame_texts_expander = st.expander("Text extracted from frames")
+
+        rules_done = 0
+        frames_done = 0
+        review_finished = False
+        try:
+            # Replays the frames already OCR'd since the upload, then follows this run's tasks
+            with closing(media_pipeline.iter_events(until=run_tasks + ["disclaimer"])) as review_events:
+                for event in review_events:
+                    if cancel_event.is_set():
+                        break
+                    if event.get("run", run_id) != run_id:
+                        continue
+                    if event["stage"] == "task" and event["status"] == "failed" and event["task"] in run_tasks + ["disclaimer"]:
+                        st.error(f"{event['task']} failed: {event['error']}")
+                    elif event["stage"] == "rule":
+                        rules_done += 1
+                        rules_progress.progress(rules_done / event["total"], text=f"Rules reviewed: {rules_done}/{event['total']}")
+                        with rule_slots[event["index"]].container():
+                            render_rule_verdict(event["verdict"])
+                    elif event["stage"] == "frame":
+                        frames_done += 1
+                        frames_status.caption(f"Frames processed: {frames_done}")
+                        if event["text"]:
+                            frame_texts_expander.write(f"{event['timestamp']:.1f}s: {event['text']}")
+                    elif event["stage"] == "disclaimer":
+                        with disclaimer_slot.container():
+                            render_disclaimer(event["result"])
+                    elif event["stage"] == "product_card":
+                        st.session_state["product_card"] = event["card"]
+            review_finished = True
+        finally:
+            if not review_finished:
+                # A rerun (an input changed) stops the script here, stop this run's rules and product card too
+                cancel_event.set()
+
+        end = time.time()
+
+        st.write(f"Reviewing Duration: {end-start:.2f} seconds")
+        render_timings(media_pipeline)
+        render_critical_path(media_pipeline)
+        connection_stats = get_connection_stats()
+        st.caption(f"HTTP requests: {connection_stats['requests']}, reused connections: {connection_stats['reused_connections']} ({connection_stats['reuse_ratio']:.0%})")
+        cache_stats = get_cache().stats()
+        st.caption(f"Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+        if routing:
+            render_routing_stats(get_router().stats())
 
         # st.divider()
         # st.subheader("Raw results")
@@ -177,10 +334,15 @@ def main():
     st.divider()
     st.subheader('Product card')
     generate_model_card = st.button('Product card')
-    if generate_model_card:
+    if generate_model_card and video_file is None:
+        st.warning("Upload a video to generate its product card.")
+    elif generate_model_card:
+        # Usually already generated alongside the rules, otherwise generated (or read from the cache) now
         with st.spinner(text="Generation In progress..."):
             video_card = video_card_generation(sales_deck, model_name)
         st.markdown(video_card)
+    elif generate_output and st.session_state.get("product_card"):
+        st.markdown(st.session_state["product_card"])
 
 
 # Run the app
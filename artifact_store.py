@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR = "artifacts"
+
+# Uploads are copied to disk by chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Artifacts not used for this long are evicted
+MAX_ARTIFACT_AGE_SECONDS = 24 * 3600
+
+# Above this total size the least recently used artifacts are evicted
+MAX_ARTIFACTS_BYTES = 5 * 1024 ** 3
+
+EVICTION_INTERVAL_SECONDS = 600
+
+
+class ArtifactStore:
+    """Disk store for uploaded videos and the files derived from them.
+
+    Uploads are stored once by content hash under `blobs/`, so identical uploads from
+    different users share the same file. Per-session artifacts (extracted audio, ...)
+    live under `sessions/<session_id>/` so concurrent sessions never overwrite each other.
+    Files are evicted by age (since last use) and by total size.
+    """
+
+    def __init__(self, root=ARTIFACTS_DIR, max_age_seconds=MAX_ARTIFACT_AGE_SECONDS, max_bytes=MAX_ARTIFACTS_BYTES):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.sessions_dir = os.path.join(root, "sessions")
+        self.tmp_dir = os.path.join(root, "tmp")
+        for directory in (self.blobs_dir, self.sessions_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._eviction_thread = None
+        self._stop_eviction = threading.Event()
+
+    def save_upload(self, fileobj, filename, chunk_size=UPLOAD_CHUNK_SIZE):
+        """Stream an uploaded file to disk by chunks and return the path of its content-addressed copy."""
+        extension = os.path.splitext(filename)[1].lower()
+        digest = hashlib.sha256()
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+        with tempfile.NamedTemporaryFile(dir=self.tmp_dir, suffix=extension, delete=False) as tmp_file:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+                digest.update(chunk)
+                tmp_file.write(chunk)
+
+        blob_path = os.path.join(self.blobs_dir, f"{digest.hexdigest()}{extension}")
+        if os.path.exists(blob_path):
+            # Identical upload already stored, keep a single copy
+            os.remove(tmp_file.name)
+            self.touch(blob_path)
+        else:
+            os.replace(tmp_file.name, blob_path)
+        return blob_path
+
+    @staticmethod
+    def blob_hash(blob_path):
+        """SHA-256 of an upload's content, read from the name of the path returned by `save_upload`."""
+        return os.path.splitext(os.path.basename(blob_path))[0]
+
+    def session_path(self, session_id, filename):
+        """Return the path of a per-session artifact, creating the session directory."""
+        session_dir = os.path.join(self.sessions_dir, session_id)
+        os.makedirs(session_dir, exist_ok=True)
+        return os.path.join(session_dir, filename)
+
+    @staticmethod
+    def touch(path):
+        """Mark an artifact as used so it is not evicted as stale."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _artifacts(self):
+        for directory in (self.blobs_dir, self.sessions_dir):
+            for dir_path, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    path = os.path.join(dir_path, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_mtime, stat.st_size
+
+    def evict(self):
+        """Remove artifacts unused for `max_age_seconds`, then the oldest ones above `max_bytes`."""
+        now = time.time()
+        artifacts = sorted(self._artifacts(), key=lambda artifact: artifact[1])
+        total = sum(size for _, _, size in artifacts)
+        removed = 0
+        for path, modified_at, size in artifacts:
+            if now - modified_at <= self.max_age_seconds and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        # Drop the directories of sessions without artifacts left
+        for session_id in os.listdir(self.sessions_dir):
+            session_dir = os.path.join(self.sessions_dir, session_id)
+            if os.path.isdir(session_dir) and not os.listdir(session_dir):
+                shutil.rmtree(session_dir, ignore_errors=True)
+
+        if removed:
+            logger.info(f"Evicted {removed} artifacts, {total / 1024 ** 2:.0f} MB left")
+        return removed
+
+    def start_background_eviction(self, interval_seconds=EVICTION_INTERVAL_SECONDS):
+        """Run `evict` periodically in a daemon thread (once per store)."""
+        if self._eviction_thread is not None:
+            return
+
+        def run():
+            while not self._stop_eviction.wait(interval_seconds):
+                try:
+                    self.evict()
+                except Exception as e:
+                    logger.error(f"Artifact eviction failed: {e}")
+
+        self._eviction_thread = threading.Thread(target=run, name="artifact-eviction", daemon=True)
+        self._eviction_thread.start()
+
+    def stop_background_eviction(self):
+        self._stop_eviction.set()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Return the artifact store shared by every session, with background eviction running."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+            _store.start_background_eviction()
+        return _store
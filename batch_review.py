@@ -0,0 +1,253 @@
+"""Review a whole directory or manifest of videos without the Streamlit app.
+
+Run from the repository root:
+
+    python batch_review.py videos/ --rules rules.txt --output results.jsonl
+    python batch_review.py manifest.jsonl --rules rules.txt --output results.parquet --parallel 4
+
+The input is a directory (every video file in it, recursively) or a JSONL manifest with one
+{"video": path, "id": optional identifier} object per line. The rules file holds the rules
+separated by "##", as typed in the app. Every reviewed video is appended to a JSONL checkpoint
+(<output>.checkpoint.jsonl) as soon as it is done, so an interrupted run resumes where it
+stopped when started again; the output is written from the checkpoint at the end, with one
+record per successfully reviewed video.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pipeline import Pipeline
+from retrieval import DEFAULT_RETRIEVAL_TOP_N
+from review_pipeline import add_media_tasks, add_rule_tasks
+from script import create_rules_list
+
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+
+DEFAULT_MODEL = "llama-3.1-70b-versatile"
+
+# Videos reviewed at the same time, each one already runs its stages and rules concurrently
+DEFAULT_PARALLEL_VIDEOS = 2
+
+# Fields stored as JSON strings in Parquet files, their structure varies between rows
+NESTED_FIELDS = ("verdicts", "disclaimer", "timings", "critical_path")
+
+
+def load_videos(input_path):
+    """List the videos to review as {"id", "video"} dicts, from a directory or a JSONL manifest."""
+    if os.path.isdir(input_path):
+        videos = []
+        for dir_path, _, filenames in os.walk(input_path):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(VIDEO_EXTENSIONS):
+                    path = os.path.join(dir_path, filename)
+                    videos.append({"id": os.path.relpath(path, input_path), "video": path})
+        return sorted(videos, key=lambda video: video["id"])
+
+    videos = []
+    manifest_dir = os.path.dirname(os.path.abspath(input_path))
+    with open(input_path) as manifest:
+        for line in manifest:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            path = entry["video"]
+            if not os.path.isabs(path):
+                path = os.path.join(manifest_dir, path)
+            videos.append({"id": str(entry.get("id", entry["video"])), "video": path})
+    return videos
+
+
+def load_rules(rules_path):
+    """Read the rules file, rules separated by "##" as in the app."""
+    with open(rules_path) as rules_file:
+        return [rule for rule in create_rules_list(rules_file.read()) if rule.strip()]
+
+
+def load_checkpoint(checkpoint_path):
+    """Return the records of the videos already reviewed successfully, by id (last record wins)."""
+    records = {}
+    if not os.path.exists(checkpoint_path):
+        return records
+    with open(checkpoint_path) as checkpoint:
+        for line in checkpoint:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Line cut short by a crash
+                continue
+            records[record["id"]] = record
+    return {video_id: record for video_id, record in records.items() if record.get("status") == "done"}
+
+
+def review_video(video, system_message, model_name, rules_list, product_card=True, routing=False, retrieval_top_n=None):
+    """Review one video and return its result record, with the timing of every stage."""
+    start = time.perf_counter()
+    pipeline = Pipeline()
+    with tempfile.TemporaryDirectory() as work_dir:
+        try:
+            add_media_tasks(pipeline, video["video"], os.path.join(work_dir, "audio.mp3"))
+            tasks = add_rule_tasks(pipeline, system_message, model_name, rules_list, product_card=product_card,
+                                   routing=routing, retrieval_top_n=retrieval_top_n)
+            record = {
+                "id": video["id"],
+                "video": video["video"],
+                "model": model_name,
+                "transcript": pipeline.result("transcript"),
+                "verdicts": pipeline.result(tasks[0]),
+                "product_card": pipeline.result(tasks[1]) if product_card else None,
+                "disclaimer": pipeline.result("disclaimer"),
+                "status": "done",
+                "error": None,
+            }
+            failed_rules = [verdict["rule_name"] for verdict in record["verdicts"] if verdict and verdict.get("error")]
+            if failed_rules:
+                # Kept out of the output and reviewed again on resume, the verdicts already computed come from the cache
+                record["status"] = "failed"
+                record["error"] = f"{len(failed_rules)} rules could not be evaluated: {', '.join(failed_rules)}"
+        except Exception as e:
+            logger.error(f"Review of {video['id']} failed: {e}")
+            record = {"id": video["id"], "video": video["video"], "model": model_name, "status": "failed", "error": str(e)}
+        finally:
+            pipeline.cancel()
+
+    record["timings"] = {name.split(":")[-1]: timing["run_seconds"] for name, timing in pipeline.timings().items()}
+    record["critical_path"] = [name.split(":")[-1] for name in pipeline.critical_path()[0]]
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def write_jsonl(records, output_path):
+    """Write the records to a JSONL file, replacing it at once so readers never see it half written."""
+    temporary_path = f"{output_path}.tmp"
+    with open(temporary_path, "w") as output:
+        for record in records:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(temporary_path, output_path)
+
+
+def write_parquet(records, output_path):
+    """Write the records to a Parquet file, nested fields as JSON strings."""
+    import pandas as pd
+
+    rows = [
+        {key: json.dumps(value, ensure_ascii=False) if key in NESTED_FIELDS else value for key, value in record.items()}
+        for record in records
+    ]
+    pd.DataFrame(rows).to_parquet(output_path, index=False)
+
+
+def summarize(records, wall_seconds):
+    """Throughput and per-stage time breakdown of the reviewed videos."""
+    done = [record for record in records if record["status"] == "done"]
+    stages = {}
+    for record in done:
+        for stage, seconds in record["timings"].items():
+            if seconds is not None:
+                stages.setdefault(stage, []).append(seconds)
+    critical_stages = {}
+    for record in done:
+        for stage in record["critical_path"]:
+            critical_stages[stage] = critical_stages.get(stage, 0) + 1
+    return {
+        "videos": len(records),
+        "done": len(done),
+        "failed": len(records) - len(done),
+        "wall_seconds": wall_seconds,
+        "videos_per_hour": 3600 * len(done) / wall_seconds if wall_seconds else 0.0,
+        "mean_seconds_per_video": sum(record["seconds"] for record in done) / len(done) if done else 0.0,
+        "stages": {
+            stage: {"mean_seconds": sum(times) / len(times), "total_seconds": sum(times), "on_critical_path": critical_stages.get(stage, 0)}
+            for stage, times in stages.items()
+        },
+    }
+
+
+def review_videos(videos, rules_list, system_message, model_name=DEFAULT_MODEL, output_path="results.jsonl",
+                  checkpoint_path=None, parallel=DEFAULT_PARALLEL_VIDEOS, product_card=True, routing=False,
+                  retrieval_top_n=None):
+    """Review the videos `parallel` at a time, skipping the ones already in the checkpoint.
+
+    Each finished video is appended to the JSONL checkpoint, <output>.checkpoint.jsonl by
+    default, and the .jsonl or .parquet output is written from it at the end. All API calls
+    go through the shared per-model rate limiters. With `routing`, rules go to the fastest
+    backend with hedged requests, see `routing`. With `retrieval_top_n`, each rule of a long
+    transcript only gets its most relevant passages. Returns the summary of this run, see `summarize`.
+    """
+    if checkpoint_path is None:
+        checkpoint_path = f"{os.path.splitext(output_path)[0]}.checkpoint.jsonl"
+    reviewed = load_checkpoint(checkpoint_path)
+    pending = [video for video in videos if video["id"] not in reviewed]
+    if reviewed:
+        print(f"Resuming: {len(reviewed)} videos already reviewed, {len(pending)} left")
+
+    write_lock = threading.Lock()
+    records = []
+    start = time.perf_counter()
+    with open(checkpoint_path, "a") as checkpoint, ThreadPoolExecutor(max_workers=max(parallel, 1)) as executor:
+        futures = {executor.submit(review_video, video, system_message, model_name, rules_list, product_card, routing, retrieval_top_n): video for video in pending}
+        for position, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            records.append(record)
+            with write_lock:
+                checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+            print(f"[{position}/{len(pending)}] {record['id']}: {record['status']} in {record['seconds']:.1f}s")
+    summary = summarize(records, time.perf_counter() - start)
+
+    # Retried videos have several lines in the checkpoint, the output keeps their last successful one
+    reviewed = list(load_checkpoint(checkpoint_path).values())
+    if output_path.endswith(".parquet"):
+        write_parquet(reviewed, output_path)
+    else:
+        write_jsonl(reviewed, output_path)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="directory of videos or JSONL manifest")
+    parser.add_argument("--rules", required=True, help='rules file, rules separated by "##"')
+    parser.add_argument("--system-message", help="file holding the prompt, the app's default prompt otherwise")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--output", default="results.jsonl", help=".jsonl or .parquet")
+    parser.add_argument("--checkpoint", help="JSONL checkpoint, <output>.checkpoint.jsonl by default")
+    parser.add_argument("--parallel", type=int, default=DEFAULT_PARALLEL_VIDEOS, help="videos reviewed at the same time")
+    parser.add_argument("--no-product-card", action="store_true")
+    parser.add_argument("--routing", action="store_true",
+                        help="route each rule to the fastest Groq or Gemini model, hedging slow requests")
+    parser.add_argument("--retrieval-top-n", type=int, metavar="N",
+                        help=f"send each rule only its N most relevant passages of long transcripts, "
+                             f"e.g. {DEFAULT_RETRIEVAL_TOP_N}; the whole transcript by default")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.system_message:
+        with open(args.system_message) as system_message_file:
+            system_message = system_message_file.read()
+    else:
+        from app import default_system_message as system_message
+
+    summary = review_videos(
+        load_videos(args.input), load_rules(args.rules), system_message, args.model,
+        args.output, args.checkpoint, args.parallel, not args.no_product_card, args.routing, args.retrieval_top_n,
+    )
+    print(
+        f"Reviewed {summary['done']} videos ({summary['failed']} failed) in {summary['wall_seconds']:.0f}s, "
+        f"{summary['videos_per_hour']:.0f} videos/hour, {summary['mean_seconds_per_video']:.1f}s per video"
+    )
+    print(f"{'stage':<16} {'mean (s)':>9} {'total (s)':>10} {'critical':>9}")
+    for stage, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"{stage:<16} {stats['mean_seconds']:>9.2f} {stats['total_seconds']:>10.1f} {stats['on_critical_path']:>9}")
+
+
+if __name__ == "__main__":
+    main()
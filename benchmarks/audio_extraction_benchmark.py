@@ -0,0 +1,61 @@
+"""Compare the ffmpeg audio extraction with the former moviepy WAV export.
+
+Run from the repository root:
+
+    python -m benchmarks.audio_extraction_benchmark video.mp4 [--repeat 3]
+
+For each mode and output format it reports the best wall time over the repetitions
+and the size of the file that would be uploaded to Whisper.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from video_processing import extract_audio_from_video
+
+
+SCENARIOS = [
+    ("moviepy", ".mp3"),
+    ("ffmpeg", ".mp3"),
+    ("ffmpeg", ".ogg"),
+    ("ffmpeg", ".flac"),
+]
+
+
+def run_scenario(video_path, mode, extension, repeat, output_dir):
+    """Return (best wall time in seconds, output size in bytes) of one extraction scenario."""
+    output_path = os.path.join(output_dir, f"{mode}_audio{extension}")
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        audio_path = extract_audio_from_video(video_path, output_path, mode=mode)
+        timings.append(time.perf_counter() - start)
+    size = os.path.getsize(audio_path)
+    os.remove(audio_path)
+    return min(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video_path")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for mode, extension in SCENARIOS:
+            wall_time, size = run_scenario(args.video_path, mode, extension, args.repeat, output_dir)
+            results.append((mode, extension, wall_time, size))
+
+    baseline_time, baseline_size = results[0][2], results[0][3]
+    print(f"{'mode':<8} {'format':<6} {'time (s)':>9} {'size (KB)':>10} {'speedup':>8} {'smaller':>8}")
+    for mode, extension, wall_time, size in results:
+        print(
+            f"{mode:<8} {extension:<6} {wall_time:>9.2f} {size / 1024:>10.0f}"
+            f" {baseline_time / wall_time:>7.1f}x {baseline_size / size:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Measure the prompt savings of consolidating OCR texts before the disclaimer check.
+
+Run from the repository root:
+
+    python -m benchmarks.disclaimer_consolidation_benchmark [--fixtures benchmarks/fixtures/ocr_texts.json] [--check]
+
+For each fixture video it reports how many texts and prompt tokens are sent with and
+without consolidation. With --check it also runs the disclaimer check both ways (this
+calls the API) and reports whether the decision changed and matches the expected label.
+"""
+import argparse
+import json
+import os
+
+from rate_limiting import estimate_tokens
+from text_consolidation import consolidate_texts
+
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "ocr_texts.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--check", action="store_true", help="run the disclaimer check with and without consolidation")
+    args = parser.parse_args()
+
+    with open(args.fixtures) as fixtures_file:
+        fixtures = json.load(fixtures_file)
+
+    if args.check:
+        from video_processing import check_and_extract_disclaimer
+
+    total_raw = total_consolidated = 0
+    print(f"{'video':<30} {'texts':>6} {'kept':>5} {'tokens':>7} {'kept':>6} {'saved':>6}  decision")
+    for fixture in fixtures:
+        raw_texts = [frame["text"] for frame in fixture["frames"]]
+        clusters = consolidate_texts(fixture["frames"])
+        raw_tokens = estimate_tokens(f"{raw_texts}")
+        consolidated_tokens = estimate_tokens(f"{[cluster['text'] for cluster in clusters]}")
+        total_raw += raw_tokens
+        total_consolidated += consolidated_tokens
+
+        decision = ""
+        if args.check:
+            raw_result = check_and_extract_disclaimer(raw_texts, consolidate=False) or {}
+            consolidated_result = check_and_extract_disclaimer(fixture["frames"]) or {}
+            raw_flag = bool(raw_result.get("disclaimer_is_exist"))
+            consolidated_flag = bool(consolidated_result.get("disclaimer_is_exist"))
+            decision = (
+                f"{'same' if raw_flag == consolidated_flag else 'CHANGED'}"
+                f" ({'ok' if consolidated_flag == fixture['has_disclaimer'] else 'WRONG'})"
+            )
+
+        print(
+            f"{fixture['name']:<30} {len(raw_texts):>6} {len(clusters):>5} {raw_tokens:>7} {consolidated_tokens:>6}"
+            f" {1 - consolidated_tokens / raw_tokens:>6.0%}  {decision}"
+        )
+    print(f"{'total':<30} {'':>6} {'':>5} {total_raw:>7} {total_consolidated:>6} {1 - total_consolidated / total_raw:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Local stand-ins for the Groq (chat, vision, Whisper) and Gemini APIs, for offline benchmarks.
+
+The fakes answer with well-formed responses after a configurable latency, can inject
+errors and enforce their own requests-per-minute limit (answering with the SDK's rate
+limit error), and count the calls, uploaded bytes and tokens of every endpoint.
+They are installed through the client registry:
+
+    groq_client = FakeGroqClient(stats)
+    clients.set_groq_client(groq_client)
+    clients.set_generative_model_factory(FakeGeminiFactory(stats))
+"""
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import cv2
+import httpx
+import numpy as np
+from google.api_core.exceptions import ResourceExhausted
+from groq import RateLimitError
+
+from rate_limiting import estimate_tokens
+
+
+DISCLAIMER_TEXT = (
+    "Capital at risk. The value of investments can go down as well as up and you may get back "
+    "less than you invested. Past performance is not a reliable indicator of future results."
+)
+NO_TEXT_MESSAGE = "No text presented in the image"
+
+
+class EndpointConfig:
+    """Behaviour of one fake endpoint: latency (seconds, with uniform jitter), error rate and server-side rate limit.
+
+    A `slow_rate` share of the calls take `slow_latency` more seconds, the latency tail of a busy server.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit_error_rate=0.0, requests_per_minute=None,
+                 slow_rate=0.0, slow_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.rate_limit_error_rate = rate_limit_error_rate
+        self.requests_per_minute = requests_per_minute
+
+
+class FakeAPIStats:
+    """Calls, uploaded bytes, tokens and injected errors per endpoint, shared by the fakes of a run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, uploaded_bytes=0, prompt_tokens=0, completion_tokens=0, error=None):
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, {
+                "calls": 0, "bytes_uploaded": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "errors": 0, "rate_limited": 0,
+            })
+            stats["calls"] += 1
+            stats["bytes_uploaded"] += uploaded_bytes
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            if error == "rate_limited":
+                stats["rate_limited"] += 1
+            elif error:
+                stats["errors"] += 1
+
+    def totals(self):
+        with self._lock:
+            totals = {"calls": 0, "bytes_uploaded": 0, "prompt_tokens": 0, "completion_tokens": 0, "errors": 0, "rate_limited": 0}
+            for stats in self.endpoints.values():
+                for key in totals:
+                    totals[key] += stats[key]
+            return {**totals, "by_endpoint": {name: dict(stats) for name, stats in self.endpoints.items()}}
+
+
+class _Endpoint:
+    """Latency, error injection and sliding-window rate limit of a fake endpoint."""
+
+    def __init__(self, name, config, stats, seed, rate_limit_error):
+        self.name = name
+        self.config = config
+        self.stats = stats
+        self.rate_limit_error = rate_limit_error
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+
+    def call(self, uploaded_bytes, prompt_tokens, respond):
+        """Answer with `respond()` after the latency, or raise an injected error."""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            over_limit = bool(self.config.requests_per_minute) and len(self._recent) >= self.config.requests_per_minute
+            self._recent.append(now)
+            draw = self._random.random()
+            delay = self.config.latency + self._random.uniform(0, self.config.jitter)
+            # Drawn only when enabled, so the other scenarios keep their random sequence
+            if self.config.slow_rate and self._random.random() < self.config.slow_rate:
+                delay += self.config.slow_latency
+
+        if over_limit or draw < self.config.rate_limit_error_rate:
+            self.stats.record(self.name, uploaded_bytes, prompt_tokens, error="rate_limited")
+            raise self.rate_limit_error()
+        time.sleep(delay)
+        if draw < self.config.rate_limit_error_rate + self.config.error_rate:
+            self.stats.record(self.name, uploaded_bytes, prompt_tokens, error="error")
+            raise RuntimeError(f"Injected {self.name} error")
+        content = respond()
+        self.stats.record(self.name, uploaded_bytes, prompt_tokens, estimate_tokens(content))
+        return content, estimate_tokens(content)
+
+
+def _groq_rate_limit_error():
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    return RateLimitError("Rate limit reached (fake)", response=httpx.Response(429, request=request), body=None)
+
+
+def _gemini_rate_limit_error():
+    return ResourceExhausted("Resource has been exhausted (fake)")
+
+
+def _verdict(rule):
+    # Deterministic label so repeated runs give the same outputs
+    label = int(hashlib.sha256(rule.encode("utf-8")).hexdigest(), 16) % 2 == 0
+    return {
+        "rule_name": rule,
+        "label": label,
+        "part": [] if label else ["Many of our clients have seen their investments grow significantly"],
+        "suggestion": [] if label else ["State that returns are not guaranteed"],
+    }
+
+
+def _rules_in_prompt(prompt):
+    single = re.search(r"The rule is: (.*)", prompt)
+    if single:
+        return [single.group(1).strip()]
+    return [match.strip() for match in re.findall(r"^\s*\d+\. (.*)$", prompt, flags=re.MULTILINE)]
+
+
+def _answer_chat(messages):
+    """Answer like the prompts of the app expect: rule verdicts, batches, disclaimer check or product card."""
+    system = next((message["content"] for message in messages if message["role"] == "system"), "")
+    user = messages[-1]["content"]
+    if "list of texts to identify any disclaimer" in system:
+        found = any(keyword in user.lower() for keyword in ("capital at risk", "past performance"))
+        return json.dumps({"disclaimer_is_exist": found, "disclaimer_text": DISCLAIMER_TEXT if found else ""})
+    if "concise summary from the given video transcript" in system:
+        return "- **Company Name**: BrightFuture Investments\n- **Industry**: Financial Services\n- **Product Summary**: Managed investment plans."
+    rules = _rules_in_prompt(user)
+    if "The rules are:" in user:
+        return json.dumps({"results": [_verdict(rule) for rule in rules]})
+    return json.dumps(_verdict(rules[0] if rules else "rule"))
+
+
+def _read_image(data_url):
+    data = data_url.split(",", 1)[1]
+    return cv2.imdecode(np.frombuffer(base64.b64decode(data), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _image_text(image):
+    """Text 'read' on a synthetic frame: the disclaimer on the blue end card, a headline on bright scenes."""
+    if image is None or image.size == 0:
+        return NO_TEXT_MESSAGE
+    blue, green, red = (float(channel) for channel in image.reshape(-1, 3).mean(axis=0))
+    if blue > 100 and blue > 2 * max(green, red):
+        return DISCLAIMER_TEXT
+    if image.mean() > 100:
+        return "Invest in your future with BrightFuture"
+    return NO_TEXT_MESSAGE
+
+
+def _answer_vision(content):
+    prompt = next(part["text"] for part in content if part["type"] == "text")
+    image = _read_image(next(part["image_url"]["url"] for part in content if part["type"] == "image_url"))
+    labels = re.search(r"label \((T[^)]*)\)", prompt)
+    if labels is None:
+        return json.dumps({"image_content": _image_text(image)})
+    # Montage: read each tile of the grid found between the white borders
+    labels = labels.group(1).split(", ")
+    tiles = _split_montage(image)
+    return json.dumps({"tiles": [
+        {"tile": label, "image_content": _image_text(tile)} for label, tile in zip(labels, tiles)
+    ]})
+
+
+def _runs(mask, min_length):
+    """(start, end) of the runs of True values at least `min_length` long."""
+    runs = []
+    start = None
+    for index, value in enumerate(list(mask) + [False]):
+        if value and start is None:
+            start = index
+        elif not value and start is not None:
+            if index - start >= min_length:
+                runs.append((start, index))
+            start = None
+    return runs
+
+
+def _split_montage(image):
+    """Tiles of a `frame_montage` grid, row by row, found as the non-white areas between the borders."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    not_white = gray < 235
+    # Label strips are white with a short caption, tiles are much taller
+    rows = _runs(not_white.mean(axis=1) > 0.5, min_length=40)
+    tiles = []
+    for top, bottom in rows:
+        for left, right in _runs(not_white[top:bottom].mean(axis=0) > 0.5, min_length=40):
+            tiles.append(image[top:bottom, left:right])
+    return tiles
+
+
+class FakeGroqClient:
+    """Stand-in for `groq.Groq` with the chat completions (text and vision) and transcription endpoints."""
+
+    def __init__(self, stats, chat=None, vision=None, transcription=None, seed=0):
+        self.stats = stats
+        self._chat = _Endpoint("chat", chat or EndpointConfig(), stats, seed, _groq_rate_limit_error)
+        self._vision = _Endpoint("vision", vision or EndpointConfig(latency=0.1), stats, seed + 1, _groq_rate_limit_error)
+        self._transcription = _Endpoint("transcription", transcription or EndpointConfig(latency=0.2), stats, seed + 2, _groq_rate_limit_error)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._create_transcription))
+
+    def _create_completion(self, messages, model, **kwargs):
+        uploaded_bytes = len(json.dumps(messages))
+        last_content = messages[-1]["content"]
+        if isinstance(last_content, list):
+            text = " ".join(part["text"] for part in last_content if part["type"] == "text")
+            prompt_tokens = estimate_tokens(text)
+            content, completion_tokens = self._vision.call(uploaded_bytes, prompt_tokens, lambda: _answer_vision(last_content))
+        else:
+            prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+            content, completion_tokens = self._chat.call(uploaded_bytes, prompt_tokens, lambda: _answer_chat(messages))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens),
+        )
+
+    def _create_transcription(self, file, model, **kwargs):
+        name, data = file
+        if hasattr(data, "read"):
+            data = data.read()
+
+        def respond():
+            # One segment per 10 seconds of 32 kbps mp3
+            seconds = max(len(data) * 8 / 32000, 1)
+            return json.dumps([
+                {"start": start, "end": min(start + 10, seconds), "text": f"Segment {int(start // 10)} of {name}, our returns speak for themselves."}
+                for start in range(0, int(seconds), 10)
+            ] or [{"start": 0, "end": seconds, "text": "Short chunk."}])
+
+        segments = json.loads(self._transcription.call(len(data), 0, respond)[0])
+        return SimpleNamespace(segments=segments, text=" ".join(segment["text"] for segment in segments))
+
+    def close(self):
+        pass
+
+
+class FakeGeminiModel:
+    """Stand-in for `genai.GenerativeModel.generate_content`."""
+
+    def __init__(self, model_name, system_instruction, endpoint):
+        self.model_name = f"models/{model_name}"
+        self.system_instruction = system_instruction
+        self._endpoint = endpoint
+
+    def generate_content(self, prompt, generation_config=None, safety_settings=None, request_options=None):
+        messages = [{"role": "system", "content": self.system_instruction or ""}, {"role": "user", "content": prompt}]
+        prompt_tokens = estimate_tokens(prompt) + estimate_tokens(self.system_instruction or "")
+        text, completion_tokens = self._endpoint.call(len(prompt), prompt_tokens, lambda: _answer_chat(messages))
+        return SimpleNamespace(
+            parts=[SimpleNamespace(text=text)], text=text,
+            usage_metadata=SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=completion_tokens),
+        )
+
+
+class FakeGeminiFactory:
+    """Model factory for `clients.set_generative_model_factory`, all models share one fake endpoint."""
+
+    def __init__(self, stats, config=None, seed=0):
+        self._endpoint = _Endpoint("gemini", config or EndpointConfig(), stats, seed + 3, _gemini_rate_limit_error)
+
+    def __call__(self, model_name, system_instruction=None):
+        return FakeGeminiModel(model_name, system_instruction, self._endpoint)
@@ -0,0 +1,46 @@
+"""Compare frame encoding settings on payload size, request latency and OCR quality.
+
+Run from the repository root (this calls the vision API):
+
+    python -m benchmarks.frame_encoding_benchmark video.mp4 [--frames 5] [--threshold 0.9]
+
+Each setting is checked with `video_processing.check_encoding`: the same frames are OCR'd
+at full resolution and quality and with the setting, and the bytes per request, the
+latency per request and the text similarity to the reference reading are reported.
+"""
+import argparse
+
+from frame_encoding import FrameEncoder
+from video_processing import check_encoding
+
+
+SETTINGS = [
+    {"max_width": 1920, "image_format": "jpeg", "quality": 90},
+    {"max_width": 1280, "image_format": "jpeg", "quality": 85},
+    {"max_width": 1280, "image_format": "webp", "quality": 80},
+    {"max_width": 960, "image_format": "jpeg", "quality": 80},
+    {"max_width": 1920, "image_format": "jpeg", "quality": 85, "roi": "lower_third"},
+    {"max_width": 1920, "image_format": "webp", "quality": 80, "roi": "text"},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video_path")
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.9, help="similarity below which a frame counts as degraded")
+    args = parser.parse_args()
+
+    print(f"{'settings':<40} {'KB/req':>7} {'ref KB':>7} {'s/req':>6} {'ref s':>6} {'similarity':>11} {'degraded':>9}")
+    for settings in SETTINGS:
+        report = check_encoding(args.video_path, FrameEncoder(**settings), args.frames, args.threshold)
+        print(
+            f"{report['settings']:<40} {report['bytes_per_request'] / 1024:>7.0f}"
+            f" {report['reference_bytes_per_request'] / 1024:>7.0f}"
+            f" {report['seconds_per_request']:>6.2f} {report['reference_seconds_per_request']:>6.2f}"
+            f" {report['mean_similarity']:>11.2f} {len(report['degraded']):>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Import time of the app, the batch CLI and a frame decoding worker, measured with `python -X importtime`.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time_benchmark [--repeats 5] [--against <git ref>] [--top 10]
+
+Each target is imported in a fresh interpreter `--repeats` times (after one warm-up run that
+compiles the bytecode) and the median total import time is reported, with the wall time of
+the whole process. With --against, the same targets are measured on a copy of the tree at
+that git ref (e.g. the commit before the imports were made lazy) to show the reduction.
+With --top, the packages taking the most import time are listed for each target.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+TARGETS = {
+    "app": "import app",
+    "batch CLI": "import batch_review",
+    "review modules": "import review_pipeline",
+    "decode worker": "import frame_sampling",
+}
+
+
+def parse_importtime(stderr):
+    """Return the total import time and the time spent importing each package (own modules only), in seconds."""
+    total = 0.0
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module importing them
+        if not name[1:].startswith(" "):
+            total += int(cumulative) / 1e6
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_time) / 1e6
+    return total, packages
+
+
+def measure(tree, statement, repeats):
+    """Median import time and process wall time of `statement` run in `tree`, and the last run's time per package."""
+    env = {**os.environ, "PYTHONPATH": tree}
+    import_times = []
+    wall_times = []
+    packages = {}
+    for run in range(repeats + 1):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=tree, env=env,
+                                   capture_output=True, text=True)
+        wall_seconds = time.perf_counter() - start
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"
+            return {"error": error}
+        if run == 0:
+            # Warm-up: bytecode compilation and disk cache
+            continue
+        total, packages = parse_importtime(completed.stderr)
+        import_times.append(total)
+        wall_times.append(wall_seconds)
+    return {"import_seconds": statistics.median(import_times), "wall_seconds": statistics.median(wall_times),
+            "packages": packages}
+
+
+def export_tree(ref, directory):
+    """Extract the tracked files of the repository at `ref` into `directory`."""
+    archive = subprocess.run(["git", "archive", ref], capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", directory], input=archive.stdout, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--against", help="git ref to compare with, e.g. HEAD~1")
+    parser.add_argument("--top", type=int, default=0, help="show the packages taking the most import time")
+    args = parser.parse_args()
+
+    tree = os.getcwd()
+    results = {name: measure(tree, statement, args.repeats) for name, statement in TARGETS.items()}
+    reference = {}
+    if args.against:
+        with tempfile.TemporaryDirectory() as reference_tree:
+            export_tree(args.against, reference_tree)
+            reference = {name: measure(reference_tree, statement, args.repeats) for name, statement in TARGETS.items()}
+
+    header = f"{'target':<16} {'import (ms)':>12} {'process (ms)':>13}"
+    if reference:
+        header += f" {args.against + ' import (ms)':>24} {'process (ms)':>13} {'reduction':>10}"
+    print(header)
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<16} failed: {result['error']}")
+            continue
+        line = f"{name:<16} {result['import_seconds'] * 1000:>12.0f} {result['wall_seconds'] * 1000:>13.0f}"
+        if reference:
+            before = reference[name]
+            if "error" in before:
+                line += f"  {args.against} failed: {before['error']}"
+            else:
+                line += (f" {before['import_seconds'] * 1000:>24.0f} {before['wall_seconds'] * 1000:>13.0f}"
+                         f" {1 - result['import_seconds'] / before['import_seconds']:>10.0%}")
+        print(line)
+
+    for name, result in results.items():
+        if args.top and "error" not in result:
+            print(f"\nHeaviest packages imported by {name}:")
+            for package, seconds in sorted(result["packages"].items(), key=lambda item: -item[1])[:args.top]:
+                print(f"  {package:<30} {seconds * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
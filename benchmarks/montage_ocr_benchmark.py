@@ -0,0 +1,73 @@
+"""Measure the vision calls saved by montage requests and their OCR accuracy cost.
+
+Run from the repository root (this calls the vision API):
+
+    python -m benchmarks.montage_ocr_benchmark video.mp4 [--grids 2x2 3x3] [--tile-size 640x360] [--jpeg-quality 90]
+
+Every frame is first OCR'd on its own as the reference. For each grid it then reports the
+number of vision requests, the wall time and the mean text similarity of each frame to
+its single-frame reading, along with the share of frames read identically.
+"""
+import argparse
+import difflib
+import tempfile
+import time
+
+import cache
+from cache import ResultCache
+from clients import get_connection_stats
+from frame_encoding import FrameEncoder
+from text_consolidation import normalize_text
+from video_processing import extract_frame_texts
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def run_grid(video_path, grid, tile_size, jpeg_quality, interval_seconds):
+    """Return ({timestamp: text}, vision requests, wall time in seconds) of one setting."""
+    requests_before = get_connection_stats()["requests"]
+    start = time.perf_counter()
+    frame_texts = extract_frame_texts(
+        video_path, interval_seconds, deduplicate=False,
+        montage_grid=grid, tile_size=tile_size, encoder=FrameEncoder(quality=jpeg_quality),
+    )
+    elapsed = time.perf_counter() - start
+    requests = get_connection_stats()["requests"] - requests_before
+    return {frame_text["timestamp"]: frame_text["text"] or "" for frame_text in frame_texts}, requests, elapsed
+
+
+def similarity(text, reference):
+    return difflib.SequenceMatcher(None, normalize_text(text), normalize_text(reference)).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video_path")
+    parser.add_argument("--grids", nargs="+", type=parse_size, default=[(2, 2), (3, 3)], help="columns x rows")
+    parser.add_argument("--tile-size", type=parse_size, default=(640, 360))
+    parser.add_argument("--jpeg-quality", type=int, default=90)
+    parser.add_argument("--interval", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Start from an empty cache so every setting really calls the API
+        cache._cache = ResultCache(f"{cache_dir}/results.sqlite")
+
+        reference, reference_requests, reference_time = run_grid(args.video_path, None, args.tile_size, args.jpeg_quality, args.interval)
+        print(f"{'grid':<6} {'requests':>8} {'time (s)':>9} {'similarity':>11} {'identical':>10}")
+        print(f"{'1x1':<6} {reference_requests:>8} {reference_time:>9.2f} {1:>11.2f} {1:>10.0%}")
+        for grid in args.grids:
+            texts, requests, elapsed = run_grid(args.video_path, grid, args.tile_size, args.jpeg_quality, args.interval)
+            scores = [similarity(texts.get(timestamp, ""), text) for timestamp, text in reference.items()]
+            identical = sum(score == 1.0 for score in scores) / max(len(scores), 1)
+            print(
+                f"{grid[0]}x{grid[1]:<4} {requests:>8} {elapsed:>9.2f}"
+                f" {sum(scores) / max(len(scores), 1):>11.2f} {identical:>10.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
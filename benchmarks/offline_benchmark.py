@@ -0,0 +1,291 @@
+"""Offline benchmark of the review paths, against local stand-ins for the Groq, Gemini and Whisper APIs.
+
+Run from the repository root:
+
+    python -m benchmarks.offline_benchmark [--scenarios rules_20x5000 video_180s_2s] [--latency-scale 1]
+    python -m benchmarks.offline_benchmark --save-baseline benchmarks/baselines/offline.json
+    python -m benchmarks.offline_benchmark --baseline benchmarks/baselines/offline.json
+    python -m benchmarks.offline_benchmark --scenarios rules_100x500_tail rules_100x500_tail_routed
+
+No API key or network access is needed: the fakes of `benchmarks.fake_apis` are installed
+through the client registry, every scenario starts from an empty result cache, and the
+fixture videos are generated locally (see `benchmarks.synthetic_media`, cached under
+cache/benchmark_fixtures). Each scenario reports wall time, API calls, uploaded bytes,
+prompt and completion tokens and peak Python memory. With --baseline, scenarios whose
+calls, bytes or tokens grew, or whose wall time or memory grew beyond --tolerance, are
+reported as regressions and the exit code is 1.
+The *_tail scenarios give a few slow answers to the chat endpoint; the _routed one sends the
+rules through `routing.Router`, whose hedged requests should cut the wall time they add.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cache
+import clients
+import rate_limiting
+import routing
+from app import default_sales_deck
+from batch_review import review_video
+from benchmarks.fake_apis import EndpointConfig, FakeAPIStats, FakeGeminiFactory, FakeGroqClient
+from benchmarks.synthetic_media import fixture_audio, fixture_video
+from groq_models import groq_inference, iter_groq_inference
+from script import get_gemini_options, inference
+from transcription import transcribe_audio
+from video_processing import extract_frame_texts, check_and_extract_disclaimer, scan_for_disclaimer
+
+
+DEFAULT_MODEL = "llama-3.1-70b-versatile"
+GEMINI_MODEL = "gemini-1.5-flash"
+
+SYSTEM_MESSAGE = "You are a compliance officer. Review the rule against the sales deck and answer in JSON."
+
+RULE_TOPICS = (
+    "Fair and Balanced Representation of Risks and Benefits", "Clear Disclosure of Fees and Costs",
+    "Inclusion of Risk Warnings", "No Guarantee of Future Returns", "Past Performance Disclaimer",
+    "Target Market Identification", "Clear Product Identification", "No Misleading Comparisons",
+)
+
+SCENARIOS = [
+    {"name": "rules_5x500", "kind": "rules", "rules": 5, "words": 500},
+    {"name": "rules_20x5000", "kind": "rules", "rules": 20, "words": 5000},
+    {"name": "rules_20x5000_batched", "kind": "rules", "rules": 20, "words": 5000, "rules_per_request": "auto"},
+    {"name": "rules_20x20000_retrieval", "kind": "rules", "rules": 20, "words": 20000, "retrieval_top_n": 3},
+    {"name": "rules_20x500_429s", "kind": "rules", "rules": 20, "words": 500, "chat": {"rate_limit_error_rate": 0.3}},
+    {"name": "rules_100x500_tail", "kind": "rules", "rules": 100, "words": 500,
+     "chat": {"slow_rate": 0.04, "slow_latency": 2.0}},
+    {"name": "rules_100x500_tail_routed", "kind": "rules", "rules": 100, "words": 500, "routing": True,
+     "chat": {"slow_rate": 0.04, "slow_latency": 2.0}, "gemini": {"slow_rate": 0.04, "slow_latency": 2.0}},
+    {"name": "gemini_rules_10x2000", "kind": "gemini_rules", "rules": 10, "words": 2000},
+    {"name": "video_60s_5s", "kind": "video", "duration": 60, "interval": 5},
+    {"name": "video_180s_2s", "kind": "video", "duration": 180, "interval": 2},
+    {"name": "video_180s_2s_montage", "kind": "video", "duration": 180, "interval": 2, "montage_grid": (2, 2)},
+    {"name": "disclaimer_scan_180s", "kind": "disclaimer_scan", "duration": 180},
+    {"name": "transcription_600s", "kind": "transcription", "duration": 600},
+    {"name": "review_60s", "kind": "review", "duration": 60, "rules": 5},
+]
+
+# Metrics compared exactly against the baseline, any increase is a regression
+COUNT_METRICS = ("calls", "bytes_uploaded", "prompt_tokens", "completion_tokens")
+# Metrics compared with the tolerance, and the absolute increase below which they are noise
+TIMED_METRICS = {"wall_seconds": 0.25, "peak_memory_bytes": 2 * 1024 ** 2}
+
+
+def make_transcript(words):
+    base = default_sales_deck.split()
+    return " ".join(base[index % len(base)] for index in range(words))
+
+
+def make_rules(count):
+    return [f"{RULE_TOPICS[index % len(RULE_TOPICS)]} ({index + 1})" for index in range(count)]
+
+
+def run_rules(scenario):
+    transcript = make_transcript(scenario["words"])
+    if scenario.get("routing"):
+        dict(iter_groq_inference(SYSTEM_MESSAGE, DEFAULT_MODEL, make_rules(scenario["rules"]), transcript,
+                                 generate=routing.get_router().generate))
+        return
+    groq_inference(
+        SYSTEM_MESSAGE, DEFAULT_MODEL, make_rules(scenario["rules"]), transcript,
+        rules_per_request=scenario.get("rules_per_request", 1), retrieval_top_n=scenario.get("retrieval_top_n"),
+    )
+
+
+def run_gemini_rules(scenario):
+    inference(SYSTEM_MESSAGE, GEMINI_MODEL, make_rules(scenario["rules"]), make_transcript(scenario["words"]))
+
+
+def run_video(scenario):
+    frame_texts = extract_frame_texts(
+        fixture_video(scenario["duration"]), scenario["interval"], montage_grid=scenario.get("montage_grid"),
+    )
+    check_and_extract_disclaimer([frame_text for frame_text in frame_texts if frame_text["text"]])
+
+
+def run_disclaimer_scan(scenario):
+    scan_for_disclaimer(fixture_video(scenario["duration"]))
+
+
+def run_transcription(scenario):
+    transcribe_audio(fixture_audio(scenario["duration"]))
+
+
+def run_review(scenario):
+    record = review_video(
+        {"id": scenario["name"], "video": fixture_video(scenario["duration"], audio=True)},
+        SYSTEM_MESSAGE, DEFAULT_MODEL, make_rules(scenario["rules"]),
+    )
+    if record["status"] != "done":
+        raise RuntimeError(record["error"])
+
+
+RUNNERS = {
+    "rules": run_rules,
+    "gemini_rules": run_gemini_rules,
+    "video": run_video,
+    "disclaimer_scan": run_disclaimer_scan,
+    "transcription": run_transcription,
+    "review": run_review,
+}
+
+
+def _endpoint_config(defaults, overrides, latency_scale):
+    settings = {**defaults, **(overrides or {})}
+    settings["latency"] *= latency_scale
+    return EndpointConfig(**settings)
+
+
+def preload_lazy_imports():
+    """Import the SDKs the review functions load on first use, so the first scenario does not pay for them."""
+    import groq
+    import pydantic
+    import pydub.silence
+    import moviepy.editor
+    get_gemini_options()
+
+
+def run_scenario(scenario, latency_scale=1.0, keep_rate_limits=False, verbose=False):
+    """Run one scenario against fresh fakes and an empty cache, return its metrics."""
+    # Generate the fixtures first so their cost is not measured
+    if "duration" in scenario:
+        if scenario["kind"] == "transcription":
+            fixture_audio(scenario["duration"])
+        else:
+            fixture_video(scenario["duration"], audio=scenario["kind"] == "review")
+
+    stats = FakeAPIStats()
+    clients.set_groq_client(FakeGroqClient(
+        stats,
+        chat=_endpoint_config({"latency": 0.05, "jitter": 0.02}, scenario.get("chat"), latency_scale),
+        vision=_endpoint_config({"latency": 0.1, "jitter": 0.05}, scenario.get("vision"), latency_scale),
+        transcription=_endpoint_config({"latency": 0.3, "jitter": 0.1}, scenario.get("transcription"), latency_scale),
+    ))
+    clients.set_generative_model_factory(FakeGeminiFactory(
+        stats, _endpoint_config({"latency": 0.08, "jitter": 0.03}, scenario.get("gemini"), latency_scale),
+    ))
+    saved_limits = dict(rate_limiting.MODEL_RATE_LIMITS)
+    if not keep_rate_limits:
+        # The real quotas would make the benchmark measure waiting for the rate limiter
+        for model in list(rate_limiting.MODEL_RATE_LIMITS):
+            rate_limiting.MODEL_RATE_LIMITS[model] = (100000, None)
+        rate_limiting.MODEL_RATE_LIMITS.setdefault(DEFAULT_MODEL, (100000, None))
+    rate_limiting.reset_rate_limiters()
+    # Latency statistics start empty in every scenario
+    routing.set_router(None)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache.set_cache(cache.ResultCache(os.path.join(cache_dir, "results.sqlite")))
+        error = None
+        tracemalloc.start()
+        start = time.perf_counter()
+        # The review functions print their progress, kept out of the results table by default
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        try:
+            with output:
+                RUNNERS[scenario["kind"]](scenario)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        wall_seconds = time.perf_counter() - start
+        # Let the losing copies of hedged requests finish, so their calls are counted
+        routing.get_router().executor.shutdown(wait=True)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        cache.set_cache(None)
+
+    clients.set_groq_client(None)
+    clients.set_generative_model_factory(None)
+    rate_limiting.MODEL_RATE_LIMITS.clear()
+    rate_limiting.MODEL_RATE_LIMITS.update(saved_limits)
+    rate_limiting.reset_rate_limiters()
+    routing.set_router(None)
+
+    totals = stats.totals()
+    return {
+        "wall_seconds": wall_seconds,
+        "calls": totals["calls"],
+        "bytes_uploaded": totals["bytes_uploaded"],
+        "prompt_tokens": totals["prompt_tokens"],
+        "completion_tokens": totals["completion_tokens"],
+        "errors_injected": totals["errors"] + totals["rate_limited"],
+        "peak_memory_bytes": peak_memory,
+        "by_endpoint": totals["by_endpoint"],
+        "error": error,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """List the regressions of `results` against `baseline`, as strings."""
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if metrics["errors_injected"] or reference.get("errors_injected"):
+            # Injected errors make the call counts vary between runs
+            count_metrics = ()
+        else:
+            count_metrics = COUNT_METRICS
+        for metric in count_metrics:
+            if metrics[metric] > reference[metric]:
+                regressions.append(f"{name}: {metric} {reference[metric]} -> {metrics[metric]}")
+        for metric, noise in TIMED_METRICS.items():
+            if metrics[metric] > reference[metric] * (1 + tolerance) and metrics[metric] - reference[metric] > noise:
+                regressions.append(f"{name}: {metric} {reference[metric]:.4g} -> {metrics[metric]:.4g} (+{metrics[metric] / reference[metric] - 1:.0%})")
+        if metrics["error"] and not reference.get("error"):
+            regressions.append(f"{name}: failed with {metrics['error']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", help="names of the scenarios to run, all by default")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier of the fake API latencies")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep the real per-model rate limits")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show the progress printed by the review functions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative increase of wall time and memory")
+    args = parser.parse_args()
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenarios or scenario["name"] in args.scenarios]
+    preload_lazy_imports()
+    results = {}
+    print(f"{'scenario':<28} {'time (s)':>9} {'calls':>6} {'KB up':>8} {'tokens in':>10} {'tokens out':>11} {'peak MB':>8}")
+    for scenario in scenarios:
+        metrics = run_scenario(scenario, args.latency_scale, args.keep_rate_limits, args.verbose)
+        results[scenario["name"]] = metrics
+        print(
+            f"{scenario['name']:<28} {metrics['wall_seconds']:>9.2f} {metrics['calls']:>6} {metrics['bytes_uploaded'] / 1024:>8.0f}"
+            f" {metrics['prompt_tokens']:>10} {metrics['completion_tokens']:>11} {metrics['peak_memory_bytes'] / 1024 ** 2:>8.1f}"
+            + (f"  {metrics['error']}" if metrics["error"] else "")
+        )
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        existing = {}
+        if os.path.exists(args.save_baseline):
+            with open(args.save_baseline) as baseline_file:
+                existing = json.load(baseline_file)
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump({**existing, **results}, baseline_file, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regression against the baseline")
+
+
+if __name__ == "__main__":
+    main()
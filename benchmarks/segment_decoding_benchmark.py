@@ -0,0 +1,40 @@
+"""Measure frame decoding throughput with one capture versus a pool of decoding processes.
+
+Run from the repository root:
+
+    python -m benchmarks.segment_decoding_benchmark video.mp4 [--interval 1] [--processes 2 4 8]
+
+It reports the sampled frames decoded per second by `sample_frames` and by
+`sample_frames_parallel` for each process count.
+"""
+import argparse
+import os
+import time
+
+from frame_sampling import sample_frames, sample_frames_parallel
+
+
+def throughput(frames):
+    start = time.perf_counter()
+    count = sum(1 for _ in frames)
+    elapsed = time.perf_counter() - start
+    return count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video_path")
+    parser.add_argument("--interval", type=float, default=1)
+    parser.add_argument("--processes", type=int, nargs="+", default=sorted({2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    count, baseline = throughput(sample_frames(args.video_path, interval_seconds=args.interval))
+    print(f"{'processes':<10} {'frames':>7} {'time (s)':>9} {'frames/s':>9} {'speedup':>8}")
+    print(f"{'1 (serial)':<10} {count:>7} {baseline:>9.2f} {count / baseline:>9.1f} {1:>7.1f}x")
+    for processes in args.processes:
+        count, elapsed = throughput(sample_frames_parallel(args.video_path, interval_seconds=args.interval, processes=processes))
+        print(f"{processes:<10} {count:>7} {elapsed:>9.2f} {count / elapsed:>9.1f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
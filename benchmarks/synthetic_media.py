@@ -0,0 +1,92 @@
+"""Synthetic ad videos generated locally with OpenCV, used as fixtures by the offline benchmarks.
+
+Videos alternate bright scenes with a headline and dark scenes without text, with a moving
+shape so consecutive frames differ, and end on a blue card holding the disclaimer. With
+`audio`, a tone interrupted by a short silence every 10 seconds is muxed in with ffmpeg.
+"""
+import os
+import subprocess
+
+import cv2
+import numpy as np
+
+from frame_sampling import get_ffmpeg_binary
+
+
+FIXTURES_DIR = os.path.join("cache", "benchmark_fixtures")
+
+
+def _draw_frame(index, fps, duration, size, scene_seconds, end_card_seconds):
+    width, height = size
+    timestamp = index / fps
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    if timestamp >= duration - end_card_seconds:
+        frame[:] = (200, 40, 20)
+        for line, text in enumerate(("Capital at risk.", "Past performance is not a reliable", "indicator of future results.")):
+            cv2.putText(frame, text, (width // 10, height // 3 + line * height // 10), cv2.FONT_HERSHEY_SIMPLEX,
+                        height / 600, (255, 255, 255), 2, cv2.LINE_AA)
+        return frame
+
+    scene = int(timestamp // scene_seconds)
+    if scene % 2 == 0:
+        frame[:] = (170 + 10 * (scene % 5), 190, 210)
+        cv2.putText(frame, "Invest in your future", (width // 10, height // 5), cv2.FONT_HERSHEY_SIMPLEX,
+                    height / 300, (30, 30, 30), 3, cv2.LINE_AA)
+    else:
+        frame[:] = (30 + 5 * (scene % 5), 25, 20)
+    # Moving shape so that frames of the same scene are not pixel-identical
+    x = int((timestamp % scene_seconds) / scene_seconds * (width - width // 8))
+    cv2.rectangle(frame, (x, height // 2), (x + width // 8, height // 2 + height // 6), (0, 160, 255), -1)
+    return frame
+
+
+def make_video(path, duration, fps=10, size=(640, 360), scene_seconds=4, end_card_seconds=5, audio=False):
+    """Write a synthetic video of `duration` seconds to `path` (mp4) and return the path."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    video_path = path if not audio else f"{os.path.splitext(path)[0]}.noaudio.mp4"
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    try:
+        for index in range(int(duration * fps)):
+            writer.write(_draw_frame(index, fps, duration, size, scene_seconds, end_card_seconds))
+    finally:
+        writer.release()
+
+    if audio:
+        command = [
+            get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+            "-i", video_path,
+            "-f", "lavfi", "-i", f"aevalsrc=0.3*sin(440*2*PI*t)*lt(mod(t\\,10)\\,9):s=16000:d={duration}",
+            "-c:v", "copy", "-c:a", "aac", "-shortest", path,
+        ]
+        subprocess.run(command, check=True, capture_output=True)
+        os.remove(video_path)
+    return path
+
+
+def fixture_video(duration, audio=False, fps=10, size=(640, 360)):
+    """Return the path of a cached synthetic video with these parameters, generating it if needed."""
+    name = f"synthetic_{duration:g}s_{fps}fps_{size[0]}x{size[1]}{'_audio' if audio else ''}.mp4"
+    path = os.path.join(FIXTURES_DIR, name)
+    if not os.path.exists(path):
+        make_video(path, duration, fps, size, audio=audio)
+    return path
+
+
+def make_audio(path, duration):
+    """Write `duration` seconds of the synthetic tone (silence every 10 seconds) to an mp3 file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    command = [
+        get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"aevalsrc=0.3*sin(440*2*PI*t)*lt(mod(t\\,10)\\,9):s=16000:d={duration}",
+        "-ac", "1", "-c:a", "libmp3lame", "-b:a", "32k", path,
+    ]
+    subprocess.run(command, check=True, capture_output=True)
+    return path
+
+
+def fixture_audio(duration):
+    """Return the path of a cached synthetic mp3 of `duration` seconds, generating it if needed."""
+    path = os.path.join(FIXTURES_DIR, f"synthetic_{duration:g}s.mp3")
+    if not os.path.exists(path):
+        make_audio(path, duration)
+    return path
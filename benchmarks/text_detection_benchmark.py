@@ -0,0 +1,100 @@
+"""Benchmark the local text-region detector against a labelled set of frames.
+
+The labelled set is a directory with two sub-directories of images:
+
+    frames/
+        text/      frames that contain on-screen text
+        no_text/   frames without any text
+
+Run from the repository root:
+
+    python -m benchmarks.text_detection_benchmark frames/
+
+For every parameter combination it reports precision and recall of the "has text"
+decision, and the share of vision calls that would be saved by skipping the frames
+detected as text-free.
+"""
+import argparse
+import itertools
+import os
+import time
+
+import cv2
+
+from frame_filters import has_text
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+PARAMETER_GRID = {
+    "min_height": [4, 6, 10],
+    "min_aspect": [1.0, 1.5, 2.5],
+    "min_fill": [0.3, 0.4, 0.5],
+}
+
+
+def load_labelled_frames(frames_dir):
+    """Load `(frame, label)` pairs, label is True for frames of the `text/` directory."""
+    labelled_frames = []
+    for sub_dir, label in (("text", True), ("no_text", False)):
+        directory = os.path.join(frames_dir, sub_dir)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            frame = cv2.imread(os.path.join(directory, name))
+            if frame is not None:
+                labelled_frames.append((frame, label))
+    return labelled_frames
+
+
+def evaluate(labelled_frames, params):
+    """Compute precision, recall, calls saved and mean detection time for one parameter set."""
+    true_positives = false_positives = false_negatives = predicted_negatives = 0
+    start = time.perf_counter()
+    for frame, label in labelled_frames:
+        predicted = has_text(frame, **params)
+        if predicted and label:
+            true_positives += 1
+        elif predicted and not label:
+            false_positives += 1
+        elif not predicted:
+            predicted_negatives += 1
+            if label:
+                false_negatives += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "precision": true_positives / max(true_positives + false_positives, 1),
+        "recall": true_positives / max(true_positives + false_negatives, 1),
+        "calls_saved": predicted_negatives / max(len(labelled_frames), 1),
+        "ms_per_frame": 1000 * elapsed / max(len(labelled_frames), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("frames_dir", help="Directory holding the text/ and no_text/ labelled frames")
+    args = parser.parse_args()
+
+    labelled_frames = load_labelled_frames(args.frames_dir)
+    if not labelled_frames:
+        parser.error(f"No labelled frames found in {args.frames_dir}")
+    positives = sum(1 for _, label in labelled_frames if label)
+    print(f"{len(labelled_frames)} frames, {positives} with text, {len(labelled_frames) - positives} without")
+
+    names = list(PARAMETER_GRID)
+    print(" ".join(f"{name:>10}" for name in names) + "  precision  recall  calls_saved  ms/frame")
+    for values in itertools.product(*PARAMETER_GRID.values()):
+        params = dict(zip(names, values))
+        result = evaluate(labelled_frames, params)
+        print(
+            " ".join(f"{value:>10}" for value in values)
+            + f"  {result['precision']:>9.2f}  {result['recall']:>6.2f}"
+            + f"  {result['calls_saved']:>11.2f}  {result['ms_per_frame']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from tracing import record_cache_lookup
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join("cache", "results.sqlite")
+
+# Total size of the cached values before the least recently used entries are evicted
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Entries older than this are ignored and removed
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+_MISSING = object()
+
+
+def make_key(namespace, *parts):
+    """Build a cache key from a namespace and the JSON-serialisable parameters of a call."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def content_hash(data):
+    """SHA-256 of a string or bytes."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Persistent SQLite cache of JSON values with TTL and size-bounded LRU eviction."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, ttl_seconds=CACHE_TTL_SECONDS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._connection.commit()
+
+    def get(self, key, default=None):
+        """Return the cached value of `key`, or `default` when missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                if row is not None:
+                    self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._connection.commit()
+                self.misses += 1
+                record_cache_lookup(key.split(":", 1)[0], False)
+                return default
+            self._connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        record_cache_lookup(key.split(":", 1)[0], True)
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl_seconds=_MISSING):
+        """Store a JSON-serialisable value, then evict least recently used entries above `max_bytes`."""
+        ttl_seconds = self.ttl_seconds if ttl_seconds is _MISSING else ttl_seconds
+        serialized = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized.encode("utf-8")), now, expires_at, now),
+            )
+            self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now):
+        self._connection.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._connection.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        logger.info(f"Cache evicted {len(evicted)} entries")
+
+    def stats(self):
+        """Return hit/miss counters, number of entries and total size in bytes."""
+        with self._lock:
+            entries, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the result cache shared by the whole process."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def set_cache(result_cache):
+    """Replace the shared result cache, e.g. by an empty one for benchmarks; None restores the default one."""
+    global _cache
+    with _cache_lock:
+        _cache = result_cache
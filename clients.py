@@ -0,0 +1,131 @@
+import functools
+import logging
+import threading
+
+from settings import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+# Connection pool of the HTTP client shared by every Groq call, unless set in the settings
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY_SECONDS = 60
+
+_lock = threading.Lock()
+_groq_client = None
+_genai_configured = False
+_generative_model_factory = None
+
+
+class ConnectionStats:
+    """Count HTTP requests and the new connections they needed, to check keep-alive reuse."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        # httpcore calls this trace hook for every connection lifecycle event of the request
+        request.extensions["trace"] = self.on_trace_event
+
+    def on_trace_event(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+
+    def as_dict(self):
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+def get_groq_api_key():
+    return get_settings().require("groq_api_key")
+
+
+def get_google_api_key():
+    return get_settings().require("google_api_key")
+
+
+def get_groq_client():
+    """Return the Groq client shared by the whole process.
+
+    The client is thread-safe and keeps its HTTP connections alive between calls,
+    so requests reuse pooled connections instead of paying a new TLS handshake.
+    The pool sizes come from the settings (GROQ_MAX_CONNECTIONS, GROQ_MAX_KEEPALIVE_CONNECTIONS,
+    GROQ_KEEPALIVE_EXPIRY_SECONDS) when the client is built, the module constants otherwise.
+    The SDK is imported on first use, it is not needed to import the app or start a worker.
+    """
+    global _groq_client
+    with _lock:
+        if _groq_client is None:
+            import httpx
+            from groq import Groq
+
+            settings = get_settings()
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=settings.groq_max_connections or MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.groq_max_keepalive_connections or MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.groq_keepalive_expiry or KEEPALIVE_EXPIRY_SECONDS,
+                ),
+                event_hooks={"request": [connection_stats.on_request]},
+            )
+            _groq_client = Groq(api_key=get_groq_api_key(), http_client=http_client)
+        return _groq_client
+
+
+def set_groq_client(client):
+    """Replace the shared Groq client, e.g. by a local stand-in for offline benchmarks.
+
+    Passing None drops the current client, the real one is built again on next use.
+    """
+    global _groq_client
+    with _lock:
+        _groq_client = client
+
+
+def set_generative_model_factory(factory):
+    """Build Gemini models with `factory(model_name, system_instruction)` instead of the SDK; None restores it."""
+    global _generative_model_factory
+    with _lock:
+        _generative_model_factory = factory
+    get_generative_model.cache_clear()
+
+
+def _configure_genai():
+    import google.generativeai as genai
+
+    global _genai_configured
+    with _lock:
+        if not _genai_configured:
+            genai.configure(api_key=get_google_api_key())
+            _genai_configured = True
+
+
+@functools.lru_cache(maxsize=32)
+def get_generative_model(model_name, system_instruction=None):
+    """Return a cached Gemini model for the (model_name, system_instruction) pair."""
+    if _generative_model_factory is not None:
+        return _generative_model_factory(model_name, system_instruction)
+    import google.generativeai as genai
+
+    _configure_genai()
+    return genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+
+
+def get_connection_stats():
+    """Return the number of HTTP requests made through the shared clients and how many reused a connection."""
+    return connection_stats.as_dict()
@@ -0,0 +1,123 @@
+import base64
+import threading
+import time
+
+from frame_filters import detect_text_regions, crop_to_text_regions
+
+
+# Frames wider than this are scaled down before encoding, 4K frames only cost upload bytes and image tokens
+ENCODE_MAX_WIDTH = 1920
+
+ENCODE_FORMAT = "jpeg"
+ENCODE_QUALITY = 90
+
+# Extension, OpenCV quality flag name and MIME type of the supported image formats
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", "IMWRITE_JPEG_QUALITY", "image/jpeg"),
+    "webp": (".webp", "IMWRITE_WEBP_QUALITY", "image/webp"),
+}
+
+# Regions of interest a frame can be cropped to before encoding
+ROI_MODES = (None, "lower_third", "text")
+
+
+def crop_lower_third(frame):
+    """Bottom third of the frame, where disclaimers and legal lines usually sit."""
+    height = frame.shape[0]
+    return frame[height - height // 3:]
+
+
+class FrameEncoder:
+    """Encode frames for the vision model: crop to a region of interest, downscale, compress.
+
+    `roi` is None for the whole frame, "lower_third", or "text" for the area holding the
+    detected text regions (the whole frame when none is found). Frames wider than
+    `max_width` are scaled down; the resized pixels are written into a buffer reused
+    across frames of the same size. Encoded sizes and encoding times are recorded.
+    """
+
+    def __init__(self, max_width=ENCODE_MAX_WIDTH, image_format=ENCODE_FORMAT, quality=ENCODE_QUALITY,
+                 roi=None, text_detection_params=None):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format {image_format}, expected one of {list(IMAGE_FORMATS)}")
+        if roi not in ROI_MODES:
+            raise ValueError(f"Unsupported region of interest {roi}, expected one of {list(ROI_MODES)}")
+        self.max_width = max_width
+        self.image_format = image_format
+        self.quality = quality
+        self.roi = roi
+        self.text_detection_params = text_detection_params or {}
+        self._lock = threading.Lock()
+        self._buffer = None
+        self.frames = 0
+        self.bytes = 0
+        self.encode_seconds = 0.0
+
+    @property
+    def mime_type(self):
+        return IMAGE_FORMATS[self.image_format][2]
+
+    def describe(self):
+        """Short description of the settings, e.g. for benchmark reports."""
+        return f"{self.image_format} q{self.quality} max {self.max_width or 'full'}px roi {self.roi or 'full'}"
+
+    def prepare(self, frame, reuse_buffer=False):
+        """Crop the frame to the region of interest and scale it down to `max_width`.
+
+        With `reuse_buffer` the result is written into the encoder's buffer, it is only
+        valid until the next call.
+        """
+        import cv2
+
+        if self.roi == "lower_third":
+            frame = crop_lower_third(frame)
+        elif self.roi == "text":
+            regions = detect_text_regions(frame, **self.text_detection_params)
+            if regions:
+                frame = crop_to_text_regions(frame, regions)
+
+        height, width = frame.shape[:2]
+        if not self.max_width or width <= self.max_width:
+            return frame
+        size = (self.max_width, max(int(height * self.max_width / width), 1))
+        if not reuse_buffer:
+            return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if self._buffer is None or self._buffer.shape[:2] != (size[1], size[0]) or self._buffer.shape[2:] != frame.shape[2:]:
+            self._buffer = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        else:
+            cv2.resize(frame, size, dst=self._buffer, interpolation=cv2.INTER_AREA)
+        return self._buffer
+
+    def _compress(self, image):
+        import cv2
+
+        extension, quality_flag, _ = IMAGE_FORMATS[self.image_format]
+        start = time.perf_counter()
+        ok, buffer = cv2.imencode(extension, image, [getattr(cv2, quality_flag), int(self.quality)])
+        if not ok:
+            return None
+        encoded = base64.b64encode(buffer).decode("utf-8")
+        self.frames += 1
+        self.bytes += len(encoded)
+        self.encode_seconds += time.perf_counter() - start
+        return encoded
+
+    def encode_image(self, image):
+        """Compress an already prepared image (e.g. a montage) and return it base64-encoded, or None on failure."""
+        with self._lock:
+            return self._compress(image)
+
+    def encode(self, frame):
+        """Prepare and compress a frame, return its base64 string or None on failure."""
+        with self._lock:
+            return self._compress(self.prepare(frame, reuse_buffer=True))
+
+    def stats(self):
+        """Frames encoded, total and mean payload bytes (base64) and mean encoding time."""
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "bytes": self.bytes,
+                "bytes_per_frame": self.bytes / self.frames if self.frames else 0.0,
+                "encode_ms_per_frame": 1000 * self.encode_seconds / self.frames if self.frames else 0.0,
+            }
@@ -0,0 +1,139 @@
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def difference_hash(frame, hash_size=16):
+    """Compute the difference hash (dHash) of a frame as a flat boolean array."""
+    import cv2
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    resized = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return (resized[:, 1:] > resized[:, :-1]).flatten()
+
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hashes."""
+    import numpy as np
+
+    return int(np.count_nonzero(hash_a != hash_b))
+
+
+def thumbnail(frame, size=(48, 27)):
+    """Downscale a frame to a small grayscale thumbnail used for local difference checks."""
+    import cv2
+    import numpy as np
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+class FrameDeduplicator:
+    """Detect frames whose visual content did not change compared to recently kept frames.
+
+    A frame is a duplicate of a kept frame when both its dHash is within `hash_threshold`
+    bits and no cell of its thumbnail differs by more than `pixel_threshold`.
+    The thumbnail check catches small-print text appearing on an otherwise identical frame,
+    which barely moves a global perceptual hash.
+    """
+
+    def __init__(self, hash_threshold=12, pixel_threshold=18, history=10):
+        self.hash_threshold = hash_threshold
+        self.pixel_threshold = pixel_threshold
+        self.history = history
+        self._kept = []  # list of (timestamp, hash, thumbnail)
+
+    def check(self, timestamp, frame):
+        """Return the timestamp of the kept frame this frame duplicates.
+
+        If the frame is new it is kept and its own timestamp is returned.
+        """
+        import numpy as np
+
+        frame_hash = difference_hash(frame)
+        frame_thumbnail = thumbnail(frame)
+        # Most recent first, consecutive duplicates are the common case
+        for kept_timestamp, kept_hash, kept_thumbnail in reversed(self._kept):
+            if hamming_distance(frame_hash, kept_hash) > self.hash_threshold:
+                continue
+            if np.abs(frame_thumbnail - kept_thumbnail).max() > self.pixel_threshold:
+                continue
+            return kept_timestamp
+
+        self._kept.append((timestamp, frame_hash, frame_thumbnail))
+        self._kept = self._kept[-self.history:]
+        return timestamp
+
+
+def deduplicate_frames(samples, hash_threshold=12, pixel_threshold=18, history=10):
+    """Split `(timestamp, frame)` samples into unique frames and a timestamp mapping.
+
+    Returns `(unique_samples, mapping)` where `mapping[timestamp]` is the timestamp of
+    the unique frame whose text should be attributed to that timestamp.
+    """
+    deduplicator = FrameDeduplicator(hash_threshold, pixel_threshold, history)
+    unique_samples = []
+    mapping = {}
+    for timestamp, frame in samples:
+        mapping[timestamp] = deduplicator.check(timestamp, frame)
+        if mapping[timestamp] == timestamp:
+            unique_samples.append((timestamp, frame))
+
+    logger.info(f"Frame deduplication kept {len(unique_samples)} of {len(mapping)} frames")
+    return unique_samples, mapping
+
+
+def detect_text_regions(frame, min_height=6, max_height_ratio=0.2, min_width=20, min_aspect=1.5, min_fill=0.4, working_width=960):
+    """Locate regions of a frame that likely contain text, returned as (x, y, w, h) boxes.
+
+    Text lines show up as dense, horizontally elongated clusters of strong gradients:
+    the morphological gradient is thresholded, characters are joined into lines with a
+    horizontal closing, and the resulting blobs are filtered on size, aspect ratio and
+    gradient density. All thresholds are expressed at `working_width` resolution.
+    """
+    import cv2
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    height, width = gray.shape[:2]
+    scale = 1.0
+    if width > working_width:
+        scale = working_width / width
+        gray = cv2.resize(gray, (working_width, int(round(height * scale))), interpolation=cv2.INTER_AREA)
+
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    joined = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours, _ = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    max_height = max_height_ratio * gray.shape[0]
+    regions = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if h < min_height or h > max_height or w < min_width or w / h < min_aspect:
+            continue
+        fill = cv2.countNonZero(binary[y:y + h, x:x + w]) / float(w * h)
+        if fill < min_fill:
+            continue
+        regions.append((
+            int(x / scale), int(y / scale), int(round(w / scale)), int(round(h / scale))
+        ))
+
+    return sorted(regions, key=lambda box: (box[1], box[0]))
+
+
+def has_text(frame, **detection_params):
+    """Return True if the frame likely contains on-screen text."""
+    return len(detect_text_regions(frame, **detection_params)) > 0
+
+
+def crop_to_text_regions(frame, regions, padding=12):
+    """Crop the frame to the bounding box enclosing all the text regions, plus some padding."""
+    if not regions:
+        return frame
+    height, width = frame.shape[:2]
+    x0 = max(min(x for x, _, _, _ in regions) - padding, 0)
+    y0 = max(min(y for _, y, _, _ in regions) - padding, 0)
+    x1 = min(max(x + w for x, _, w, _ in regions) + padding, width)
+    y1 = min(max(y + h for _, y, _, h in regions) + padding, height)
+    return frame[y0:y1, x0:x1]
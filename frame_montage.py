@@ -0,0 +1,64 @@
+import math
+
+
+# Tiles per montage sent in a single vision request
+MONTAGE_COLUMNS = 2
+MONTAGE_ROWS = 2
+
+# Size of each tile, frames are scaled down to fit it with their aspect ratio kept
+MONTAGE_TILE_WIDTH = 640
+MONTAGE_TILE_HEIGHT = 360
+
+# Height of the strip above each tile holding its label
+LABEL_HEIGHT = 28
+TILE_BORDER = 4
+
+
+def tile_label(index):
+    """Label of the tile at `index`, as the model is asked to report it."""
+    return f"T{index + 1}"
+
+
+def fit_to_tile(frame, tile_width=MONTAGE_TILE_WIDTH, tile_height=MONTAGE_TILE_HEIGHT):
+    """Scale a frame down to fit the tile and pad it with black to the exact tile size."""
+    import cv2
+    import numpy as np
+
+    height, width = frame.shape[:2]
+    scale = min(tile_width / width, tile_height / height, 1.0)
+    if scale < 1.0:
+        frame = cv2.resize(frame, (max(int(width * scale), 1), max(int(height * scale), 1)), interpolation=cv2.INTER_AREA)
+    tile = np.zeros((tile_height, tile_width, 3), dtype=np.uint8)
+    height, width = frame.shape[:2]
+    top = (tile_height - height) // 2
+    left = (tile_width - width) // 2
+    tile[top:top + height, left:left + width] = frame if frame.ndim == 3 else cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    return tile
+
+
+def build_montage(frames, captions=None, columns=MONTAGE_COLUMNS,
+                  tile_width=MONTAGE_TILE_WIDTH, tile_height=MONTAGE_TILE_HEIGHT):
+    """Tile frames into one grid image, each tile under a strip with its label and caption.
+
+    Tiles are laid out row by row with `columns` tiles per row and labelled "T1", "T2", ...
+    `captions` (e.g. the timestamps) are written next to the labels.
+    """
+    import cv2
+    import numpy as np
+
+    columns = max(min(columns, len(frames)), 1)
+    rows = math.ceil(len(frames) / columns)
+    cell_width = tile_width + 2 * TILE_BORDER
+    cell_height = tile_height + LABEL_HEIGHT + 2 * TILE_BORDER
+    montage = np.full((rows * cell_height, columns * cell_width, 3), 255, dtype=np.uint8)
+
+    for index, frame in enumerate(frames):
+        row, column = divmod(index, columns)
+        top = row * cell_height + TILE_BORDER
+        left = column * cell_width + TILE_BORDER
+        label = tile_label(index)
+        if captions is not None:
+            label = f"{label} | {captions[index]}"
+        cv2.putText(montage, label, (left + 4, top + LABEL_HEIGHT - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2, cv2.LINE_AA)
+        montage[top + LABEL_HEIGHT:top + LABEL_HEIGHT + tile_height, left:left + tile_width] = fit_to_tile(frame, tile_width, tile_height)
+    return montage
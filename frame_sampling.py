@@ -0,0 +1,272 @@
+import collections
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+logger = logging.getLogger(__name__)
+
+# Sampling policies supported by `sample_frames`
+SAMPLING_POLICIES = ("interval", "count", "keyframes")
+
+# Above this many frames between two samples, seeking is cheaper than grabbing forward
+SEEK_THRESHOLD_FRAMES = 48
+
+# Segments per decoding process, more segments balance the load better but cost more seeks
+SEGMENTS_PER_PROCESS = 4
+
+# Segments decoded ahead of the one being yielded, per process; bounds the shared memory in use
+SEGMENTS_IN_FLIGHT_PER_PROCESS = 2
+
+
+def get_video_duration(video):
+    """Return the duration in seconds of an opened cv2.VideoCapture."""
+    import cv2
+
+    fps = video.get(cv2.CAP_PROP_FPS)
+    total_frames = video.get(cv2.CAP_PROP_FRAME_COUNT)
+    if not fps or not total_frames:
+        return 0.0
+    return total_frames / fps
+
+
+def get_ffmpeg_binary():
+    """Return the ffmpeg executable bundled with moviepy (through imageio-ffmpeg)."""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def keyframe_timestamps(video_path):
+    """List the timestamps (seconds) of the keyframes of the video using ffmpeg.
+
+    Only keyframes are decoded (`-skip_frame nokey`), so this is cheap even for long videos.
+    """
+    command = [
+        get_ffmpeg_binary(), "-hide_banner", "-nostats",
+        "-skip_frame", "nokey", "-i", video_path,
+        "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-",
+    ]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error(f"Could not list keyframes of {video_path}: {e}")
+        return []
+
+    timestamps = [float(match) for match in re.findall(r"pts_time:([0-9.]+)", completed.stderr)]
+    return sorted(set(timestamps))
+
+
+def sample_timestamps(duration, policy="interval", interval_seconds=5, num_frames=None):
+    """Compute the exact timestamps (seconds) to sample for a video of the given duration.
+
+    - "interval": one frame every `interval_seconds`, starting at 0.
+    - "count": `num_frames` frames spread evenly over the video.
+    """
+    if duration <= 0:
+        return []
+
+    if policy == "interval":
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be positive")
+        count = int(duration // interval_seconds) + 1
+        # Multiply instead of accumulating so timestamps stay exact
+        timestamps = [round(i * interval_seconds, 6) for i in range(count)]
+        return [t for t in timestamps if t < duration]
+
+    if policy == "count":
+        if not num_frames or num_frames <= 0:
+            raise ValueError("num_frames must be a positive integer for the 'count' policy")
+        step = duration / num_frames
+        return [round(i * step, 6) for i in range(num_frames)]
+
+    raise ValueError(f"Unknown sampling policy: {policy}. Expected one of {SAMPLING_POLICIES}")
+
+
+def _policy_timestamps(video, video_path, policy, interval_seconds, num_frames):
+    if policy == "keyframes":
+        return keyframe_timestamps(video_path)
+    return sample_timestamps(get_video_duration(video), policy, interval_seconds, num_frames)
+
+
+def video_sample_timestamps(video_path, policy="interval", interval_seconds=5, num_frames=None):
+    """Return the timestamps `sample_frames` would sample with the given policy."""
+    import cv2
+
+    video = cv2.VideoCapture(video_path)
+    try:
+        return _policy_timestamps(video, video_path, policy, interval_seconds, num_frames)
+    finally:
+        video.release()
+
+
+def sample_frames(video_path, policy="interval", interval_seconds=5, num_frames=None, timestamps=None):
+    """Yield `(timestamp_seconds, frame)` for the sampled frames of the video.
+
+    Only the sampled frames are decoded: short gaps are skipped with `grab()`
+    (no colour conversion) and long gaps with a seek, so the cost depends on the
+    number of samples rather than on the length of the video.
+    Pass `timestamps` to sample an explicit list of timestamps instead of a policy,
+    in any order (going backwards costs a seek per frame).
+    """
+    import cv2
+
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        logger.error(f"Could not open video {video_path}")
+        return
+
+    try:
+        fps = video.get(cv2.CAP_PROP_FPS) or 0.0
+        if timestamps is None:
+            timestamps = _policy_timestamps(video, video_path, policy, interval_seconds, num_frames)
+
+        if fps <= 0:
+            # Without a frame rate we cannot map timestamps to frames, seek by time only
+            for timestamp in timestamps:
+                video.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+                success, frame = video.read()
+                if success:
+                    yield timestamp, frame
+            return
+
+        next_frame_index = 0
+        for timestamp in timestamps:
+            target_index = int(round(timestamp * fps))
+            gap = target_index - next_frame_index
+            if gap < 0 or gap > SEEK_THRESHOLD_FRAMES:
+                video.set(cv2.CAP_PROP_POS_FRAMES, target_index)
+            else:
+                for _ in range(gap):
+                    if not video.grab():
+                        return
+            success, frame = video.read()
+            if not success:
+                logger.warning(f"Could not decode frame at {timestamp:.3f} seconds")
+                continue
+            next_frame_index = target_index + 1
+            yield timestamp, frame
+    finally:
+        video.release()
+
+
+def _init_segment_worker():
+    import cv2
+
+    # One decoding thread per process, the processes already use every core
+    cv2.setNumThreads(1)
+
+
+def _start_method():
+    # Forking a threaded process can copy a lock held by another thread (logging, sqlite) into the child
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _frame_shape(video_path):
+    """Shape of the decoded BGR frames of the video, as reported by its capture."""
+    import cv2
+
+    video = cv2.VideoCapture(video_path)
+    try:
+        return int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(video.get(cv2.CAP_PROP_FRAME_WIDTH)), 3
+    finally:
+        video.release()
+
+
+def _decode_segment(video_path, timestamps, buffer_name, shape):
+    """Decode the frames of one segment into the shared memory block `buffer_name`, one `shape` slot per timestamp.
+
+    Returns `(timestamp, slot, frame)` for each decoded frame: `frame` is None when the frame was
+    written to `slot`, and holds the frame itself when its shape differs (e.g. a rotated video).
+    """
+    import numpy as np
+
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        slots = np.ndarray((len(timestamps), *shape), dtype=np.uint8, buffer=buffer.buf)
+        decoded = []
+        for slot, (timestamp, frame) in enumerate(sample_frames(video_path, timestamps=timestamps)):
+            if frame.shape == shape:
+                slots[slot] = frame
+                decoded.append((timestamp, slot, None))
+            else:
+                decoded.append((timestamp, None, frame))
+        del slots
+        return decoded
+    finally:
+        buffer.close()
+
+
+def split_segments(timestamps, segments):
+    """Split the timestamps into at most `segments` contiguous runs of similar length."""
+    segments = max(min(segments, len(timestamps)), 1)
+    size, remainder = divmod(len(timestamps), segments)
+    runs = []
+    start = 0
+    for index in range(segments):
+        end = start + size + (1 if index < remainder else 0)
+        runs.append(timestamps[start:end])
+        start = end
+    return [run for run in runs if run]
+
+
+def sample_frames_parallel(video_path, policy="interval", interval_seconds=5, num_frames=None, timestamps=None,
+                           processes=None, segments=None):
+    """Same as `sample_frames`, with the sampled frames decoded by a pool of processes.
+
+    The timestamps are split into contiguous segments, `SEGMENTS_PER_PROCESS` per process
+    by default, and each worker opens its own capture and seeks to the start of its segment.
+    Workers write the raw frames into a shared memory block per segment, so frames are neither
+    pickled nor recompressed before the vision encoder; at most `SEGMENTS_IN_FLIGHT_PER_PROCESS`
+    segments per process are decoded ahead. Frames are yielded in the order of the timestamps.
+    The workers are started with forkserver (spawn where unavailable), never forked from the
+    threads of the caller. Worth it for long or high-bitrate videos, where decoding is the bottleneck.
+    """
+    import numpy as np
+
+    if timestamps is None:
+        timestamps = video_sample_timestamps(video_path, policy, interval_seconds, num_frames)
+    if not timestamps:
+        return
+    processes = processes or os.cpu_count() or 1
+    runs = iter(split_segments(list(timestamps), segments or processes * SEGMENTS_PER_PROCESS))
+    shape = _frame_shape(video_path)
+    frame_bytes = int(np.prod(shape))
+
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(_start_method()),
+                                   initializer=_init_segment_worker)
+    # Segments submitted and not yielded yet, in timestamp order: (buffer, run length, future)
+    pending = collections.deque()
+
+    def submit_next():
+        run = next(runs, None)
+        if run is not None:
+            buffer = shared_memory.SharedMemory(create=True, size=max(len(run) * frame_bytes, 1))
+            pending.append((buffer, len(run), executor.submit(_decode_segment, video_path, run, buffer.name, shape)))
+
+    try:
+        for _ in range(processes * SEGMENTS_IN_FLIGHT_PER_PROCESS):
+            submit_next()
+        while pending:
+            buffer, run_length, future = pending[0]
+            decoded = future.result()
+            slots = np.ndarray((run_length, *shape), dtype=np.uint8, buffer=buffer.buf)
+            # Copied out so the block can be released before the frames are consumed
+            frames = [(timestamp, slots[slot].copy() if frame is None else frame) for timestamp, slot, frame in decoded]
+            del slots
+            pending.popleft()
+            buffer.close()
+            buffer.unlink()
+            submit_next()
+            yield from frames
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        for buffer, _, _ in pending:
+            buffer.close()
+            buffer.unlink()
@@ -1,26 +1,96 @@
-import os
-from dotenv import load_dotenv
-from groq import Groq
 import typing_extensions as typing
 import logging
 import json
-import streamlit as st
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tenacity import Retrying, retry_if_exception_type, stop_after_delay, wait_random_exponential
 
-GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
-
-# load_dotenv()
-# GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+from cache import get_cache, make_key
+from clients import get_groq_client
+from rate_limiting import RequestCancelled, get_rate_limiter, estimate_tokens
+from retrieval import PassageIndex, RETRIEVAL_MIN_TOKENS
+from rule_batching import build_rule_prompt, evaluate_rules_batched
+from script import GeminiResponse
+from tracing import TracedThreadPoolExecutor, record_retry, record_usage, span, traced
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Deadline in seconds for evaluating a single rule, retries and rate limiting included
+RULE_TIMEOUT_SECONDS = 120
+
+# Completion tokens reserved in the tokens-per-minute budget for each request
+COMPLETION_TOKENS_ESTIMATE = 400
+
+# Upper bound on the number of rules evaluated at the same time
+MAX_RULE_WORKERS = 8
+
+
+def _rate_limited_completion(client, timeout, cancel_event=None, **request):
+    """Create a chat completion under the model's shared rate limit, retrying 429s with backoff until `timeout`.
+
+    Setting `cancel_event` raises `RequestCancelled` before the next attempt is sent.
+    """
+    from groq import RateLimitError
+
+    deadline = time.monotonic() + timeout
+    prompt_text = "".join(message["content"] for message in request["messages"])
+    rate_limiter = get_rate_limiter(request["model"])
+
+    for attempt in Retrying(
+        retry=retry_if_exception_type(RateLimitError),
+        wait=wait_random_exponential(multiplier=1, max=20),
+        stop=stop_after_delay(timeout),
+        reraise=True,
+    ):
+        with attempt:
+            if attempt.retry_state.attempt_number > 1:
+                record_retry(request["model"])
+            if cancel_event is not None and cancel_event.is_set():
+                raise RequestCancelled(f"Request to {request['model']} cancelled")
+            remaining = deadline - time.monotonic()
+            if not rate_limiter.acquire(estimate_tokens(prompt_text) + COMPLETION_TOKENS_ESTIMATE, timeout=remaining,
+                                        cancel_event=cancel_event):
+                raise TimeoutError(f"Rate limit budget of {request['model']} not available within {timeout} seconds")
+            # The span covers the request only, the rate limit wait has its own span
+            with span("groq.chat", model=request["model"]):
+                response = client.chat.completions.create(timeout=max(deadline - time.monotonic(), 1), **request)
+                record_usage(response, request["model"])
+            return response
+
+
+def generation_cache_key(prompt: str, system_message: str, model: str) -> str:
+    """Cache key of the verdict of `model` for these arguments, whichever provider serves the model."""
+    return make_key("chat", model, system_message, prompt)
+
+
+def cached_generation(prompt: str, system_message: str, model: str) -> typing.Optional[dict]:
+    """Return the cached output of `groq_model_generation` for these arguments, or None."""
+    return get_cache().get(generation_cache_key(prompt, system_message, model))
+
+
+@traced("rule_check")
+def groq_model_generation(prompt: str, system_message: str, model: str, timeout: float = RULE_TIMEOUT_SECONDS,
+                          cancel_event: typing.Optional[threading.Event] = None) -> dict:
+    """Model names: llama3_1, mixtral, gemma
+
+    Parsed outputs are cached by (model, system_message, prompt).
+    Setting `cancel_event` abandons the request, raising `RequestCancelled`, unless it was already sent.
+    """
+    cache = get_cache()
+    cache_key = generation_cache_key(prompt, system_message, model)
+    cached_output = cache.get(cache_key)
+    if cached_output is not None:
+        return cached_output
 
-def groq_model_generation(prompt: str, system_message: str, model: str) -> dict:
-    """Model names: llama3_1, mixtral, gemma"""
     try:
-        client = Groq(api_key=GROQ_API_KEY)
-        response = client.chat.completions.create(
+        client = get_groq_client()
+        response = _rate_limited_completion(
+            client,
+            timeout,
+            cancel_event,
             messages=[
                 {
                     "role": "system",
@@ -41,35 +111,122 @@ def groq_model_generation(prompt: str, system_message: str, model: str) -> dict:
 
         # Parse result and raise exception if it's not valid JSON
         try:
-            return json.loads(result)
+            with span("json_parse"):
+                output = json.loads(result)
         except json.JSONDecodeError:
             logger.error("Invalid JSON output string")
             raise
+        cache.set(cache_key, output)
+        return output
 
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
         raise
 
 
-def groq_inference(system_message: str, model_name: str, rules_list: list[str], sales_deck: str) -> typing.Optional[str]:
-    """Perform inference using the groq api models and return the generated response."""
-    output_list = []
-    for rule in rules_list:
-        input_text = f"""
-        The rule is: {rule}
-        The sales deck to evaluate is: {sales_deck}
-        Your MUST provide an output in JSON representation with the following fields:
-        "rule_name",
-        "label",
-        "part",
-        "suggestion"
-        """
-        model_output = groq_model_generation(input_text, system_message, model_name)
-        output_list.append(model_output)
-        
+def error_verdict(rule: str, error: Exception) -> dict:
+    """Verdict standing for a rule that could not be evaluated, e.g. after a timeout; its label is None."""
+    return {"rule_name": rule.strip(), "label": None, "part": [], "suggestion": [], "error": str(error) or type(error).__name__}
+
+
+def is_inconclusive(model_output) -> bool:
+    """A verdict is inconclusive when it is malformed, or non-compliant without pointing at any text."""
+    if not isinstance(model_output, dict) or not isinstance(model_output.get("label"), bool):
+        return True
+    return model_output["label"] is False and not model_output.get("part")
+
+
+def iter_groq_inference(system_message: str, model_name: str, rules_list: list[str], sales_deck: str,
+                        max_workers: typing.Optional[int] = None, rule_timeout: float = RULE_TIMEOUT_SECONDS,
+                        retrieval_top_n: typing.Optional[int] = None,
+                        cancel_event: typing.Optional[threading.Event] = None,
+                        executor: typing.Optional[ThreadPoolExecutor] = None,
+                        generate: typing.Optional[typing.Callable[..., dict]] = None) -> typing.Iterator[tuple[int, dict]]:
+    """Evaluate the rules concurrently and yield `(rule_index, output)` as soon as each one is done.
+
+    Setting `cancel_event`, or closing the generator, stops the rules that did not start yet.
+    A rule that fails, e.g. by waiting for its rate limit budget past `rule_timeout`, yields an
+    `error_verdict` so the verdicts of the other rules are kept.
+    With `retrieval_top_n`, long transcripts are indexed once and each rule only gets its
+    `retrieval_top_n` most relevant passages; inconclusive verdicts are re-run on the full text.
+    Pass `executor` to run the rules on a shared thread pool instead of a dedicated one, and
+    `generate` to replace `groq_model_generation`, e.g. with `routing.Router.generate`.
+    """
+    generate = generate or groq_model_generation
+    passage_index = None
+    if retrieval_top_n and estimate_tokens(sales_deck) > RETRIEVAL_MIN_TOKENS:
+        passage_index = PassageIndex(sales_deck)
+
+    def evaluate_rule(rule):
+        if passage_index is not None:
+            excerpts = passage_index.select(rule, retrieval_top_n)
+            if excerpts is not None:
+                input_text = build_rule_prompt(rule, excerpts)
+                model_output = generate(input_text, system_message, model_name, rule_timeout)
+                if not is_inconclusive(model_output):
+                    return model_output
+                logger.info(f"Inconclusive verdict on excerpts for rule {rule.strip()}, evaluating the full transcript")
+        input_text = build_rule_prompt(rule, sales_deck)
+        return generate(input_text, system_message, model_name, rule_timeout)
+
+    own_executor = executor is None
+    if own_executor:
+        max_workers = max_workers or min(len(rules_list), MAX_RULE_WORKERS) or 1
+        executor = TracedThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(evaluate_rule, rule): index for index, rule in enumerate(rules_list)}
+    try:
+        for future in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            rule_index = futures[future]
+            try:
+                output = future.result()
+            except Exception as e:
+                logger.error(f"Rule {rules_list[rule_index].strip()} could not be evaluated: {e!r}")
+                output = error_verdict(rules_list[rule_index], e)
+            yield rule_index, output
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            for future in futures:
+                future.cancel()
+
+
+def groq_inference(system_message: str, model_name: str, rules_list: list[str], sales_deck: str,
+                   max_workers: typing.Optional[int] = None, rule_timeout: float = RULE_TIMEOUT_SECONDS,
+                   rules_per_request: typing.Union[int, str] = 1,
+                   retrieval_top_n: typing.Optional[int] = None) -> typing.Optional[str]:
+    """Perform inference using the groq api models and return the generated response.
+
+    Rules are evaluated concurrently under the model's shared rate limit, each within
+    `rule_timeout` seconds, and the outputs are returned in the order of `rules_list`.
+    With `rules_per_request` above 1 (or "auto"), several rules share each request,
+    see `rule_batching.evaluate_rules_batched`. Otherwise see `iter_groq_inference`.
+    Batches share one prompt, so they cannot use the per-rule `retrieval_top_n` excerpts.
+    """
+    if rules_per_request != 1 and retrieval_top_n:
+        raise ValueError("retrieval_top_n only applies to one rule per request, not to batched rules")
+    if rules_per_request != 1:
+        output_list, _ = evaluate_rules_batched(
+            rules_list, sales_deck, system_message, model_name,
+            generate_batch=lambda prompt: groq_model_generation(prompt, system_message, model_name, rule_timeout),
+            evaluate_rule=lambda rule: groq_model_generation(build_rule_prompt(rule, sales_deck), system_message, model_name, rule_timeout),
+            verdict_schema=GeminiResponse,
+            rules_per_request=rules_per_request,
+            max_workers=max_workers or min(len(rules_list), MAX_RULE_WORKERS) or 1,
+        )
+        return output_list
+
+    outputs = dict(iter_groq_inference(system_message, model_name, rules_list, sales_deck, max_workers, rule_timeout, retrieval_top_n))
+    output_list = [outputs[index] for index in range(len(rules_list))]
+
     return output_list
 
 
+@traced("product_card")
 def video_card_generation(transcript: str, model: str) -> str:
     """Model names: llama3_1, mixtral, gemma"""
     system_message = """
@@ -93,9 +250,17 @@ def video_card_generation(transcript: str, model: str) -> str:
     - Industry: Financial Services
     - Product Summary: A portfolio management tool that assists investors in tracking and optimizing their asset allocations for improved investment outcomes.
     """
+    cache = get_cache()
+    cache_key = make_key("video_card", model, system_message, transcript)
+    cached_card = cache.get(cache_key)
+    if cached_card is not None:
+        return cached_card
+
     try:
-        client = Groq(api_key=GROQ_API_KEY)
-        response = client.chat.completions.create(
+        client = get_groq_client()
+        response = _rate_limited_completion(
+            client,
+            RULE_TIMEOUT_SECONDS,
             messages=[
                 {
                     "role": "system",
@@ -112,6 +277,7 @@ def video_card_generation(transcript: str, model: str) -> str:
 
         result = response.choices[0].message.content
         logger.info(f"Response: {result}")
+        cache.set(cache_key, result)
         return result
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
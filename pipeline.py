@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+
+from tracing import TracedThreadPoolExecutor, new_trace_id, span
+
+
+logger = logging.getLogger(__name__)
+
+# Threads of the executor shared by the fan-out work of every task (rule checks, transcription chunks, ...)
+PIPELINE_MAX_WORKERS = 16
+
+
+class TaskFailed(Exception):
+    """Raised for a task whose dependency failed or was cancelled."""
+
+
+class Pipeline:
+    """Small dependency graph of tasks, each started as soon as its dependencies are done.
+
+    `add(name, func, deps)` registers a task, `func` is called with the results of its
+    dependencies as keyword arguments (named after them) and runs in its own thread, so
+    independent tasks overlap. Tasks share `executor`, a bounded thread pool for their
+    fan-out work, and `cancel_event`. They can publish progress with `emit(event)`.
+    Each task runs in a root span of the pipeline's `trace_id`, see `tracing`.
+    Tasks can be added while the pipeline is running, e.g. once the user provided more input.
+    """
+
+    def __init__(self, max_workers=PIPELINE_MAX_WORKERS, cancel_event=None):
+        self.executor = TracedThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self.cancel_event = cancel_event or threading.Event()
+        self.started_at = time.perf_counter()
+        self.trace_id = new_trace_id()
+        self._condition = threading.Condition()
+        self._tasks = {}
+        self._events = []
+
+    def add(self, name, func, deps=()):
+        """Register a task; it starts right away if its dependencies are already done."""
+        with self._condition:
+            if name in self._tasks:
+                raise ValueError(f"Task {name} already exists")
+            missing = [dep for dep in deps if dep not in self._tasks]
+            if missing:
+                raise ValueError(f"Task {name} depends on unknown tasks {missing}")
+            self._tasks[name] = {
+                "name": name,
+                "func": func,
+                "deps": tuple(deps),
+                "status": "pending",
+                "result": None,
+                "error": None,
+                "added_at": time.perf_counter(),
+                "ready_at": None,
+                "started_at": None,
+                "finished_at": None,
+                "span_id": None,
+            }
+            self._schedule()
+        return name
+
+    def emit(self, event):
+        """Publish a progress event to the consumers of `iter_events`."""
+        with self._condition:
+            self._events.append(event)
+            self._condition.notify_all()
+
+    def _schedule(self):
+        # Called with the condition held
+        for task in self._tasks.values():
+            if task["status"] != "pending":
+                continue
+            deps = [self._tasks[dep] for dep in task["deps"]]
+            failed = [dep["name"] for dep in deps if dep["status"] in ("failed", "skipped")]
+            if failed or self.cancel_event.is_set():
+                task["status"] = "skipped"
+                task["error"] = TaskFailed(f"Task {task['name']} skipped, failed dependencies: {failed}" if failed else "Cancelled")
+                task["finished_at"] = time.perf_counter()
+                self._record(task)
+                self._schedule()
+                return
+            if all(dep["status"] == "done" for dep in deps):
+                task["status"] = "running"
+                task["ready_at"] = time.perf_counter()
+                kwargs = {dep["name"]: dep["result"] for dep in deps}
+                threading.Thread(target=self._run, args=(task, kwargs), name=f"task-{task['name']}", daemon=True).start()
+
+    def _run(self, task, kwargs):
+        task["started_at"] = time.perf_counter()
+        try:
+            # Run ids prefix the task names of review runs, keep the stage only in the span name
+            with span(f"task.{task['name'].split(':')[-1]}", trace_id=self.trace_id, task=task["name"],
+                      queue_wait_seconds=task["started_at"] - task["ready_at"]) as task_span:
+                task["span_id"] = task_span.span_id
+                result, error = task["func"](**kwargs), None
+        except Exception as e:
+            logger.error(f"Task {task['name']} failed: {e}")
+            result, error = None, e
+        with self._condition:
+            task["finished_at"] = time.perf_counter()
+            task["result"] = result
+            task["error"] = error
+            task["status"] = "failed" if error is not None else "done"
+            self._record(task)
+            self._schedule()
+
+    def _record(self, task):
+        # Called with the condition held
+        self._events.append({"stage": "task", "task": task["name"], "status": task["status"],
+                             "error": task["error"], "timing": self._timing(task)})
+        self._condition.notify_all()
+
+    def _timing(self, task):
+        def offset(moment):
+            return None if moment is None else moment - self.started_at
+
+        return {
+            "deps": list(task["deps"]),
+            "status": task["status"],
+            "ready": offset(task["ready_at"]),
+            "started": offset(task["started_at"]),
+            "finished": offset(task["finished_at"]),
+            "run_seconds": task["finished_at"] - task["started_at"] if task["started_at"] and task["finished_at"] else None,
+            "span_id": task["span_id"],
+        }
+
+    def result(self, name, timeout=None):
+        """Wait for a task and return its result, raising its error if it failed."""
+        with self._condition:
+            task = self._tasks[name]
+            if not self._condition.wait_for(lambda: task["status"] in ("done", "failed", "skipped"), timeout):
+                raise TimeoutError(f"Task {name} still running after {timeout} seconds")
+            if task["error"] is not None:
+                raise task["error"]
+            return task["result"]
+
+    def iter_events(self, until=None, since=0):
+        """Yield the events published from index `since` on, until the tasks in `until` (all by default) are finished.
+
+        Events are the progress events of the tasks and, for each finished task,
+        {"stage": "task", "task", "status", "error", "timing"}.
+        """
+        position = since
+        while True:
+            with self._condition:
+                names = list(until) if until is not None else list(self._tasks)
+
+                def finished():
+                    return all(self._tasks[name]["status"] in ("done", "failed", "skipped") for name in names)
+
+                self._condition.wait_for(lambda: position < len(self._events) or finished())
+                events = self._events[position:]
+                position = len(self._events)
+                done = finished()
+            yield from events
+            if done and not events:
+                return
+
+    def cancel(self):
+        """Stop scheduling tasks and cancel the executor's queued work; running tasks see `cancel_event`."""
+        self.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def timings(self):
+        """Timing of every task, in seconds since the pipeline was created."""
+        with self._condition:
+            return {name: self._timing(task) for name, task in self._tasks.items()}
+
+    def critical_path(self):
+        """Chain of tasks that determined the total latency, ending with the last task to finish.
+
+        Returns `(task names, seconds)`; going back from the last task, each step follows the
+        dependency that finished last, i.e. the one the task was waiting for.
+        """
+        timings = {name: timing for name, timing in self.timings().items() if timing["finished"] is not None}
+        if not timings:
+            return [], 0.0
+        name = max(timings, key=lambda name: timings[name]["finished"])
+        total = timings[name]["finished"]
+        path = [name]
+        while timings[name]["deps"]:
+            name = max(timings[name]["deps"], key=lambda dep: timings[dep]["finished"] if dep in timings else -1)
+            if name not in timings:
+                break
+            path.append(name)
+        return path[::-1], total
@@ -0,0 +1,139 @@
+import threading
+import time
+
+from tracing import record_rate_limit_wait, span
+
+
+class RequestCancelled(Exception):
+    """Raised when the caller gave up on a request, e.g. the losing copy of a hedged request."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute` tokens per minute.
+
+    `capacity` bounds the burst size, it defaults to one second worth of tokens (at least 1)
+    so a fresh bucket does not fire a whole minute of requests at once.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate_per_second)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """Take `tokens` without waiting, return the seconds to wait before retrying (0 when taken)."""
+        with self._lock:
+            self._refill()
+            # Requests larger than the bucket can never fit, let them through once it is full
+            needed = min(tokens, self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= tokens
+                return 0.0
+            return (needed - self._tokens) / self.rate_per_second
+
+    def wait_time(self, tokens=1):
+        """Seconds before `tokens` would be available, without taking them."""
+        with self._lock:
+            self._refill()
+            needed = min(tokens, self.capacity)
+            return max(needed - self._tokens, 0.0) / self.rate_per_second
+
+    def acquire(self, tokens=1, timeout=None, cancel_event=None):
+        """Block until `tokens` are available. Return False if `timeout` seconds elapsed, or `cancel_event` was set, first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            if cancel_event is None:
+                time.sleep(wait)
+            elif cancel_event.wait(wait):
+                return False
+
+
+class RateLimiter:
+    """Requests-per-minute and optional tokens-per-minute budget for one model."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute)
+        # A request may use a large share of the token budget, allow a few seconds of burst
+        self.tokens = TokenBucket(tokens_per_minute, capacity=tokens_per_minute / 6) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens=0, timeout=None, cancel_event=None):
+        """Block until a request of `estimated_tokens` fits the budget. Return False on timeout.
+
+        Setting `cancel_event` stops the wait (returning False) and raises `RequestCancelled`.
+        The wait runs in a "rate_limit_wait" span and is also recorded as queue time of the current span.
+        """
+        start = time.monotonic()
+        try:
+            with span("rate_limit_wait"):
+                deadline = None if timeout is None else start + timeout
+                acquired = self.requests.acquire(timeout=timeout, cancel_event=cancel_event)
+                if acquired and self.tokens is not None and estimated_tokens:
+                    remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                    acquired = self.tokens.acquire(estimated_tokens, timeout=remaining, cancel_event=cancel_event)
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RequestCancelled("Request cancelled while waiting for its rate limit budget")
+                return acquired
+        finally:
+            record_rate_limit_wait(time.monotonic() - start)
+
+    def wait_time(self, estimated_tokens=0):
+        """Seconds before a request of `estimated_tokens` would fit the budget, i.e. 0 while there is headroom."""
+        wait = self.requests.wait_time()
+        if self.tokens is not None and estimated_tokens:
+            wait = max(wait, self.tokens.wait_time(estimated_tokens))
+        return wait
+
+
+# (requests per minute, tokens per minute) of the models used by the app
+MODEL_RATE_LIMITS = {
+    "llama-3.1-70b-versatile": (30, 6000),
+    "llama-3.2-90b-text-preview": (30, 7000),
+    "mixtral-8x7b-32768": (30, 5000),
+    "gemma2-9b-it": (30, 15000),
+    "llama-3.2-11b-vision-preview": (30, 7000),
+    "whisper-large-v3": (20, None),
+    "gemini-1.5-flash": (15, 1000000),
+    "gemini-1.5-pro-latest": (2, 32000),
+}
+
+DEFAULT_RATE_LIMIT = (30, None)
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model):
+    """Return the rate limiter shared by every call made to `model` in this process."""
+    with _rate_limiters_lock:
+        if model not in _rate_limiters:
+            requests_per_minute, tokens_per_minute = MODEL_RATE_LIMITS.get(model, DEFAULT_RATE_LIMIT)
+            _rate_limiters[model] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _rate_limiters[model]
+
+
+def reset_rate_limiters():
+    """Drop the shared rate limiters so they are rebuilt from `MODEL_RATE_LIMITS` on next use."""
+    with _rate_limiters_lock:
+        _rate_limiters.clear()
+
+
+def estimate_tokens(text):
+    """Rough token count of a text (about 4 characters per token for English)."""
+    return len(text) // 4 + 1
@@ -0,0 +1,97 @@
+import math
+import re
+from collections import Counter
+
+
+# Transcripts shorter than this (in tokens) are always sent whole
+RETRIEVAL_MIN_TOKENS = 1500
+
+# Passages sent for each rule when the app or the batch CLI turns retrieval on
+DEFAULT_RETRIEVAL_TOP_N = 3
+
+PASSAGE_WORDS = 120
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "their", "this", "to", "was", "we", "were", "will", "with",
+    "you", "your", "our", "us",
+}
+
+
+def tokenize(text):
+    """Lowercase words without stopwords, with a light plural/suffix stemming."""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return [re.sub(r"(ies|es|s)$", "", word) if len(word) > 4 else word for word in words if word not in STOPWORDS]
+
+
+def chunk_transcript(text, passage_words=PASSAGE_WORDS):
+    """Split a transcript into passages of about `passage_words` words, cut on sentence ends."""
+    sentences = [sentence.strip() for sentence in re.split(r"(?<=[.!?])\s+", text) if sentence.strip()]
+    passages = []
+    current = []
+    current_words = 0
+    for sentence in sentences:
+        current.append(sentence)
+        current_words += len(sentence.split())
+        if current_words >= passage_words:
+            passages.append(" ".join(current))
+            current = []
+            current_words = 0
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class PassageIndex:
+    """In-memory BM25 index over the passages of a transcript."""
+
+    def __init__(self, text, passage_words=PASSAGE_WORDS, k1=1.5, b=0.75):
+        self.passages = chunk_transcript(text, passage_words)
+        self.k1 = k1
+        self.b = b
+        self._term_counts = [Counter(tokenize(passage)) for passage in self.passages]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        document_frequency = Counter(term for counts in self._term_counts for term in counts)
+        total = len(self.passages)
+        self._idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query):
+        """BM25 score of every passage for the query."""
+        query_terms = tokenize(query)
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            normalization = self.k1 * (1 - self.b + self.b * length / (self._average_length or 1))
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                score += self._idf[term] * frequency * (self.k1 + 1) / (frequency + normalization)
+            scores.append(score)
+        return scores
+
+    def select(self, query, top_n=3, context=1):
+        """Return the `top_n` most relevant passages plus `context` neighbours on each side, in transcript order.
+
+        Returns None when no passage matches the query at all.
+        """
+        scores = self.scores(query)
+        ranked = [index for index in sorted(range(len(scores)), key=lambda index: -scores[index]) if scores[index] > 0]
+        if not ranked:
+            return None
+        selected = set()
+        for index in ranked[:top_n]:
+            selected.update(range(max(index - context, 0), min(index + context + 1, len(self.passages))))
+        ordered = sorted(selected)
+
+        # Mark the gaps so the model knows the excerpts are not contiguous
+        parts = []
+        for position, index in enumerate(ordered):
+            if position > 0 and index != ordered[position - 1] + 1:
+                parts.append("[...]")
+            parts.append(self.passages[index])
+        return "\n".join(parts)
@@ -0,0 +1,119 @@
+import logging
+import threading
+
+from groq_models import iter_groq_inference, video_card_generation
+from cache import file_hash
+from pipeline import Pipeline
+from routing import get_router
+from video_processing import (
+    extract_audio_from_video, get_cached_transcript, transcribe_extracted_audio, scan_for_disclaimer,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def add_media_tasks(pipeline, video_path, audio_path, video_hash=None):
+    """Add the tasks that only depend on the video: audio extraction -> transcription, and the disclaimer scan.
+
+    The disclaimer scan samples, OCRs and checks the frames in one streaming task so it can
+    stop as soon as a disclaimer is confirmed, see `scan_for_disclaimer`. It publishes
+    {"stage": "frame", "timestamp", "text"} events and a {"stage": "disclaimer", "result"} event.
+    `video_hash` is the SHA-256 of the video when already known, e.g. from the artifact store;
+    otherwise the video is hashed once, by the first task.
+    Returns the names of the "transcript" and "disclaimer" tasks.
+    """
+    def extract_audio():
+        nonlocal video_hash
+        video_hash = video_hash or file_hash(video_path)
+        if get_cached_transcript(video_path, video_hash) is not None:
+            return None
+        return extract_audio_from_video(video_path, audio_path)
+
+    def transcript(extract_audio):
+        cached = get_cached_transcript(video_path, video_hash)
+        if cached is not None:
+            return cached["text"]
+        return transcribe_extracted_audio(video_path, extract_audio, pipeline.executor, video_hash)["text"]
+
+    pipeline.add("extract_audio", extract_audio)
+    pipeline.add("transcript", transcript, deps=["extract_audio"])
+    _add_disclaimer_task(pipeline, video_path)
+    return "transcript", "disclaimer"
+
+
+def _add_disclaimer_task(pipeline, video_path):
+    def disclaimer():
+        result = scan_for_disclaimer(
+            video_path,
+            on_frame=lambda frame_text: pipeline.emit({"stage": "frame", **frame_text}),
+            cancel_event=pipeline.cancel_event,
+        )
+        if result is not None:
+            pipeline.emit({"stage": "disclaimer", "result": result})
+        return result
+
+    return pipeline.add("disclaimer", disclaimer)
+
+
+def add_rule_tasks(pipeline, system_message, model_name, rules_list, run_id="review", product_card=True,
+                   cancel_event=None, routing=False, retrieval_top_n=None):
+    """Add the rule checks, and the product card, of one review run on top of the "transcript" task.
+
+    Rules run on the pipeline's shared executor and publish a {"stage": "rule", "run", "index",
+    "total", "verdict"} event each; the product card publishes {"stage": "product_card", "run", "card"}.
+    `cancel_event` stops this run only, it defaults to the pipeline's.
+    With `routing`, each rule goes to the fastest backend, `model_name` first, with hedged requests, see `routing`.
+    With `retrieval_top_n`, each rule of a long transcript only gets its most relevant passages, see `iter_groq_inference`.
+    Returns the names of the added tasks.
+    """
+    cancel_event = cancel_event or pipeline.cancel_event
+    generate = get_router().generate if routing else None
+
+    def rules(transcript):
+        verdicts = [None] * len(rules_list)
+        for index, verdict in iter_groq_inference(system_message, model_name, rules_list, transcript,
+                                                  retrieval_top_n=retrieval_top_n, cancel_event=cancel_event,
+                                                  executor=pipeline.executor, generate=generate):
+            verdicts[index] = verdict
+            pipeline.emit({"stage": "rule", "run": run_id, "index": index, "total": len(rules_list), "verdict": verdict})
+        return verdicts
+
+    def card(transcript):
+        if cancel_event.is_set():
+            return None
+        result = video_card_generation(transcript, model_name)
+        pipeline.emit({"stage": "product_card", "run": run_id, "card": result})
+        return result
+
+    names = [pipeline.add(f"{run_id}:rules", rules, deps=["transcript"])]
+    if product_card:
+        names.append(pipeline.add(f"{run_id}:product_card", card, deps=["transcript"]))
+    return names
+
+
+def iter_review(video_path, sales_deck, system_message, model_name, rules_list, cancel_event=None):
+    """Run the transcript and video reviews concurrently and yield their results as they arrive.
+
+    Yields event dicts with a "stage" key:
+    - {"stage": "rule", "index", "total", "verdict"} for each rule verdict,
+    - {"stage": "frame", "timestamp", "text"} for each OCR'd frame,
+    - {"stage": "disclaimer", "result"} once a disclaimer is confirmed or every frame is processed,
+    - {"stage": "done", "timings", "critical_path"} at the end.
+    Setting `cancel_event`, or closing the generator, stops the pending work.
+    """
+    pipeline = Pipeline(cancel_event=cancel_event or threading.Event())
+    pipeline.add("transcript", lambda: sales_deck)
+    _add_disclaimer_task(pipeline, video_path)
+    tasks = add_rule_tasks(pipeline, system_message, model_name, rules_list, product_card=False) + ["disclaimer"]
+
+    try:
+        for event in pipeline.iter_events(until=tasks):
+            if event["stage"] == "task":
+                if event["status"] == "failed":
+                    raise event["error"]
+                continue
+            yield event
+        yield {"stage": "done", "timings": pipeline.timings(), "critical_path": pipeline.critical_path()}
+    finally:
+        pipeline.cancel()
@@ -0,0 +1,315 @@
+"""Latency-aware routing of rule checks between the Groq and Gemini models, with hedged requests.
+
+Every backend (a provider and a model) keeps a rolling window of its latencies and errors.
+Each rule goes to the backend with the lowest expected latency: its p50, plus the wait for
+its rate limit budget, inflated by its recent error rate. The model selected by the user is
+kept unless another backend is clearly faster.
+When the request is still running after the p95 latency of its backend, a copy is sent to
+the next best backend with rate limit headroom and the first answer wins. The other copy is
+cancelled if it was not sent yet; an answer already in flight is ignored. A failed request is
+sent again to the next best backend, preferably of the other provider.
+"""
+import collections
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import typing_extensions as typing
+
+from cache import get_cache
+from clients import get_generative_model
+from groq_models import COMPLETION_TOKENS_ESTIMATE, RULE_TIMEOUT_SECONDS, cached_generation, generation_cache_key, groq_model_generation
+from rate_limiting import RequestCancelled, estimate_tokens, get_rate_limiter
+from script import gemini_answer
+from tracing import TracedThreadPoolExecutor, record_route, span
+
+
+logger = logging.getLogger(__name__)
+
+# Backends the rules can be routed to, as (provider, model); they all answer with the same verdict JSON
+ROUTING_BACKENDS = (
+    ("groq", "llama-3.1-70b-versatile"),
+    ("groq", "llama-3.2-90b-text-preview"),
+    ("groq", "mixtral-8x7b-32768"),
+    ("groq", "gemma2-9b-it"),
+    ("gemini", "gemini-1.5-flash"),
+)
+
+# Latencies and outcomes kept per backend
+LATENCY_WINDOW = 100
+
+# Samples needed before the percentiles of a backend are used
+MIN_LATENCY_SAMPLES = 5
+
+# Latency assumed for a backend without enough samples, and hedge delay used meanwhile
+DEFAULT_LATENCY_SECONDS = 3.0
+DEFAULT_HEDGE_DELAY_SECONDS = 10.0
+
+# A copy of the request is sent once it runs longer than this percentile of its backend's latency
+HEDGE_PERCENTILE = 95
+
+# Lower bound of the hedge delay, so fast backends are not hedged on scheduling noise
+MIN_HEDGE_DELAY_SECONDS = 0.2
+
+# Share of the requests that may be hedged, bounding the extra load on the APIs
+MAX_HEDGE_RATIO = 0.1
+
+# Expected latency is multiplied by (1 + ERROR_PENALTY * recent error rate)
+ERROR_PENALTY = 4.0
+
+# Backends tried in turn when a request fails, before giving up
+MAX_FAILOVERS = 2
+
+# Another backend must be this many times faster than the selected model to take over
+PREFERRED_BACKEND_MARGIN = 1.5
+
+# Threads sending the requests, copies included
+ROUTER_MAX_WORKERS = 32
+
+# How often a waiting request checks the caller's cancel event
+CANCEL_POLL_SECONDS = 0.5
+
+
+class LatencyStats:
+    """Rolling window of the latencies and errors of one backend."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=window)
+        self._errors = collections.deque(maxlen=window)
+
+    def record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._errors.append(False)
+
+    def record_error(self):
+        with self._lock:
+            self._errors.append(True)
+
+    def percentile(self, percent):
+        """Latency at `percent` (nearest rank) over the window, None without enough samples."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        rank = max(int(len(latencies) * percent / 100 + 0.999999) - 1, 0)
+        return latencies[min(rank, len(latencies) - 1)]
+
+    def error_rate(self):
+        with self._lock:
+            return sum(self._errors) / len(self._errors) if self._errors else 0.0
+
+    def as_dict(self):
+        with self._lock:
+            samples = len(self._latencies)
+        return {"samples": samples, "p50": self.percentile(50), "p95": self.percentile(95), "error_rate": self.error_rate()}
+
+
+class Backend:
+    """One model of one provider, with its latency statistics."""
+
+    def __init__(self, provider, model):
+        if provider not in ("groq", "gemini"):
+            raise ValueError(f"Unknown provider {provider}")
+        self.provider = provider
+        self.model = model
+        self.name = f"{provider}:{model}"
+        self.stats = LatencyStats()
+
+    def generate(self, prompt, system_message, timeout, cancel_event):
+        """Verdict of the model for `prompt`, raising on errors and `RequestCancelled` once `cancel_event` is set.
+
+        Verdicts are cached under the key of `groq_model_generation`, whatever the provider.
+        """
+        if self.provider == "groq":
+            return groq_model_generation(prompt, system_message, self.model, timeout, cancel_event)
+        cached_output = cached_generation(prompt, system_message, self.model)
+        if cached_output is not None:
+            return cached_output
+        text = gemini_answer(prompt, get_generative_model(self.model, system_message), timeout, cancel_event=cancel_event)
+        if cancel_event.is_set():
+            raise RequestCancelled(f"Request to {self.model} cancelled")
+        if text is None:
+            raise RuntimeError(f"No answer from {self.model}")
+        output = json.loads(text)
+        get_cache().set(generation_cache_key(prompt, system_message, self.model), output)
+        return output
+
+    def rate_limit_wait(self, prompt):
+        """Seconds before the rate limit of the model lets a request for `prompt` through."""
+        return get_rate_limiter(self.model).wait_time(estimate_tokens(prompt) + COMPLETION_TOKENS_ESTIMATE)
+
+    def expected_seconds(self, prompt):
+        p50 = self.stats.percentile(50)
+        latency = DEFAULT_LATENCY_SECONDS if p50 is None else p50
+        return (latency + self.rate_limit_wait(prompt)) * (1 + ERROR_PENALTY * self.stats.error_rate())
+
+    def hedge_delay(self):
+        percentile = self.stats.percentile(HEDGE_PERCENTILE)
+        return DEFAULT_HEDGE_DELAY_SECONDS if percentile is None else max(percentile, MIN_HEDGE_DELAY_SECONDS)
+
+
+class Router:
+    """Sends each request to the fastest backend and hedges the slow ones, see the module docstring.
+
+    `generate` has the signature of `groq_models.groq_model_generation`, so it can replace it
+    in `iter_groq_inference`; the `model` argument is the preferred backend.
+    """
+
+    def __init__(self, backends=ROUTING_BACKENDS, max_workers=ROUTER_MAX_WORKERS, max_hedge_ratio=MAX_HEDGE_RATIO):
+        self.backends = {}
+        for provider, model in backends:
+            backend = Backend(provider, model)
+            self.backends[backend.name] = backend
+        self.max_hedge_ratio = max_hedge_ratio
+        self.executor = TracedThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="route")
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+    def rank(self, prompt, preferred=None):
+        """Backends from the lowest to the highest expected latency for `prompt`."""
+        def score(backend):
+            expected = backend.expected_seconds(prompt)
+            return expected / PREFERRED_BACKEND_MARGIN if backend.model == preferred else expected
+
+        return sorted(self.backends.values(), key=score)
+
+    def generate(self, prompt: str, system_message: str, model: str, timeout: float = RULE_TIMEOUT_SECONDS,
+                 cancel_event: typing.Optional[threading.Event] = None) -> dict:
+        """Verdict for `prompt` from the first backend to answer, `model` being the preferred one."""
+        deadline = time.monotonic() + timeout
+        ranked = self.rank(prompt, preferred=model)
+        # A cached verdict of any backend, e.g. of a hedge that won before, needs no request
+        for cached_model in dict.fromkeys([model] + [backend.model for backend in ranked]):
+            cached_output = cached_generation(prompt, system_message, cached_model)
+            if cached_output is not None:
+                return cached_output
+        primary = ranked[0]
+        attempts = {}
+
+        def send(backend):
+            # Every attempt, copies included, ends by the deadline of the request
+            if deadline - time.monotonic() <= 0:
+                return set()
+            attempt_cancel_event = threading.Event()
+            future = self.executor.submit(self._call, backend, prompt, system_message, deadline, attempt_cancel_event)
+            attempts[future] = (backend, attempt_cancel_event)
+            return {future}
+
+        with span("route", backend=primary.name):
+            with self._lock:
+                self._counts["requests"] += 1
+            pending = send(primary)
+            sent_at = time.monotonic()
+            hedge = None
+            failovers = 0
+            error = None
+            try:
+                while pending:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RequestCancelled("Request cancelled")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    # The hedge delay is read again while waiting, it shortens as the first samples of the backend come in
+                    hedge_in = sent_at + primary.hedge_delay() - time.monotonic() if hedge is None else remaining
+                    if hedge_in <= 0:
+                        hedge = self._next_backend(ranked, attempts, prompt, failed=False) or primary
+                        if hedge is not primary:
+                            logger.info(f"Hedging {primary.name} with {hedge.name}")
+                            pending |= send(hedge)
+                        continue
+                    done, pending = wait(pending, timeout=min(remaining, hedge_in, CANCEL_POLL_SECONDS), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future.exception() is None:
+                            winner = attempts[future][0]
+                            record_route(primary.name, hedge.name if hedge not in (None, primary) else None, winner.name)
+                            if hedge not in (None, primary) and winner is hedge:
+                                with self._lock:
+                                    self._counts["hedge_wins"] += 1
+                            return future.result()
+                        error = future.exception()
+                    if not pending and failovers < MAX_FAILOVERS and time.monotonic() < deadline:
+                        backend = self._next_backend(ranked, attempts, prompt, failed=True)
+                        if backend is not None:
+                            failovers += 1
+                            logger.info(f"Failing over from {attempts[next(iter(done))][0].name} to {backend.name}: {error}")
+                            pending |= send(backend)
+            finally:
+                for future, (_, attempt_cancel_event) in attempts.items():
+                    attempt_cancel_event.set()
+                    future.cancel()
+            record_route(primary.name, hedge.name if hedge not in (None, primary) else None, None)
+            if error is not None:
+                raise error
+            raise TimeoutError(f"No backend answered within {timeout} seconds")
+
+    def _next_backend(self, ranked, attempts, prompt, failed):
+        """Next best backend not tried yet, for a copy of a slow request or in place of a failed one.
+
+        Copies are bounded by the hedge budget and only go to backends with rate limit headroom,
+        a copy waiting for its budget would not beat the request already sent. After a failure,
+        backends of another provider come first, outages rarely spare the other models of a provider.
+        """
+        tried = {backend for backend, _ in attempts.values()}
+        candidates = [backend for backend in ranked if backend not in tried]
+        if failed:
+            failed_providers = {backend.provider for backend in tried}
+            candidates.sort(key=lambda backend: backend.provider in failed_providers)
+            with self._lock:
+                self._counts["failovers"] += bool(candidates)
+            return candidates[0] if candidates else None
+        with self._lock:
+            if self._counts["hedged"] >= self.max_hedge_ratio * self._counts["requests"] + 1:
+                return None
+            for backend in candidates:
+                if backend.rate_limit_wait(prompt) == 0:
+                    self._counts["hedged"] += 1
+                    return backend
+        return None
+
+    def _call(self, backend, prompt, system_message, deadline, cancel_event):
+        # The attempt may have waited for a thread, only the time left until the deadline is given to it
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise TimeoutError(f"Request to {backend.name} not started before its deadline")
+        start = time.perf_counter()
+        try:
+            output = backend.generate(prompt, system_message, timeout, cancel_event)
+        except RequestCancelled:
+            raise
+        except Exception:
+            backend.stats.record_error()
+            raise
+        # Answers ignored after losing a race are still valid samples of the backend's latency
+        backend.stats.record(time.perf_counter() - start)
+        return output
+
+    def stats(self):
+        """Request counts and rolling latency statistics of every backend."""
+        with self._lock:
+            counts = dict(self._counts)
+        return {**counts, "backends": {name: backend.stats.as_dict() for name, backend in self.backends.items()}}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Return the router shared by the process, so its latency statistics build up across reviews."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = Router()
+        return _router
+
+
+def set_router(router):
+    """Replace the shared router, e.g. with other backends; None builds a new one on next use."""
+    global _router
+    with _router_lock:
+        _router = router
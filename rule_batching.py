@@ -0,0 +1,158 @@
+import difflib
+import logging
+import re
+
+from rate_limiting import estimate_tokens
+from tracing import TracedThreadPoolExecutor, record_tokens_saved
+
+
+logger = logging.getLogger(__name__)
+
+# Context window (tokens) of the models offered in the app
+MODEL_CONTEXT_WINDOWS = {
+    "llama-3.1-70b-versatile": 131072,
+    "llama-3.2-90b-text-preview": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "gemma2-9b-it": 8192,
+    "gemini-1.5-flash": 1048576,
+    "gemini-1.5-pro-latest": 2097152,
+}
+
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Output tokens reserved per rule of a batch
+COMPLETION_TOKENS_PER_RULE = 300
+
+# Groq caps the completion of a single request, so the batch size is also bounded by it
+MAX_COMPLETION_TOKENS = 8000
+
+MAX_RULES_PER_REQUEST = 10
+
+
+def build_rule_prompt(rule, sales_deck):
+    """Prompt evaluating a single rule, as sent by the one-rule-per-call mode."""
+    return f"""
+        The rule is: {rule}
+        The sales deck to evaluate is: {sales_deck}
+        Your MUST provide an output in JSON representation with the following fields:
+        "rule_name",
+        "label",
+        "part",
+        "suggestion"
+        """
+
+
+def build_batch_prompt(rules, sales_deck):
+    """Prompt evaluating several rules against the sales deck in a single request."""
+    numbered_rules = "\n".join(f"        {index + 1}. {rule.strip()}" for index, rule in enumerate(rules))
+    return f"""
+        The rules are:
+{numbered_rules}
+        The sales deck to evaluate is: {sales_deck}
+        Evaluate each rule independently.
+        Your MUST provide an output in JSON representation with a single field "results",
+        a list holding one object per rule, in the same order as the rules, with the following fields:
+        "rule_name" (the rule exactly as given),
+        "label",
+        "part",
+        "suggestion"
+        """
+
+
+def choose_batch_size(model_name, system_message, sales_deck, rules, max_batch_size=MAX_RULES_PER_REQUEST):
+    """Largest number of rules per request that fits the model's context window."""
+    context_window = MODEL_CONTEXT_WINDOWS.get(model_name, DEFAULT_CONTEXT_WINDOW)
+    fixed_tokens = estimate_tokens(system_message) + estimate_tokens(build_batch_prompt([], sales_deck))
+    longest_rule = max((estimate_tokens(rule) for rule in rules), default=0)
+    per_rule_tokens = longest_rule + COMPLETION_TOKENS_PER_RULE
+    available = context_window - fixed_tokens
+    batch_size = min(available // per_rule_tokens, MAX_COMPLETION_TOKENS // COMPLETION_TOKENS_PER_RULE, max_batch_size)
+    return max(int(batch_size), 1)
+
+
+def _normalize_rule_name(name):
+    return re.sub(r"\W+", " ", str(name)).strip().lower()
+
+
+def parse_batch_output(output, rules, verdict_schema):
+    """Match the verdicts of a batch response to its rules.
+
+    Returns a list aligned with `rules` holding the validated verdict, or None for the
+    rules the model dropped or whose verdict does not match `verdict_schema`.
+    """
+    from pydantic import TypeAdapter, ValidationError
+
+    validator = TypeAdapter(verdict_schema)
+    items = output.get("results", []) if isinstance(output, dict) else output
+    if not isinstance(items, list):
+        return [None] * len(rules)
+
+    # Validated verdict of each item, None where it does not match the schema, aligned with `items`
+    valid_items = []
+    for item in items:
+        try:
+            valid_items.append(validator.validate_python(item))
+        except ValidationError:
+            valid_items.append(None)
+
+    verdicts = []
+    for index, rule in enumerate(rules):
+        normalized_rule = _normalize_rule_name(rule)
+        match = next((item for item in valid_items
+                      if item is not None and _normalize_rule_name(item["rule_name"]) == normalized_rule), None)
+        if match is None and index < len(valid_items) and valid_items[index] is not None:
+            # Models sometimes paraphrase the rule name, accept the item at the same position if close enough
+            candidate = valid_items[index]
+            similarity = difflib.SequenceMatcher(None, _normalize_rule_name(candidate["rule_name"]), normalized_rule).ratio()
+            if similarity >= 0.8:
+                match = candidate
+        verdicts.append(match)
+    return verdicts
+
+
+def evaluate_rules_batched(rules, sales_deck, system_message, model_name, generate_batch, evaluate_rule,
+                           verdict_schema, rules_per_request="auto", max_workers=4):
+    """Evaluate rules by packing `rules_per_request` of them in each request.
+
+    `generate_batch(prompt)` sends a batch prompt and returns the parsed JSON response,
+    `evaluate_rule(rule)` evaluates a single rule; it is used to re-run the rules a batch
+    dropped or mangled. "auto" picks the largest batch fitting the model's context window.
+    Returns `(outputs, report)`, outputs in rule order and a report of the tokens saved;
+    the tokens saved are also recorded in the metrics and on the current span.
+    """
+    if rules_per_request == "auto":
+        rules_per_request = choose_batch_size(model_name, system_message, sales_deck, rules)
+    batches = [rules[start:start + rules_per_request] for start in range(0, len(rules), rules_per_request)]
+
+    def run_batch(batch):
+        try:
+            output = generate_batch(build_batch_prompt(batch, sales_deck))
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} rules failed, evaluating them one by one: {e}")
+            output = {}
+        return parse_batch_output(output, batch, verdict_schema)
+
+    with TracedThreadPoolExecutor(max_workers=max(min(max_workers, len(batches)), 1)) as executor:
+        verdicts = [verdict for batch_verdicts in executor.map(run_batch, batches) for verdict in batch_verdicts]
+
+        missing = [index for index, verdict in enumerate(verdicts) if verdict is None]
+        if missing:
+            logger.info(f"Re-running {len(missing)} rules missing from the batch responses")
+            for index, verdict in zip(missing, executor.map(evaluate_rule, [rules[index] for index in missing])):
+                verdicts[index] = verdict
+
+    system_tokens = estimate_tokens(system_message)
+    baseline_tokens = sum(system_tokens + estimate_tokens(build_rule_prompt(rule, sales_deck)) for rule in rules)
+    batched_tokens = sum(system_tokens + estimate_tokens(build_batch_prompt(batch, sales_deck)) for batch in batches)
+    batched_tokens += sum(system_tokens + estimate_tokens(build_rule_prompt(rules[index], sales_deck)) for index in missing)
+    report = {
+        "rules_per_request": rules_per_request,
+        "requests": len(batches) + len(missing),
+        "rerun_rules": len(missing),
+        "baseline_input_tokens": baseline_tokens,
+        "input_tokens": batched_tokens,
+        "input_tokens_saved": baseline_tokens - batched_tokens,
+    }
+    logger.info(f"Batched rule evaluation: {report}")
+    record_tokens_saved(report["input_tokens_saved"], model_name, "rule_batching")
+    return verdicts, report
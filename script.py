@@ -1,18 +1,14 @@
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold, GenerationConfig
+import functools
 import typing_extensions as typing
 import logging
-import streamlit as st
 import json
-import os
-from dotenv import load_dotenv
+import time
+from tenacity import Retrying, retry_if_exception_type, stop_after_delay, wait_random_exponential
 
-
-# Load environment variables from a .env file
-GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
-
-# load_dotenv()
-# GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+from clients import get_generative_model
+from rate_limiting import RequestCancelled, get_rate_limiter, estimate_tokens
+from rule_batching import evaluate_rules_batched
+from tracing import TracedThreadPoolExecutor, record_retry, record_usage, span
 
 
 # Define TypedDict for Gemini response
@@ -23,41 +19,101 @@ class GeminiResponse(typing.TypedDict):
     suggestion: list[str]
 
 
+# Define TypedDict for Gemini responses covering several rules
+class GeminiBatchResponse(typing.TypedDict):
+    results: list[GeminiResponse]
+
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-# Configure Google Generative AI with API Key
-genai.configure(api_key=GOOGLE_API_KEY)
-
-# Define Generation and Safety Configurations
-genai_generation_config = GenerationConfig(
-    candidate_count=1,
-    max_output_tokens=800,
-    temperature=0,
-    response_mime_type="application/json",
-    response_schema=GeminiResponse
-)
-
-safety_settings = {
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-}
-
+@functools.lru_cache(maxsize=None)
+def get_gemini_options():
+    """Generation and safety configurations, built on first use so importing this module does not load the Gemini SDK."""
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold, GenerationConfig
+
+    return {
+        "generation_config": GenerationConfig(
+            candidate_count=1,
+            max_output_tokens=800,
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=GeminiResponse
+        ),
+        "batch_generation_config": GenerationConfig(
+            candidate_count=1,
+            max_output_tokens=8000,
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=GeminiBatchResponse
+        ),
+        "safety_settings": {
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+        },
+    }
+
+
+# Deadline in seconds for evaluating a single rule, retries and rate limiting included
+RULE_TIMEOUT_SECONDS = 120
+
+# Upper bound on the number of rules evaluated at the same time
+MAX_RULE_WORKERS = 8
+
+
+def gemini_answer(prompt: str, model, timeout: float = RULE_TIMEOUT_SECONDS,
+                  generation_config=None, cancel_event=None) -> typing.Optional[str]:
+    """Generate content using the Gemini model and return the response text.
+
+    `model` comes from `clients.get_generative_model`, `generation_config` defaults to the
+    single-rule configuration of `get_gemini_options`.
+    The request goes through the model's shared rate limit and 429s are retried with backoff until `timeout`.
+    Setting `cancel_event` abandons the request (returning None) unless it was already sent.
+    """
+    from google.api_core.exceptions import ResourceExhausted
 
-def gemini_answer(prompt: str, model: genai.GenerativeModel) -> typing.Optional[str]:
-    """Generate content using the Gemini model and return the response text."""
+    options = get_gemini_options()
+    generation_config = generation_config or options["generation_config"]
+    deadline = time.monotonic() + timeout
+    model_name = model.model_name.removeprefix("models/")
+    rate_limiter = get_rate_limiter(model_name)
     try:
-        response = model.generate_content(prompt, generation_config=genai_generation_config, safety_settings=safety_settings)
+        for attempt in Retrying(
+            retry=retry_if_exception_type(ResourceExhausted),
+            wait=wait_random_exponential(multiplier=1, max=20),
+            stop=stop_after_delay(timeout),
+            reraise=True,
+        ):
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    record_retry(model_name)
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RequestCancelled(f"Request to {model_name} cancelled")
+                remaining = deadline - time.monotonic()
+                if not rate_limiter.acquire(estimate_tokens(prompt) + generation_config.max_output_tokens, timeout=remaining,
+                                            cancel_event=cancel_event):
+                    raise TimeoutError(f"Rate limit budget of {model_name} not available within {timeout} seconds")
+                # The span covers the request only, the rate limit wait has its own span
+                with span("gemini.generate", model=model_name):
+                    response = model.generate_content(
+                        prompt,
+                        generation_config=generation_config,
+                        safety_settings=options["safety_settings"],
+                        request_options={"timeout": max(deadline - time.monotonic(), 1)},
+                    )
+                    record_usage(response, model_name)
         response_text = response.parts[0].text
         logger.info(f"Response: {response_text}")
         return response_text
     except json.JSONDecodeError:
         logger.error("Invalid JSON output string")
         return None
+    except RequestCancelled:
+        return None
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
         return None
@@ -68,19 +124,60 @@ def create_rules_list(input_string: str):
     return input_string.split(seperator)
 
 
-def inference(system_message: str, model_name: str, rules_list: list[str], sales_deck: str) -> typing.Optional[str]:
-    """Perform inference using the Gemini model and return the generated response."""
-    output_list = []
+def inference(system_message: str, model_name: str, rules_list: list[str], sales_deck: str,
+              max_workers: typing.Optional[int] = None, rule_timeout: float = RULE_TIMEOUT_SECONDS,
+              rules_per_request: typing.Union[int, str] = 1) -> typing.Optional[str]:
+    """Perform inference using the Gemini model and return the generated response.
 
-    for rule in rules_list:
+    Rules are evaluated concurrently under the model's shared rate limit, each within
+    `rule_timeout` seconds, and the outputs are returned in the order of `rules_list`.
+    With `rules_per_request` above 1 (or "auto"), several rules share each request,
+    see `rule_batching.evaluate_rules_batched`.
+    """
+    model = get_generative_model(model_name, system_message)
+
+    def evaluate_rule(rule):
         input_text = f"""
         The rule is: {rule}
         The sales deck to evaluate is: {sales_deck}
         """ 
 
-        model = genai.GenerativeModel(model_name=model_name, system_instruction=system_message)
-        model_output = gemini_answer(input_text, model)
-        output_list.append(model_output)
+        return gemini_answer(input_text, model, rule_timeout)
+
+    max_workers = max_workers or min(len(rules_list), MAX_RULE_WORKERS) or 1
+
+    if rules_per_request != 1:
+        def parse_answer(response_text):
+            # A malformed answer counts as a missing verdict, the rule is then re-run on its own
+            if not response_text:
+                return None
+            try:
+                with span("json_parse"):
+                    return json.loads(response_text)
+            except json.JSONDecodeError:
+                logger.error("Invalid JSON output string")
+                return None
+
+        def generate_batch(prompt):
+            response_text = gemini_answer(prompt, model, rule_timeout, get_gemini_options()["batch_generation_config"])
+            return parse_answer(response_text) or {}
+
+        def evaluate_single_rule(rule):
+            return parse_answer(evaluate_rule(rule))
+
+        verdicts, _ = evaluate_rules_batched(
+            rules_list, sales_deck, system_message, model_name,
+            generate_batch=generate_batch,
+            evaluate_rule=evaluate_single_rule,
+            verdict_schema=GeminiResponse,
+            rules_per_request=rules_per_request,
+            max_workers=max_workers,
+        )
+        # Keep the output format of the one-rule-per-call mode: the JSON text of each verdict
+        return [json.dumps(verdict) if verdict is not None else None for verdict in verdicts]
+
+    with TracedThreadPoolExecutor(max_workers=max_workers) as executor:
+        output_list = list(executor.map(evaluate_rule, rules_list))
 
     return output_list
 
@@ -96,7 +193,10 @@ def main():
     In summary, BrightFuture Investments is your partner in achieving financial success. With our proven strategies, expert team, and commitment to excellence, you can rest assured that your investments are in capable hands. Join us today and take the first step towards a brighter financial future. Let us help you turn your financial dreams into reality with confidence and peace of mind.
     """
 
-    result = inference("gemini-1.5-flash", ["Inclusion of Risk Warnings"], sales_deck_example)
+    # Imported here, the app imports this module
+    from app import default_system_message
+
+    result = inference(default_system_message, "gemini-1.5-flash", ["Inclusion of Risk Warnings"], sales_deck_example)
     if result:
         print(result)
 
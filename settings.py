@@ -0,0 +1,97 @@
+"""Configuration of the app, the batch CLI and the workers, read once on first use.
+
+Values come from the environment (and a .env file), then from the Streamlit secrets when
+running in the app. Nothing is read at import time, so the modules can be imported, and
+worker processes started, without Streamlit or API keys; a missing key only fails the
+first call that needs it.
+"""
+import os
+import sys
+import threading
+
+
+# Settings read from the environment or the Streamlit secrets, by attribute name
+SETTING_NAMES = {
+    "groq_api_key": "GROQ_API_KEY",
+    "google_api_key": "GOOGLE_API_KEY",
+    "metrics_port": "METRICS_PORT",
+    "metrics_host": "METRICS_HOST",
+    "groq_max_connections": "GROQ_MAX_CONNECTIONS",
+    "groq_max_keepalive_connections": "GROQ_MAX_KEEPALIVE_CONNECTIONS",
+    "groq_keepalive_expiry": "GROQ_KEEPALIVE_EXPIRY_SECONDS",
+}
+
+# Interface the metrics server listens on by default; its traces hold file names, keep it local
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+
+class MissingSetting(KeyError):
+    """Raised when a required setting is neither in the environment nor in the Streamlit secrets."""
+
+
+class Settings:
+    """API keys and service options; None when not configured."""
+
+    def __init__(self, groq_api_key=None, google_api_key=None, metrics_port=None, metrics_host=None,
+                 groq_max_connections=None, groq_max_keepalive_connections=None, groq_keepalive_expiry=None):
+        self.groq_api_key = groq_api_key
+        self.google_api_key = google_api_key
+        self.metrics_port = int(metrics_port) if metrics_port else None
+        self.metrics_host = metrics_host or DEFAULT_METRICS_HOST
+        # Connection pool of the shared Groq client, see `clients.get_groq_client` for the defaults
+        self.groq_max_connections = int(groq_max_connections) if groq_max_connections else None
+        self.groq_max_keepalive_connections = int(groq_max_keepalive_connections) if groq_max_keepalive_connections else None
+        self.groq_keepalive_expiry = float(groq_keepalive_expiry) if groq_keepalive_expiry else None
+
+    @classmethod
+    def from_environment(cls, use_streamlit_secrets=True):
+        """Read the settings from the environment and the .env file, then the Streamlit secrets for the missing ones."""
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        values = {name: os.getenv(key) for name, key in SETTING_NAMES.items()}
+        missing = [name for name, value in values.items() if value is None]
+        if missing and use_streamlit_secrets:
+            secrets = _streamlit_secrets()
+            for name in missing:
+                values[name] = secrets.get(SETTING_NAMES[name])
+        return cls(**values)
+
+    def require(self, name):
+        """Return a setting, raising `MissingSetting` when it is not configured."""
+        value = getattr(self, name)
+        if value is None:
+            raise MissingSetting(f"{SETTING_NAMES[name]} is not set, add it to the environment or .streamlit/secrets.toml")
+        return value
+
+
+def _streamlit_secrets():
+    # Only read when running in the app, the secrets file is optional elsewhere
+    if "streamlit" not in sys.modules:
+        return {}
+    import streamlit as st
+
+    try:
+        return {key: st.secrets[key] for key in st.secrets}
+    except Exception:
+        return {}
+
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def get_settings():
+    """Return the settings of the process, read on first use."""
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = Settings.from_environment()
+        return _settings
+
+
+def set_settings(settings):
+    """Replace the settings of the process, e.g. from a CLI or a test; None reads them again on next use."""
+    global _settings
+    with _settings_lock:
+        _settings = settings
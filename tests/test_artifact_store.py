@@ -0,0 +1,65 @@
+import io
+import os
+import time
+
+from artifact_store import ArtifactStore
+from cache import file_hash
+
+
+def age(path, seconds):
+    """Mark an artifact as last used `seconds` ago."""
+    used_at = time.time() - seconds
+    os.utime(path, (used_at, used_at))
+
+
+def test_identical_uploads_share_one_blob(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+
+    first = store.save_upload(io.BytesIO(b"video bytes"), "Ad.MP4", chunk_size=4)
+    second = store.save_upload(io.BytesIO(b"video bytes"), "other.mp4")
+    other = store.save_upload(io.BytesIO(b"other bytes"), "ad.mp4")
+
+    assert first == second != other
+    assert first.endswith(".mp4")
+    assert open(first, "rb").read() == b"video bytes"
+    assert sorted(os.listdir(store.blobs_dir)) == sorted([os.path.basename(first), os.path.basename(other)])
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_sessions_get_separate_directories(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+
+    assert store.session_path("a", "audio.mp3") != store.session_path("b", "audio.mp3")
+
+
+def test_stale_artifacts_and_empty_sessions_are_evicted(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_age_seconds=3600)
+    blob = store.save_upload(io.BytesIO(b"video bytes"), "ad.mp4")
+    audio = store.session_path("a", "audio.mp3")
+    with open(audio, "wb") as f:
+        f.write(b"audio bytes")
+    age(audio, 7200)
+
+    assert store.evict() == 1
+    assert os.path.exists(blob)
+    assert os.listdir(store.sessions_dir) == []
+
+
+def test_least_recently_used_artifacts_are_evicted_above_the_size_limit(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=30)
+    paths = [store.save_upload(io.BytesIO(f"video bytes {index}".encode()), "ad.mp4") for index in range(3)]
+    for index, path in enumerate(paths):
+        age(path, 300 - index * 100)
+    # Reusing the oldest upload makes it the most recently used
+    store.touch(paths[0])
+
+    assert store.evict() == 1
+    assert [os.path.exists(path) for path in paths] == [True, False, True]
+
+
+def test_blob_hash_is_the_content_hash(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+
+    path = store.save_upload(io.BytesIO(b"video bytes"), "ad.mp4")
+
+    assert store.blob_hash(path) == file_hash(path)
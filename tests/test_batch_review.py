@@ -0,0 +1,65 @@
+import json
+
+import batch_review
+
+
+def record(video_id, status):
+    return {"id": video_id, "video": f"{video_id}.mp4", "status": status, "error": None if status == "done" else "failed",
+            "timings": {}, "critical_path": [], "seconds": 1.0}
+
+
+def test_load_checkpoint_keeps_last_successful_record(tmp_path):
+    checkpoint = tmp_path / "results.checkpoint.jsonl"
+    lines = [json.dumps(record("a", "failed")), json.dumps(record("a", "done")), json.dumps(record("b", "failed")),
+             '{"id": "c", "sta']
+    checkpoint.write_text("\n".join(lines) + "\n")
+
+    records = batch_review.load_checkpoint(str(checkpoint))
+
+    assert list(records) == ["a"]
+    assert records["a"]["status"] == "done"
+
+
+def test_load_checkpoint_missing_file(tmp_path):
+    assert batch_review.load_checkpoint(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_retried_video_appears_once_in_jsonl_output(tmp_path, monkeypatch):
+    attempts = {}
+
+    def review_video(video, *args):
+        attempts[video["id"]] = attempts.get(video["id"], 0) + 1
+        return record(video["id"], "done" if attempts[video["id"]] > 1 else "failed")
+
+    monkeypatch.setattr(batch_review, "review_video", review_video)
+    output = tmp_path / "results.jsonl"
+    videos = [{"id": "a", "video": "a.mp4"}]
+
+    batch_review.review_videos(videos, ["rule"], "system", output_path=str(output))
+    batch_review.review_videos(videos, ["rule"], "system", output_path=str(output))
+
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [(line["id"], line["status"]) for line in lines] == [("a", "done")]
+    assert len((tmp_path / "results.checkpoint.jsonl").read_text().splitlines()) == 2
+
+
+def test_video_with_a_failed_rule_is_reviewed_again(monkeypatch):
+    def add_media_tasks(pipeline, video_path, audio_path):
+        pipeline.add("transcript", lambda: "transcript")
+        pipeline.add("disclaimer", lambda: {"disclaimer_is_exist": True, "disclaimer_text": "Capital at risk"})
+
+    def add_rule_tasks(pipeline, system_message, model_name, rules_list, product_card=True, routing=False,
+                       retrieval_top_n=None):
+        verdicts = [{"rule_name": "Rule one", "label": True, "part": [], "suggestion": []},
+                    {"rule_name": "Rule two", "label": None, "part": [], "suggestion": [], "error": "timed out"}]
+        return [pipeline.add("review:rules", lambda transcript: verdicts, deps=["transcript"])]
+
+    monkeypatch.setattr(batch_review, "add_media_tasks", add_media_tasks)
+    monkeypatch.setattr(batch_review, "add_rule_tasks", add_rule_tasks)
+
+    record = batch_review.review_video({"id": "a", "video": "a.mp4"}, "system", "model", ["Rule one", "Rule two"],
+                                       product_card=False)
+
+    assert record["status"] == "failed"
+    assert "Rule two" in record["error"]
+    assert record["verdicts"][0]["label"] is True
@@ -0,0 +1,65 @@
+import pytest
+
+import cache
+from cache import ResultCache, make_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze the clock of the cache at a time the test moves forward."""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_make_key_does_not_depend_on_dict_order():
+    assert make_key("chat", {"a": 1, "b": 2}) == make_key("chat", {"b": 2, "a": 1})
+    assert make_key("chat", "prompt") != make_key("ocr", "prompt")
+
+
+def test_values_persist_across_instances(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    ResultCache(path).set("chat:a", {"label": True, "part": ["x"]})
+
+    assert ResultCache(path).get("chat:a") == {"label": True, "part": ["x"]}
+
+
+def test_expired_entries_are_missing(tmp_path, clock):
+    result_cache = ResultCache(str(tmp_path / "results.sqlite"), ttl_seconds=60)
+    result_cache.set("chat:a", "verdict")
+    result_cache.set("chat:b", "verdict", ttl_seconds=None)
+
+    clock[0] += 61
+
+    assert result_cache.get("chat:a") is None
+    assert result_cache.get("chat:b") == "verdict"
+    assert result_cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path, clock):
+    value = "x" * 100
+    # Room for two values of 102 serialized bytes
+    result_cache = ResultCache(str(tmp_path / "results.sqlite"), max_bytes=250)
+    result_cache.set("chat:a", value)
+    clock[0] += 1
+    result_cache.set("chat:b", value)
+    clock[0] += 1
+    result_cache.get("chat:a")
+    clock[0] += 1
+
+    result_cache.set("chat:c", value)
+
+    assert result_cache.get("chat:a") == value
+    assert result_cache.get("chat:b") is None
+    assert result_cache.get("chat:c") == value
+
+
+def test_stats_count_hits_and_misses(tmp_path):
+    result_cache = ResultCache(str(tmp_path / "results.sqlite"))
+    result_cache.set("chat:a", 1)
+    result_cache.get("chat:a")
+    result_cache.get("chat:missing")
+
+    stats = result_cache.stats()
+
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
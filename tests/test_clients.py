@@ -0,0 +1,36 @@
+import pytest
+
+import clients
+import settings
+
+
+@pytest.fixture(autouse=True)
+def fresh_client():
+    clients.set_groq_client(None)
+    yield
+    clients.set_groq_client(None)
+    settings.set_settings(None)
+
+
+def pool_limits():
+    pool = clients.get_groq_client()._client._transport._pool
+    return pool._max_connections, pool._max_keepalive_connections, pool._keepalive_expiry
+
+
+def test_pool_sizes_come_from_the_settings():
+    settings.set_settings(settings.Settings(groq_api_key="key", groq_max_connections="64",
+                                            groq_max_keepalive_connections="32", groq_keepalive_expiry="30"))
+
+    assert pool_limits() == (64, 32, 30.0)
+
+
+def test_pool_sizes_default_to_the_module_constants():
+    settings.set_settings(settings.Settings(groq_api_key="key"))
+
+    assert pool_limits() == (clients.MAX_CONNECTIONS, clients.MAX_KEEPALIVE_CONNECTIONS, clients.KEEPALIVE_EXPIRY_SECONDS)
+
+
+def test_shared_client_is_built_once():
+    settings.set_settings(settings.Settings(groq_api_key="key"))
+
+    assert clients.get_groq_client() is clients.get_groq_client()
@@ -0,0 +1,95 @@
+import video_processing
+
+
+DISCLAIMER = "Capital at risk. Past performance is not a guarantee of future results."
+
+
+def fake_scan(monkeypatch, frame_texts, timestamps):
+    """Make `scan_for_disclaimer` read `frame_texts` ({timestamp: text}) and record the texts checked."""
+    checked = []
+
+    def check_and_extract_disclaimer(extracted_texts):
+        checked.append(list(extracted_texts))
+        found = any("capital at risk" in item["text"].lower() for item in extracted_texts)
+        return {"disclaimer_is_exist": found, "disclaimer_text": DISCLAIMER if found else ""}
+
+    def iter_frame_texts(video_path, cancel_event=None, timestamps=None):
+        for timestamp in timestamps:
+            if timestamp in frame_texts:
+                yield {"timestamp": timestamp, "text": frame_texts[timestamp]}
+
+    monkeypatch.setattr(video_processing, "video_sample_timestamps", lambda video_path, interval_seconds: list(timestamps))
+    monkeypatch.setattr(video_processing, "iter_frame_texts", iter_frame_texts)
+    monkeypatch.setattr(video_processing, "check_and_extract_disclaimer", check_and_extract_disclaimer)
+    return checked
+
+
+def test_confirms_stable_disclaimer_early(monkeypatch):
+    timestamps = [0, 5, 10, 15, 20]
+    texts = {timestamp: DISCLAIMER for timestamp in timestamps}
+    checked = fake_scan(monkeypatch, texts, timestamps)
+
+    result = video_processing.scan_for_disclaimer("video.mp4", stable_frames=3)
+
+    assert result["disclaimer_is_exist"] is True
+    # Confirmed on the last three frames, read first from the end card and checked in video order
+    assert [item["timestamp"] for item in checked[0]] == [10, 15, 20]
+
+
+def test_frame_missing_from_sampling_does_not_hide_later_frames(monkeypatch):
+    timestamps = [0, 5, 10, 15, 20]
+    texts = {0: "Invest with us", 5: "Invest with us", 10: DISCLAIMER, 15: DISCLAIMER}
+    # The frame at 20 seconds, sampled first, could not be decoded
+    checked = fake_scan(monkeypatch, texts, timestamps)
+
+    result = video_processing.scan_for_disclaimer("video.mp4", stable_frames=3)
+
+    assert result["disclaimer_is_exist"] is True
+    assert [item["timestamp"] for item in checked[-1]] == [0, 5, 10, 15]
+
+
+def test_no_disclaimer(monkeypatch):
+    timestamps = [0, 5, 10]
+    checked = fake_scan(monkeypatch, {timestamp: "Invest with us" for timestamp in timestamps}, timestamps)
+
+    result = video_processing.scan_for_disclaimer("video.mp4")
+
+    assert result["disclaimer_is_exist"] is False
+    assert len(checked[-1]) == 3
+
+
+def test_disclaimer_check_reports_api_errors(monkeypatch, tmp_path):
+    import cache
+
+    def failing_client():
+        raise RuntimeError("API down")
+
+    monkeypatch.setattr(video_processing, "get_groq_client", failing_client)
+    cache.set_cache(cache.ResultCache(str(tmp_path / "results.sqlite")))
+    try:
+        result = video_processing.check_and_extract_disclaimer([{"timestamp": 0, "text": DISCLAIMER}])
+    finally:
+        cache.set_cache(None)
+
+    assert result["disclaimer_is_exist"] is False
+    assert "API down" in result["error"]
+
+
+def test_rejected_candidate_is_not_sent_again(monkeypatch):
+    timestamps = [0, 5, 10, 15, 20, 25]
+    checked = fake_scan(monkeypatch, {timestamp: "Terms and conditions apply to this offer." for timestamp in timestamps}, timestamps)
+
+    result = video_processing.scan_for_disclaimer("video.mp4", stable_frames=3)
+
+    assert result["disclaimer_is_exist"] is False
+    # One early check once the text was stable, then only the final check of every frame
+    assert [len(texts) for texts in checked] == [3, 6]
+
+
+def test_stable_ad_copy_is_not_a_candidate(monkeypatch):
+    timestamps = [0, 5, 10]
+    checked = fake_scan(monkeypatch, {timestamp: "Apply today, no account fees" for timestamp in timestamps}, timestamps)
+
+    video_processing.scan_for_disclaimer("video.mp4", stable_frames=3)
+
+    assert len(checked) == 1
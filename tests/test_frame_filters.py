@@ -0,0 +1,35 @@
+import numpy as np
+
+from frame_filters import deduplicate_frames
+
+
+def frame(gray, small_print=False):
+    image = np.full((180, 320, 3), gray, dtype=np.uint8)
+    if small_print:
+        image[150:170, 40:280] = 255
+    return image
+
+
+def test_duplicates_are_attributed_to_the_kept_frame():
+    samples = [(0, frame(0)), (5, frame(0)), (10, frame(120)), (15, frame(120)), (20, frame(0))]
+
+    unique_samples, mapping = deduplicate_frames(samples)
+
+    assert [timestamp for timestamp, _ in unique_samples] == [0, 10]
+    # The last frame goes back to the first scene, still in the history of kept frames
+    assert mapping == {0: 0, 5: 0, 10: 10, 15: 10, 20: 0}
+
+
+def test_small_print_appearing_is_not_a_duplicate():
+    unique_samples, mapping = deduplicate_frames([(0, frame(40)), (5, frame(40, small_print=True))])
+
+    assert mapping == {0: 0, 5: 5}
+    assert len(unique_samples) == 2
+
+
+def test_frames_older_than_the_history_are_forgotten():
+    samples = [(0, frame(0)), (5, frame(120)), (10, frame(0))]
+
+    _, mapping = deduplicate_frames(samples, history=1)
+
+    assert mapping[10] == 10
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_sampling import sample_frames, sample_frames_parallel, sample_timestamps, split_segments
+
+
+def write_video(path, seconds=4, fps=10):
+    """Write a small video whose frames all differ, with noise that lossy compression would alter."""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (160, 90))
+    rng = np.random.default_rng(0)
+    for index in range(seconds * fps):
+        writer.write(rng.integers(0, 256, (90, 160, 3), dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_interval_timestamps_stay_inside_the_video():
+    assert sample_timestamps(12, interval_seconds=5) == [0, 5, 10]
+    assert sample_timestamps(10, interval_seconds=5) == [0, 5]
+
+
+def test_interval_timestamps_do_not_accumulate_rounding_errors():
+    timestamps = sample_timestamps(1, interval_seconds=0.1)
+
+    assert timestamps[7] == 0.7
+    assert len(timestamps) == 10
+
+
+def test_count_timestamps_spread_evenly():
+    assert sample_timestamps(10, policy="count", num_frames=4) == [0, 2.5, 5, 7.5]
+
+
+def test_invalid_sampling_parameters():
+    assert sample_timestamps(0) == []
+    with pytest.raises(ValueError):
+        sample_timestamps(10, interval_seconds=0)
+    with pytest.raises(ValueError):
+        sample_timestamps(10, policy="count")
+    with pytest.raises(ValueError):
+        sample_timestamps(10, policy="random")
+
+
+def test_split_segments_into_contiguous_runs_of_similar_length():
+    assert split_segments(list(range(7)), 3) == [[0, 1, 2], [3, 4], [5, 6]]
+
+
+def test_split_segments_never_returns_empty_runs():
+    assert split_segments([0, 5], 4) == [[0], [5]]
+    assert split_segments([], 4) == []
+
+
+def test_parallel_decoding_returns_the_same_frames_in_order(tmp_path):
+    video_path = write_video(tmp_path / "video.mp4")
+
+    expected = list(sample_frames(video_path, interval_seconds=0.5))
+    frames = list(sample_frames_parallel(video_path, interval_seconds=0.5, processes=2, segments=3))
+
+    assert [timestamp for timestamp, _ in frames] == [timestamp for timestamp, _ in expected]
+    # Frames are transferred raw, without a lossy round trip
+    assert all(np.array_equal(frame, expected_frame) for (_, frame), (_, expected_frame) in zip(frames, expected))
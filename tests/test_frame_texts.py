@@ -0,0 +1,67 @@
+import time
+
+import numpy as np
+
+import video_processing
+
+
+def frame(gray):
+    return np.full((180, 320, 3), gray, dtype=np.uint8)
+
+
+def fake_ocr(monkeypatch, frames, delays=None):
+    """Make `iter_frame_texts` decode `frames` ({timestamp: frame}) and read "text <gray level>" on each.
+
+    `delays` maps a gray level to the seconds its vision request takes; the timestamps sent are recorded.
+    """
+    sent = []
+
+    def sample_frames(video_path, policy, interval_seconds, num_frames, timestamps):
+        yield from frames.items()
+
+    def frame_to_base64(image, encoder=None):
+        return str(image[0, 0, 0])
+
+    def process_frame(base64_image, rate_limiter=None, mime_type="image/jpeg", use_cache=True):
+        sent.append(base64_image)
+        time.sleep((delays or {}).get(int(base64_image), 0))
+        return f"text {base64_image}"
+
+    monkeypatch.setattr(video_processing, "sample_frames", sample_frames)
+    monkeypatch.setattr(video_processing, "frame_to_base64", frame_to_base64)
+    monkeypatch.setattr(video_processing, "process_frame", process_frame)
+    return sent
+
+
+def test_duplicate_frames_get_the_text_of_their_source(monkeypatch):
+    # The source frame is still being read when its duplicates are decoded
+    sent = fake_ocr(monkeypatch, {0: frame(0), 5: frame(0), 10: frame(120), 15: frame(0)}, delays={0: 0.2})
+
+    frame_texts = list(video_processing.iter_frame_texts("video.mp4", max_workers=2))
+
+    assert sorted(sent) == ["0", "120"]
+    assert sorted((item["timestamp"], item["text"]) for item in frame_texts) == [
+        (0, "text 0"), (5, "text 0"), (10, "text 120"), (15, "text 0"),
+    ]
+
+
+def test_extract_frame_texts_returns_video_order(monkeypatch):
+    # Later frames are read faster, so results complete in reverse order
+    frames = {timestamp: frame(40 * index) for index, timestamp in enumerate([0, 5, 10, 15])}
+    fake_ocr(monkeypatch, frames, delays={0: 0.3, 40: 0.2, 80: 0.1})
+
+    frame_texts = video_processing.extract_frame_texts("video.mp4", deduplicate=False, max_workers=4)
+
+    assert frame_texts == [
+        {"timestamp": 0, "text": "text 0"},
+        {"timestamp": 5, "text": "text 40"},
+        {"timestamp": 10, "text": "text 80"},
+        {"timestamp": 15, "text": "text 120"},
+    ]
+
+
+def test_extract_and_process_frames_drops_frames_without_text(monkeypatch):
+    fake_ocr(monkeypatch, {0: frame(0), 5: frame(120)})
+    monkeypatch.setattr(video_processing, "process_frame", lambda base64_image, *args, **kwargs: None if base64_image == "0" else "Capital at risk")
+
+    assert video_processing.extract_and_process_frames("video.mp4") == ["Capital at risk"]
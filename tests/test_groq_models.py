@@ -0,0 +1,55 @@
+import threading
+
+from groq_models import groq_inference, iter_groq_inference
+
+
+def verdict(rule):
+    return {"rule_name": rule, "label": True, "part": [], "suggestion": []}
+
+
+def test_failed_rule_yields_an_error_verdict_and_keeps_the_others():
+    def generate(prompt, system_message, model_name, timeout):
+        if "Rule two" in prompt:
+            raise TimeoutError("Rate limit budget not available within 120 seconds")
+        return verdict("Rule one" if "Rule one" in prompt else "Rule three")
+
+    outputs = dict(iter_groq_inference("system", "model", ["Rule one", "Rule two ", "Rule three"], "deck", generate=generate))
+
+    assert outputs[0] == verdict("Rule one") and outputs[2] == verdict("Rule three")
+    assert outputs[1]["rule_name"] == "Rule two"
+    assert outputs[1]["label"] is None
+    assert "120 seconds" in outputs[1]["error"]
+
+
+def test_groq_inference_returns_every_rule_in_order(monkeypatch):
+    import groq_models
+
+    def groq_model_generation(prompt, system_message, model_name, timeout):
+        if "Rule one" in prompt:
+            raise RuntimeError("API down")
+        return verdict("Rule two")
+
+    monkeypatch.setattr(groq_models, "groq_model_generation", groq_model_generation)
+
+    outputs = groq_inference("system", "model", ["Rule one", "Rule two"], "deck")
+
+    assert [output["label"] for output in outputs] == [None, True]
+
+
+def test_cancelled_rules_stop_the_iteration():
+    cancel_event = threading.Event()
+    release = threading.Event()
+
+    def generate(prompt, system_message, model_name, timeout):
+        if "Rule one" not in prompt:
+            release.wait(5)
+        return verdict("Rule")
+
+    outputs = []
+    for index, output in iter_groq_inference("system", "model", ["Rule one", "Rule two"], "deck", cancel_event=cancel_event,
+                                             generate=generate):
+        outputs.append(index)
+        cancel_event.set()
+        release.set()
+
+    assert outputs == [0]
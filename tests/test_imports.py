@@ -0,0 +1,14 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("module", ["app", "batch_review", "review_pipeline", "frame_sampling"])
+def test_heavy_dependencies_are_imported_on_first_use(module):
+    heavy = ["cv2", "numpy", "groq", "google.generativeai"]
+    code = f"import sys, {module}; print(','.join(name for name in {heavy!r} if name in sys.modules))"
+
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert completed.stdout.strip() == ""
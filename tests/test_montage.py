@@ -0,0 +1,86 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import cache
+import video_processing
+from frame_montage import LABEL_HEIGHT, TILE_BORDER, build_montage
+from rate_limiting import RateLimiter
+
+
+LABELS = ["T1", "T2", "T3"]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(tmp_path):
+    cache.set_cache(cache.ResultCache(str(tmp_path / "results.sqlite")))
+    yield
+    cache.set_cache(None)
+
+
+def fake_vision(monkeypatch, content):
+    """Make the vision model answer `content` and count the requests."""
+    requests = []
+
+    def create(**request):
+        requests.append(request)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(video_processing, "get_groq_client", lambda: client)
+    return requests
+
+
+def process_montage():
+    return video_processing.process_montage("image", LABELS, RateLimiter(6000))
+
+
+def test_tiles_are_matched_by_label(monkeypatch):
+    fake_vision(monkeypatch, json.dumps({"tiles": [
+        {"tile": " t2 ", "image_content": "Capital at risk"},
+        {"tile": "T1", "image_content": "Invest with us"},
+        {"tile": "T3", "image_content": video_processing.NO_TEXT_MESSAGE},
+    ]}))
+
+    assert process_montage() == {"T1": "Invest with us", "T2": "Capital at risk", "T3": video_processing.NO_TEXT_MESSAGE}
+
+
+def test_missing_unknown_and_empty_tiles_are_left_out(monkeypatch):
+    requests = fake_vision(monkeypatch, json.dumps({"tiles": [
+        {"tile": "T1", "image_content": "Invest with us"},
+        {"tile": "T2", "image_content": ""},
+        {"tile": "T9", "image_content": "Made up"},
+    ]}))
+
+    assert process_montage() == {"T1": "Invest with us", "T2": None, "T3": None}
+    # Incomplete answers are not cached, the montage is sent again
+    process_montage()
+    assert len(requests) == 2
+
+
+def test_complete_answers_are_cached(monkeypatch):
+    requests = fake_vision(monkeypatch, json.dumps({"tiles": [{"tile": label, "image_content": label} for label in LABELS]}))
+
+    assert process_montage() == process_montage()
+    assert len(requests) == 1
+
+
+def test_malformed_answer_leaves_every_tile_out(monkeypatch):
+    fake_vision(monkeypatch, '{"tiles": [{"tile": "T1", "image_')
+
+    assert process_montage() == {label: None for label in LABELS}
+
+
+def test_montage_tiles_every_frame_under_its_label():
+    frames = [np.full((720, 1280, 3), gray, dtype=np.uint8) for gray in (0, 100, 200)]
+
+    montage = build_montage(frames, ["0.0s", "5.0s", "10.0s"], columns=2, tile_width=320, tile_height=180)
+
+    cell_width = 320 + 2 * TILE_BORDER
+    cell_height = 180 + LABEL_HEIGHT + 2 * TILE_BORDER
+    assert montage.shape == (2 * cell_height, 2 * cell_width, 3)
+    # The second tile holds the scaled down second frame
+    tile_top = TILE_BORDER + LABEL_HEIGHT
+    assert (montage[tile_top:tile_top + 180, cell_width + TILE_BORDER:2 * cell_width - TILE_BORDER] == 100).all()
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+import review_pipeline
+from pipeline import Pipeline, TaskFailed
+
+
+def test_tasks_get_the_results_of_their_dependencies():
+    pipeline = Pipeline(max_workers=2)
+    pipeline.add("a", lambda: 2)
+    pipeline.add("b", lambda: 3)
+    pipeline.add("sum", lambda a, b: a + b, deps=["a", "b"])
+
+    assert pipeline.result("sum", timeout=5) == 5
+
+
+def test_critical_path_follows_the_dependency_finishing_last():
+    pipeline = Pipeline(max_workers=2)
+    pipeline.add("fast", lambda: time.sleep(0.01))
+    pipeline.add("slow", lambda: time.sleep(0.2))
+    pipeline.add("after_fast", lambda fast: time.sleep(0.01), deps=["fast"])
+    pipeline.add("last", lambda after_fast, slow: None, deps=["after_fast", "slow"])
+    pipeline.result("last", timeout=5)
+
+    path, total = pipeline.critical_path()
+
+    assert path == ["slow", "last"]
+    assert total >= 0.2
+
+
+def test_failed_dependency_skips_its_dependents():
+    def fail():
+        raise RuntimeError("boom")
+
+    pipeline = Pipeline(max_workers=2)
+    pipeline.add("fail", fail)
+    pipeline.add("dependent", lambda fail: None, deps=["fail"])
+
+    with pytest.raises(TaskFailed):
+        pipeline.result("dependent", timeout=5)
+    with pytest.raises(RuntimeError):
+        pipeline.result("fail", timeout=5)
+
+
+def test_unknown_dependency_and_duplicate_task():
+    pipeline = Pipeline(max_workers=1)
+    release = threading.Event()
+    pipeline.add("a", release.wait)
+    with pytest.raises(ValueError):
+        pipeline.add("a", lambda: None)
+    with pytest.raises(ValueError):
+        pipeline.add("b", lambda missing: None, deps=["missing"])
+    release.set()
+
+
+def test_empty_pipeline_has_no_critical_path():
+    assert Pipeline(max_workers=1).critical_path() == ([], 0.0)
+
+
+def test_rule_tasks_pass_the_retrieval_option(monkeypatch):
+    calls = []
+
+    def iter_groq_inference(system_message, model_name, rules_list, transcript, **kwargs):
+        calls.append(kwargs["retrieval_top_n"])
+        return iter([(0, {"rule_name": "Rule", "label": True})])
+
+    monkeypatch.setattr(review_pipeline, "iter_groq_inference", iter_groq_inference)
+    pipeline = Pipeline(max_workers=2)
+    pipeline.add("transcript", lambda: "transcript")
+    names = review_pipeline.add_rule_tasks(pipeline, "system", "model", ["Rule"], product_card=False, retrieval_top_n=3)
+
+    assert pipeline.result(names[0], timeout=5) == [{"rule_name": "Rule", "label": True}]
+    assert calls == [3]
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from rate_limiting import RateLimiter, RequestCancelled, TokenBucket, estimate_tokens
+
+
+def test_bucket_starts_with_one_second_of_burst():
+    bucket = TokenBucket(rate_per_minute=120)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(0.5, abs=0.05)
+
+
+def test_wait_time_does_not_take_tokens():
+    bucket = TokenBucket(rate_per_minute=60)
+
+    assert bucket.wait_time() == 0
+    assert bucket.wait_time() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.wait_time() == pytest.approx(1.0, abs=0.05)
+
+
+def test_requests_larger_than_the_bucket_go_through_once_it_is_full():
+    bucket = TokenBucket(rate_per_minute=600, capacity=10)
+
+    assert bucket.try_acquire(50) == 0
+    assert bucket.try_acquire(1) > 0
+
+
+def test_acquire_times_out():
+    bucket = TokenBucket(rate_per_minute=1)
+    bucket.try_acquire()
+
+    assert bucket.acquire(timeout=0.05) is False
+
+
+def test_rate_limiter_wait_is_cancellable():
+    limiter = RateLimiter(requests_per_minute=1)
+    limiter.acquire()
+    cancel_event = threading.Event()
+    threading.Timer(0.05, cancel_event.set).start()
+
+    with pytest.raises(RequestCancelled):
+        limiter.acquire(cancel_event=cancel_event)
+
+
+def test_rate_limiter_checks_the_token_budget():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=600)
+
+    assert limiter.wait_time(estimated_tokens=100) == 0
+    assert limiter.acquire(estimated_tokens=100, timeout=0.01) is True
+    assert limiter.wait_time(estimated_tokens=100) > 0
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("a" * 400) == 101
@@ -0,0 +1,29 @@
+import pytest
+
+from groq_models import groq_inference
+from retrieval import PassageIndex
+
+
+def transcript():
+    filler = " ".join(f"Our team meets clients every week to discuss plan number {index}." for index in range(40))
+    return (f"{filler} Management fees are two percent per year and entry costs are one percent. {filler} "
+            f"Capital at risk, past performance does not guarantee future returns. {filler}")
+
+
+def test_select_returns_the_passages_relevant_to_the_rule():
+    index = PassageIndex(transcript())
+
+    excerpts = index.select("Clear disclosure of fees and costs", 1)
+
+    assert excerpts is not None
+    assert "Management fees" in excerpts
+    assert len(excerpts) < len(transcript()) / 2
+
+
+def test_select_without_any_matching_passage():
+    assert PassageIndex(transcript()).select("zebra giraffe", 3) is None
+
+
+def test_batched_rules_reject_retrieval():
+    with pytest.raises(ValueError):
+        groq_inference("system", "llama-3.1-70b-versatile", ["a", "b"], "deck", rules_per_request=2, retrieval_top_n=3)
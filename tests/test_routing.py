@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+import cache
+import routing
+from routing import LatencyStats, Router
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(tmp_path):
+    cache.set_cache(cache.ResultCache(str(tmp_path / "results.sqlite")))
+    yield
+    cache.set_cache(None)
+
+
+def test_percentiles_need_enough_samples():
+    stats = LatencyStats()
+    for seconds in range(routing.MIN_LATENCY_SAMPLES - 1):
+        stats.record(seconds)
+    assert stats.percentile(50) is None
+
+
+def test_nearest_rank_percentiles():
+    stats = LatencyStats()
+    for seconds in range(1, 101):
+        stats.record(seconds / 100)
+
+    assert stats.percentile(50) == 0.5
+    assert stats.percentile(95) == 0.95
+    assert stats.percentile(100) == 1.0
+
+
+def test_window_and_error_rate():
+    stats = LatencyStats(window=10)
+    for _ in range(20):
+        stats.record(5.0)
+    for _ in range(10):
+        stats.record(1.0)
+    stats.record_error()
+
+    assert stats.percentile(95) == 1.0
+    assert stats.error_rate() == 0.1
+
+
+def make_router(answers):
+    """Router over two fake backends; `answers[name](timeout, cancel_event)` gives each backend's verdict."""
+    router = Router(backends=(("groq", "primary-model"), ("gemini", "other-model")), max_hedge_ratio=1.0)
+    calls = []
+    for backend in router.backends.values():
+        def generate(prompt, system_message, timeout, cancel_event, name=backend.name):
+            calls.append((name, timeout))
+            return answers[name](timeout, cancel_event)
+        backend.generate = generate
+    return router, calls
+
+
+def test_slow_request_is_hedged_and_the_copy_wins():
+    def slow(timeout, cancel_event):
+        cancel_event.wait(timeout)
+        return {"backend": "primary"}
+
+    router, calls = make_router({"groq:primary-model": slow, "gemini:other-model": lambda *args: {"backend": "copy"}})
+    for _ in range(routing.MIN_LATENCY_SAMPLES):
+        router.backends["groq:primary-model"].stats.record(0.05)
+
+    assert router.generate("prompt", "system", "primary-model", timeout=5) == {"backend": "copy"}
+    assert router.stats()["hedge_wins"] == 1
+    assert [name for name, _ in calls] == ["groq:primary-model", "gemini:other-model"]
+
+
+def test_failed_request_fails_over_with_the_remaining_time():
+    def failing(timeout, cancel_event):
+        time.sleep(0.3)
+        raise RuntimeError("down")
+
+    router, calls = make_router({"groq:primary-model": failing, "gemini:other-model": lambda *args: {"backend": "other"}})
+
+    assert router.generate("prompt", "system", "primary-model", timeout=2) == {"backend": "other"}
+    (_, first_timeout), (_, failover_timeout) = calls
+    assert first_timeout <= 2
+    assert failover_timeout <= 2 - 0.3
+
+
+def test_no_attempt_outlives_the_deadline():
+    release = threading.Event()
+
+    def hanging(timeout, cancel_event):
+        if not release.wait(timeout):
+            raise TimeoutError("Request timed out")
+        return {"late": True}
+
+    router, calls = make_router({"groq:primary-model": hanging, "gemini:other-model": hanging})
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        router.generate("prompt", "system", "primary-model", timeout=0.5)
+    release.set()
+
+    assert time.monotonic() - start < 1.5
+    assert all(timeout <= 0.5 for _, timeout in calls)
+
+
+def test_verdict_of_a_hedge_is_served_from_the_cache():
+    def slow(timeout, cancel_event):
+        cancel_event.wait(timeout)
+        return {"backend": "primary"}
+
+    def copy(timeout, cancel_event):
+        output = {"backend": "copy"}
+        cache.get_cache().set(routing.generation_cache_key("prompt", "system", "other-model"), output)
+        return output
+
+    router, calls = make_router({"groq:primary-model": slow, "gemini:other-model": copy})
+    for _ in range(routing.MIN_LATENCY_SAMPLES):
+        router.backends["groq:primary-model"].stats.record(0.05)
+    assert router.generate("prompt", "system", "primary-model", timeout=5) == {"backend": "copy"}
+    calls.clear()
+
+    assert router.generate("prompt", "system", "primary-model", timeout=5) == {"backend": "copy"}
+    assert calls == []
+
+
+def test_gemini_verdicts_are_cached(monkeypatch):
+    answers = []
+
+    def gemini_answer(prompt, model, timeout, cancel_event=None):
+        answers.append(prompt)
+        return '{"label": "Compliant"}'
+
+    monkeypatch.setattr(routing, "gemini_answer", gemini_answer)
+    monkeypatch.setattr(routing, "get_generative_model", lambda model, system_message: None)
+    backend = routing.Backend("gemini", "other-model")
+
+    for _ in range(2):
+        assert backend.generate("prompt", "system", 5, threading.Event()) == {"label": "Compliant"}
+    assert answers == ["prompt"]
+    assert routing.cached_generation("prompt", "system", "other-model") == {"label": "Compliant"}
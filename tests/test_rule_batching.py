@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import script
+import tracing
+from rule_batching import build_batch_prompt, evaluate_rules_batched, parse_batch_output
+from script import GeminiResponse
+
+
+def verdict(rule_name, label=True):
+    return {"rule_name": rule_name, "label": label, "part": [], "suggestion": []}
+
+
+def test_matches_verdicts_by_rule_name_whatever_their_order():
+    rules = ["Clear Disclosure of Fees", "Inclusion of Risk Warnings"]
+    output = {"results": [verdict("Inclusion of Risk Warnings", False), verdict("Clear Disclosure of Fees")]}
+
+    verdicts = parse_batch_output(output, rules, GeminiResponse)
+
+    assert verdicts[0]["rule_name"] == "Clear Disclosure of Fees"
+    assert verdicts[1]["label"] is False
+
+
+def test_accepts_paraphrased_rule_name_at_the_same_position():
+    rules = ["Clear Disclosure of Fees and Costs", "Inclusion of Risk Warnings"]
+    output = {"results": [verdict("Clear disclosure of fees & costs"), verdict("Something else entirely")]}
+
+    verdicts = parse_batch_output(output, rules, GeminiResponse)
+
+    assert verdicts[0] is not None
+    # Too far from the rule name to be trusted, the rule is re-run on its own
+    assert verdicts[1] is None
+
+
+def test_invalid_and_dropped_verdicts_are_missing():
+    rules = ["Rule one", "Rule two", "Rule three"]
+    output = {"results": [{"rule_name": "Rule one", "label": "yes"}, verdict("Rule two")]}
+
+    assert parse_batch_output(output, rules, GeminiResponse) == [None, verdict("Rule two"), None]
+
+
+def test_malformed_output_misses_every_rule():
+    assert parse_batch_output({"results": "oops"}, ["a", "b"], GeminiResponse) == [None, None]
+    assert parse_batch_output({}, ["a"], GeminiResponse) == [None]
+
+
+def test_batch_prompt_numbers_the_rules():
+    prompt = build_batch_prompt(["First rule ", "Second rule"], "deck")
+
+    assert "1. First rule" in prompt and "2. Second rule" in prompt
+
+
+def test_malformed_gemini_answers_only_lose_their_own_rule(monkeypatch):
+    answers = {"Rule one": "{not json", "Rule two": '{"rule_name": "Rule two", "label": true, "part": [], "suggestion": []}'}
+
+    def gemini_answer(prompt, model, timeout, generation_config=None):
+        if "The rules are:" in prompt:
+            return "{truncated"
+        return next(answer for rule, answer in answers.items() if rule in prompt)
+
+    monkeypatch.setattr(script, "gemini_answer", gemini_answer)
+    monkeypatch.setattr(script, "get_generative_model", lambda model_name, system_message: SimpleNamespace())
+    monkeypatch.setattr(script, "get_gemini_options", lambda: {"batch_generation_config": None})
+
+    outputs = script.inference("system", "gemini-1.5-flash", ["Rule one", "Rule two"], "deck", rules_per_request=2)
+
+    assert outputs[0] is None
+    assert '"Rule two"' in outputs[1]
+
+
+def test_positional_match_returns_the_validated_verdict():
+    rules = ["Clear Disclosure of Fees and Costs"]
+    output = {"results": [{"rule_name": "Clear disclosure of fees & costs", "label": "true", "part": [], "suggestion": []}]}
+
+    verdicts = parse_batch_output(output, rules, GeminiResponse)
+
+    assert verdicts[0]["label"] is True
+
+
+def test_tokens_saved_are_recorded_in_the_metrics():
+    rules = [f"Rule {index}" for index in range(4)]
+
+    _, report = evaluate_rules_batched(
+        rules, "deck " * 2000, "system", "llama-3.1-70b-versatile",
+        generate_batch=lambda prompt: {"results": [verdict(rule) for rule in rules if rule in prompt]},
+        evaluate_rule=lambda rule: verdict(rule),
+        verdict_schema=GeminiResponse, rules_per_request=2,
+    )
+
+    assert report["requests"] == 2 and report["input_tokens_saved"] > 0
+    assert (f'input_tokens_saved_total{{model="llama-3.1-70b-versatile",technique="rule_batching"}} '
+            in tracing.prometheus_text())
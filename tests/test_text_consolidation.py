@@ -0,0 +1,31 @@
+from text_consolidation import consolidate_texts
+
+
+DISCLAIMER = "Capital at risk. Past performance does not guarantee future results."
+
+
+def test_near_duplicate_readings_form_one_cluster():
+    texts = [
+        {"timestamp": 10, "text": DISCLAIMER},
+        {"timestamp": 5, "text": "Invest in your future with BrightFuture"},
+        {"timestamp": 15, "text": DISCLAIMER.upper()},
+        {"timestamp": 20, "text": "Capital at risk. Past performance does not guarantee future result"},
+    ]
+
+    clusters = consolidate_texts(texts)
+
+    assert [cluster["count"] for cluster in clusters] == [3, 1]
+    assert clusters[0]["timestamps"] == [10, 15, 20]
+
+
+def test_canonical_text_is_the_most_frequent_then_the_longest_reading():
+    truncated = "Capital at risk. Past performance does not guarantee"
+    clusters = consolidate_texts([truncated, DISCLAIMER, truncated])
+    assert [cluster["text"] for cluster in clusters] == [truncated]
+
+    clusters = consolidate_texts([truncated, DISCLAIMER])
+    assert clusters[0]["text"] == DISCLAIMER
+
+
+def test_empty_texts_are_skipped():
+    assert consolidate_texts(["", None, {"timestamp": 0, "text": ""}]) == []
@@ -0,0 +1,47 @@
+from transcription import _drop_repeated_prefix, stitch_segments
+
+
+def test_drop_repeated_prefix_removes_the_overlapping_words():
+    assert _drop_repeated_prefix("our returns speak for themselves", "Speak for themselves, every year.") == "every year."
+
+
+def test_drop_repeated_prefix_keeps_text_without_overlap():
+    assert _drop_repeated_prefix("our returns speak for themselves", "Capital at risk.") == "Capital at risk."
+
+
+def test_stitch_keeps_each_side_of_the_overlap_once():
+    chunks = [(0, 305), (300, 600)]
+    chunk_segments = [
+        [
+            {"start": 0, "end": 290, "text": "Welcome to BrightFuture."},
+            {"start": 296, "end": 305, "text": "Our returns speak for"},
+        ],
+        [
+            {"start": 300, "end": 304, "text": "returns speak for themselves."},
+            {"start": 304, "end": 320, "text": "Capital at risk."},
+        ],
+    ]
+
+    merged = stitch_segments(chunk_segments, chunks)
+
+    # The overlap midpoint is 302.5: the first chunk keeps its segment at 296, the second drops the one at 300
+    assert [segment["text"] for segment in merged] == ["Welcome to BrightFuture.", "Our returns speak for", "Capital at risk."]
+
+
+def test_stitch_drops_words_transcribed_on_both_sides_of_the_midpoint():
+    chunks = [(0, 310), (300, 600)]
+    chunk_segments = [
+        [{"start": 298, "end": 310, "text": "Many of our clients have seen"}],
+        [{"start": 306, "end": 315, "text": "clients have seen their investments grow."}],
+    ]
+
+    merged = stitch_segments(chunk_segments, chunks)
+
+    assert [segment["text"] for segment in merged] == ["Many of our clients have seen", "their investments grow."]
+
+
+def test_stitch_without_overlap_keeps_every_segment():
+    chunks = [(0, 300), (300, 600)]
+    chunk_segments = [[{"start": 0, "end": 10, "text": "One."}], [{"start": 300, "end": 310, "text": "Two."}, {"start": 310, "end": 311, "text": ""}]]
+
+    assert [segment["text"] for segment in stitch_segments(chunk_segments, chunks)] == ["One.", "Two."]
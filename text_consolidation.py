@@ -0,0 +1,89 @@
+import difflib
+import re
+
+
+# Texts whose word shingles overlap at least this much are the same text read twice
+SHINGLE_SIMILARITY_THRESHOLD = 0.5
+
+# Short texts have few shingles, they are compared with a normalised edit similarity instead
+EDIT_SIMILARITY_THRESHOLD = 0.85
+
+SHINGLE_SIZE = 3
+
+
+def normalize_text(text):
+    """Lowercase, drop punctuation and collapse whitespace, to compare OCR readings."""
+    return " ".join(re.sub(r"[^\w\s%$€£]", " ", text.lower()).split())
+
+
+def shingles(normalized_text, size=SHINGLE_SIZE):
+    """Set of word n-grams of a normalised text."""
+    words = normalized_text.split()
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(set_a, set_b):
+    if not set_a or not set_b:
+        return 0.0
+    return len(set_a & set_b) / len(set_a | set_b)
+
+
+def _same_text(normalized_a, shingles_a, normalized_b, shingles_b):
+    if jaccard(shingles_a, shingles_b) >= SHINGLE_SIMILARITY_THRESHOLD:
+        return True
+    # Containment catches truncated readings of the same small print
+    if normalized_a and normalized_b and (normalized_a in normalized_b or normalized_b in normalized_a):
+        return min(len(normalized_a), len(normalized_b)) >= 0.5 * max(len(normalized_a), len(normalized_b))
+    return difflib.SequenceMatcher(None, normalized_a, normalized_b).ratio() >= EDIT_SIMILARITY_THRESHOLD
+
+
+def same_text(text_a, text_b):
+    """True if two OCR readings would be consolidated into the same text by `consolidate_texts`."""
+    normalized_a, normalized_b = normalize_text(text_a), normalize_text(text_b)
+    return _same_text(normalized_a, shingles(normalized_a), normalized_b, shingles(normalized_b))
+
+
+def consolidate_texts(texts):
+    """Cluster near-duplicate OCR texts and keep one canonical version per cluster.
+
+    `texts` holds strings or {"timestamp", "text"} dicts. Returns clusters in order of
+    first appearance as {"text", "timestamps", "count"} dicts, where "text" is the most
+    frequent reading of the cluster, the longest one on ties since OCR tends to truncate.
+    """
+    clusters = []
+    for item in texts:
+        if isinstance(item, dict):
+            timestamp, text = item.get("timestamp"), item.get("text")
+        else:
+            timestamp, text = None, item
+        if not text:
+            continue
+        normalized = normalize_text(text)
+        text_shingles = shingles(normalized)
+
+        for cluster in clusters:
+            if _same_text(normalized, text_shingles, cluster["normalized"], cluster["shingles"]):
+                break
+        else:
+            cluster = {"normalized": normalized, "shingles": text_shingles, "readings": {}, "timestamps": []}
+            clusters.append(cluster)
+
+        cluster["readings"][text] = cluster["readings"].get(text, 0) + 1
+        if len(normalized) > len(cluster["normalized"]):
+            # Match later readings against the most complete one, scrolling text grows and shrinks
+            cluster["normalized"], cluster["shingles"] = normalized, text_shingles
+        if timestamp is not None:
+            cluster["timestamps"].append(timestamp)
+
+    consolidated = []
+    for cluster in clusters:
+        readings = cluster["readings"]
+        canonical = max(readings, key=lambda reading: (readings[reading], len(reading)))
+        consolidated.append({
+            "text": canonical,
+            "timestamps": sorted(cluster["timestamps"]),
+            "count": sum(readings.values()),
+        })
+    return consolidated
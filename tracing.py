@@ -0,0 +1,405 @@
+"""Spans and metrics of the review stages, exported as OpenTelemetry (OTLP/JSON) spans and Prometheus text.
+
+`span(name, **attributes)` times a stage as a child of the current span; spans started in
+`TracedThreadPoolExecutor` workers or `traced_thread` threads keep the span that submitted
+them as parent, and executor work records its queue wait. Deep helpers annotate the current
+span without holding it: `record_usage` (tokens of an API response), `record_retry`,
+`record_cache_lookup` and `record_rate_limit_wait`. Every finished span also feeds the
+Prometheus metrics, see `prometheus_text` and `start_metrics_server`.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "berrypie"
+
+# Finished spans kept in memory for the exporters and the app's panel
+MAX_SPANS = 20000
+
+# Upper bounds of the histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Span attributes summed over the descendants of a span by `trace_breakdown`
+SUMMED_ATTRIBUTES = (
+    "queue_wait_seconds", "rate_limit_wait_seconds", "prompt_tokens", "completion_tokens",
+    "retries", "cache_hits", "cache_misses", "input_tokens_saved",
+)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+# Seconds the executor work item waited in the queue, taken by the first span it starts
+_pending_queue_wait = contextvars.ContextVar("pending_queue_wait", default=None)
+
+_spans = deque(maxlen=MAX_SPANS)
+_spans_lock = threading.Lock()
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def new_trace_id():
+    return secrets.token_hex(16)
+
+
+class Span:
+    """One timed stage: name, trace and parent ids, attributes, status and wall-clock bounds."""
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.duration = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+
+    def set(self, **attributes):
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def add(self, name, value=1):
+        """Add `value` to a numeric attribute, e.g. the retries or tokens of several calls."""
+        with self._lock:
+            self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self._started_at
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+        self.error = error
+
+    def to_otel(self):
+        """The span in the OTLP/JSON encoding."""
+        otel_span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otel_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            otel_span["parentSpanId"] = self.parent_id
+        return otel_span
+
+
+def _otel_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def span(name, trace_id=None, **attributes):
+    """Time the enclosed block as a span, child of the current span.
+
+    With `trace_id`, the span starts a new root of that trace instead, e.g. one per pipeline task.
+    Exceptions are recorded on the span and re-raised.
+    """
+    parent = None if trace_id else _current_span.get()
+    new_span = Span(name, parent.trace_id if parent else trace_id or new_trace_id(),
+                    parent.span_id if parent else None, attributes)
+    queue_wait = _pending_queue_wait.get()
+    if queue_wait is not None:
+        _pending_queue_wait.set(None)
+        new_span.set(queue_wait_seconds=queue_wait)
+    token = _current_span.set(new_span)
+    error = None
+    try:
+        yield new_span
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.finish(error)
+        _record(new_span)
+
+
+def traced(name):
+    """Decorator running each call of the function in a `span(name)`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(name, seconds, **attributes):
+    """Record an already timed stage ending now as a child of the current span, e.g. a step of a generator."""
+    parent = _current_span.get()
+    new_span = Span(name, parent.trace_id if parent else new_trace_id(), parent.span_id if parent else None, attributes)
+    new_span.start_ns = time.time_ns() - int(seconds * 1e9)
+    new_span.end_ns = time.time_ns()
+    new_span.duration = seconds
+    _record(new_span)
+
+
+def traced_iter(iterable, name, **attributes):
+    """Yield the items of `iterable`, recording the time spent producing each one as a `name` span."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        record_span(name, time.perf_counter() - start, **attributes)
+        yield item
+
+
+def traced_thread(target, name=None, daemon=True):
+    """A thread running `target` with the current span as parent of its spans."""
+    return threading.Thread(target=contextvars.copy_context().run, args=(target,), name=name, daemon=daemon)
+
+
+class TracedThreadPoolExecutor(ThreadPoolExecutor):
+    """Thread pool whose work items keep the submitter's current span and record their queue wait."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+        submitted_at = time.perf_counter()
+
+        def run():
+            queue_wait = time.perf_counter() - submitted_at
+            _pending_queue_wait.set(queue_wait)
+            _metrics.observe("executor_queue_wait_seconds", queue_wait, executor=self._thread_name_prefix or "default")
+            return fn(*args, **kwargs)
+
+        return super().submit(context.run, run)
+
+
+def _record(finished_span):
+    with _spans_lock:
+        _spans.append(finished_span)
+    stage = finished_span.name
+    _metrics.observe("stage_duration_seconds", finished_span.duration, stage=stage)
+    if finished_span.attributes.get("queue_wait_seconds") is not None:
+        _metrics.observe("stage_queue_wait_seconds", finished_span.attributes["queue_wait_seconds"], stage=stage)
+    if finished_span.error:
+        _metrics.increment("stage_errors_total", stage=stage)
+
+
+def annotate(**attributes):
+    """Set attributes on the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def record_usage(response, model):
+    """Record the token usage reported in a Groq (OpenAI-style) or Gemini response."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        prompt_tokens, completion_tokens = getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    else:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        prompt_tokens, completion_tokens = getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None)
+    current = _current_span.get()
+    for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if tokens:
+            _metrics.increment("tokens_total", tokens, model=model, kind=kind)
+            if current is not None:
+                current.add(f"{kind}_tokens", tokens)
+
+
+def record_tokens_saved(tokens, model, technique):
+    """Count the input tokens a prompt optimisation (e.g. "rule_batching") saved against one request per rule."""
+    _metrics.increment("input_tokens_saved_total", tokens, model=model, technique=technique)
+    current = _current_span.get()
+    if current is not None:
+        current.add("input_tokens_saved", tokens)
+
+
+def record_retry(model):
+    """Count a retried API call, e.g. after a 429."""
+    _metrics.increment("api_retries_total", model=model)
+    current = _current_span.get()
+    if current is not None:
+        current.add("retries")
+
+
+def record_cache_lookup(namespace, hit):
+    _metrics.increment("cache_lookups_total", namespace=namespace, result="hit" if hit else "miss")
+    current = _current_span.get()
+    if current is not None:
+        current.add("cache_hits" if hit else "cache_misses")
+
+
+def record_route(backend, hedge_backend=None, winner=None):
+    """Count a request routed to `backend`, the backend its copy was sent to if any, and the backend that answered."""
+    _metrics.increment("routed_requests_total", backend=backend, winner=winner or "none")
+    if hedge_backend is not None:
+        _metrics.increment("hedged_requests_total", backend=backend, hedge_backend=hedge_backend)
+        annotate(hedge_backend=hedge_backend)
+    annotate(winner=winner or "none")
+
+
+def record_rate_limit_wait(seconds):
+    """Count the time spent waiting for the rate limiter as queue time of the current span."""
+    current = _current_span.get()
+    stage = current.name if current is not None else "none"
+    _metrics.observe("rate_limit_wait_seconds", seconds, stage=stage)
+    if current is not None:
+        current.add("rate_limit_wait_seconds", seconds)
+
+
+def finished_spans(trace_id=None):
+    """The finished spans still in memory, those of `trace_id` only when given."""
+    with _spans_lock:
+        return [finished for finished in _spans if trace_id is None or finished.trace_id == trace_id]
+
+
+def export_spans(trace_id=None):
+    """The finished spans as an OTLP/JSON `ExportTraceServiceRequest`, e.g. for an OpenTelemetry collector."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otel_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [finished.to_otel() for finished in finished_spans(trace_id)],
+            }],
+        }],
+    }
+
+
+def trace_breakdown(trace_id, root_span_id):
+    """Time, waits, tokens, retries and cache hits of the descendants of a span, summed by span name."""
+    spans = finished_spans(trace_id)
+    children = {}
+    for finished in spans:
+        children.setdefault(finished.parent_id, []).append(finished)
+    rows = {}
+    pending = list(children.get(root_span_id, []))
+    while pending:
+        finished = pending.pop()
+        pending.extend(children.get(finished.span_id, []))
+        row = rows.setdefault(finished.name, {"stage": finished.name, "count": 0, "seconds": 0.0, "errors": 0,
+                                              **{name: 0 for name in SUMMED_ATTRIBUTES}})
+        row["count"] += 1
+        row["seconds"] += finished.duration or 0.0
+        row["errors"] += 1 if finished.error else 0
+        for name in SUMMED_ATTRIBUTES:
+            row[name] += finished.attributes.get(name) or 0
+    return sorted(rows.values(), key=lambda row: -row["seconds"])
+
+
+class Metrics:
+    """Counters and histograms with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, prefix=SERVICE_NAME, buckets=DURATION_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{self.prefix}_{name}{_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} histogram")
+                for key, histogram in series.items():
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        lines.append(f"{self.prefix}_{name}_bucket{_labels(key + (('le', f'{bound:g}'),))} {count}")
+                    lines.append(f"{self.prefix}_{name}_bucket{_labels(key + (('le', '+Inf'),))} {histogram['count']}")
+                    lines.append(f"{self.prefix}_{name}_sum{_labels(key)} {histogram['sum']:.6f}")
+                    lines.append(f"{self.prefix}_{name}_count{_labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key):
+    if not key:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in key)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + "}"
+
+
+_metrics = Metrics()
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format."""
+    return _metrics.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/traces":
+            body, content_type = json.dumps(export_spans()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /traces (OTLP/JSON spans) from a background thread, once per process.
+
+    There is no authentication: the server only listens on localhost unless another `host` is given.
+    """
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return _metrics_server
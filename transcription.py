@@ -0,0 +1,223 @@
+import logging
+import re
+import subprocess
+import time
+
+from tenacity import Retrying, retry_if_exception_type, stop_after_delay, wait_random_exponential
+
+from clients import get_groq_client
+from frame_sampling import get_ffmpeg_binary
+from rate_limiting import get_rate_limiter
+from tracing import TracedThreadPoolExecutor, record_retry, span, traced
+
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_MODEL = "whisper-large-v3"
+TRANSCRIPTION_PROMPT = "Specify context or spelling"
+
+# Audio longer than this is split into chunks transcribed concurrently
+CHUNK_SECONDS = 300
+
+# Overlap between two chunks when no silence was found to cut on
+OVERLAP_SECONDS = 5
+
+# How far before a chunk boundary to look for a silence to cut on
+SILENCE_SEARCH_SECONDS = 20
+
+# Maximum number of chunks transcribed at the same time
+MAX_TRANSCRIPTION_WORKERS = 4
+
+# Deadline in seconds for transcribing a single chunk, retries and rate limiting included
+CHUNK_TIMEOUT_SECONDS = 300
+
+SAMPLE_RATE = 16000
+
+
+def get_audio_duration(audio_path):
+    """Return the duration of a media file in seconds, parsed from the ffmpeg banner."""
+    completed = subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-nostdin", "-i", audio_path],
+        capture_output=True, text=True,
+    )
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", completed.stderr)
+    if not match:
+        raise RuntimeError(f"Could not read the duration of {audio_path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _decode_window(audio_path, start, duration):
+    """Decode part of the audio as 16 kHz mono PCM into a pydub AudioSegment."""
+    from pydub import AudioSegment
+
+    completed = subprocess.run(
+        [
+            get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-nostdin",
+            "-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i", audio_path,
+            "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-",
+        ],
+        capture_output=True, check=True,
+    )
+    return AudioSegment(data=completed.stdout, sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
+
+
+@traced("audio_chunk_encode")
+def _encode_chunk(audio_path, start, duration):
+    """Cut part of the audio and encode it in memory as 16 kHz mono MP3."""
+    completed = subprocess.run(
+        [
+            get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-nostdin",
+            "-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i", audio_path,
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "libmp3lame", "-b:a", "32k", "-f", "mp3", "-",
+        ],
+        capture_output=True, check=True,
+    )
+    return completed.stdout
+
+
+def _find_silence_cut(audio_path, boundary, search_seconds):
+    """Return the timestamp of the longest silence just before `boundary`, or None if there is none."""
+    from pydub.silence import detect_silence
+
+    window_start = max(boundary - search_seconds, 0)
+    window = _decode_window(audio_path, window_start, boundary - window_start)
+    if len(window) == 0:
+        return None
+    silences = detect_silence(window, min_silence_len=300, silence_thresh=window.dBFS - 16, seek_step=10)
+    if not silences:
+        return None
+    start_ms, end_ms = max(silences, key=lambda silence: silence[1] - silence[0])
+    return window_start + (start_ms + end_ms) / 2000
+
+
+def plan_chunks(audio_path, duration, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+                split_on_silence=True, search_seconds=SILENCE_SEARCH_SECONDS):
+    """Split `[0, duration]` into `(start, end)` chunks of at most `chunk_seconds`.
+
+    Chunks are cut in the middle of a silence when one is found before the nominal boundary,
+    otherwise they are cut on the boundary and the next chunk starts `overlap_seconds` earlier.
+    """
+    chunks = []
+    start = 0.0
+    while duration - start > chunk_seconds:
+        boundary = start + chunk_seconds
+        cut = _find_silence_cut(audio_path, boundary, min(search_seconds, chunk_seconds / 2)) if split_on_silence else None
+        if cut is not None and cut > start:
+            chunks.append((start, cut))
+            start = cut
+        else:
+            chunks.append((start, boundary))
+            start = boundary - overlap_seconds
+    chunks.append((start, duration))
+    return chunks
+
+
+def _field(item, name):
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+def transcribe_chunk(audio_bytes, offset, timeout=CHUNK_TIMEOUT_SECONDS):
+    """Transcribe an in-memory audio chunk and return its segments shifted by `offset` seconds."""
+    from groq import RateLimitError
+
+    deadline = time.monotonic() + timeout
+    rate_limiter = get_rate_limiter(TRANSCRIPTION_MODEL)
+    for attempt in Retrying(
+        retry=retry_if_exception_type(RateLimitError),
+        wait=wait_random_exponential(multiplier=1, max=20),
+        stop=stop_after_delay(timeout),
+        reraise=True,
+    ):
+        with attempt:
+            if attempt.retry_state.attempt_number > 1:
+                record_retry(TRANSCRIPTION_MODEL)
+            if not rate_limiter.acquire(timeout=deadline - time.monotonic()):
+                raise TimeoutError(f"Rate limit budget of {TRANSCRIPTION_MODEL} not available within {timeout} seconds")
+            # The span covers the request only, the rate limit wait has its own span
+            with span("groq.transcription", model=TRANSCRIPTION_MODEL, bytes=len(audio_bytes)):
+                transcription = get_groq_client().audio.transcriptions.create(
+                    file=(f"chunk_{offset:.0f}.mp3", audio_bytes),
+                    model=TRANSCRIPTION_MODEL,
+                    prompt=TRANSCRIPTION_PROMPT,
+                    response_format="verbose_json",
+                    temperature=0.0,
+                    timeout=max(deadline - time.monotonic(), 1),
+                )
+
+    segments = getattr(transcription, "segments", None) or []
+    if not segments:
+        # No segment information, keep the chunk as a single segment
+        return [{"start": offset, "end": offset, "text": transcription.text.strip()}]
+    return [
+        {
+            "start": offset + _field(segment, "start"),
+            "end": offset + _field(segment, "end"),
+            "text": _field(segment, "text").strip(),
+        }
+        for segment in segments
+    ]
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def _drop_repeated_prefix(previous_text, text, max_words=20):
+    """Remove from `text` the leading words that repeat the trailing words of `previous_text`."""
+    previous_words = [_normalize_word(word) for word in previous_text.split()[-max_words:]]
+    words = text.split()
+    normalized = [_normalize_word(word) for word in words[:max_words]]
+    for size in range(min(len(previous_words), len(normalized)), 0, -1):
+        if previous_words[-size:] == normalized[:size]:
+            return " ".join(words[size:])
+    return text
+
+
+def stitch_segments(chunk_segments, chunks):
+    """Merge the segments of consecutive chunks, removing what was transcribed twice in overlaps."""
+    merged = []
+    for index, segments in enumerate(chunk_segments):
+        start, _ = chunks[index]
+        overlapping = index > 0 and chunks[index - 1][1] > start
+        if overlapping:
+            # Each side keeps the segments starting on its half of the overlap
+            midpoint = (start + chunks[index - 1][1]) / 2
+            merged = [segment for segment in merged if segment["start"] < midpoint]
+            segments = [segment for segment in segments if segment["start"] >= midpoint]
+            if segments and merged:
+                # Segment boundaries rarely line up, drop the words transcribed on both sides
+                segments[0] = dict(segments[0], text=_drop_repeated_prefix(merged[-1]["text"], segments[0]["text"]))
+        merged.extend(segment for segment in segments if segment["text"])
+    return merged
+
+
+@traced("transcribe_audio")
+def transcribe_audio(audio_path, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+                     split_on_silence=True, max_workers=MAX_TRANSCRIPTION_WORKERS, executor=None):
+    """Transcribe an audio file, returned as {"text", "segments"} with segment-level timestamps.
+
+    Audio longer than `chunk_seconds` is split on silences (or fixed windows with overlap),
+    the chunks are transcribed concurrently under the Whisper rate limit and then stitched,
+    so latency depends on the number of chunks over the concurrency rather than on the duration.
+    Pass `executor` to run the chunks on a shared thread pool instead of a dedicated one.
+    """
+    duration = get_audio_duration(audio_path)
+    chunks = plan_chunks(audio_path, duration, chunk_seconds, overlap_seconds, split_on_silence)
+    logger.info(f"Transcribing {duration:.0f} seconds of audio in {len(chunks)} chunks")
+
+    def transcribe(chunk):
+        start, end = chunk
+        return transcribe_chunk(_encode_chunk(audio_path, start, end - start), start)
+
+    if executor is not None:
+        chunk_segments = list(executor.map(transcribe, chunks))
+    else:
+        with TracedThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            chunk_segments = list(executor.map(transcribe, chunks))
+
+    segments = stitch_segments(chunk_segments, chunks)
+    return {
+        "text": " ".join(segment["text"] for segment in segments),
+        "segments": segments,
+    }
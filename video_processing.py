@@ -1,62 +1,144 @@
-import streamlit as st
-import moviepy.editor as mp
 import os
 
-import cv2
-import base64
+import difflib
 import json
+import queue
+import subprocess
+import threading
+import time
+from contextlib import closing
 
-from groq import Groq
-from dotenv import load_dotenv
+from frame_sampling import sample_frames, sample_frames_parallel, get_ffmpeg_binary, video_sample_timestamps
+from frame_filters import FrameDeduplicator, detect_text_regions, crop_to_text_regions
+from frame_montage import MONTAGE_TILE_WIDTH, MONTAGE_TILE_HEIGHT, build_montage, tile_label
+from frame_encoding import FrameEncoder
+from rate_limiting import RateLimiter, get_rate_limiter, estimate_tokens
+from clients import get_groq_client
+from transcription import TRANSCRIPTION_MODEL, transcribe_audio
+from cache import get_cache, make_key, content_hash, file_hash
+from text_consolidation import consolidate_texts, normalize_text, same_text
+from tracing import record_usage, span, traced, traced_iter, traced_thread
 
+# Models used for the frame OCR and the disclaimer check
+VISION_MODEL = "llama-3.2-11b-vision-preview"
+DISCLAIMER_MODEL = "llama-3.2-90b-text-preview"
 
-# Load environment variables from a .env file
+# Text returned by the vision model for frames without text
+NO_TEXT_MESSAGE = "No text presented in the image"
 
-GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
+# Words that mark a text as a likely disclaimer, used to stop scanning frames early.
+# Words common in ordinary ad copy ("terms", "apply", "fees", ...) only count within a phrase
+DISCLAIMER_KEYWORDS = (
+    "disclaimer", "warning", "risk", "past performance", "not guaranteed", "no guarantee",
+    "terms and conditions", "conditions apply", "terms apply", "fees apply", "may lose", "losses",
+    "regulated", "authorised", "authorized", "not financial advice", "eligibility", "subject to",
+)
 
-# load_dotenv()
-# GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+# Whisper works on 16 kHz mono audio, anything above is only extra upload bytes
+TRANSCRIPTION_SAMPLE_RATE = 16000
 
-# Initialize the Groq client
-client = Groq(api_key=GROQ_API_KEY)
+# ffmpeg encoder arguments by output extension
+AUDIO_CODECS = {
+    ".mp3": ["-c:a", "libmp3lame", "-b:a", "32k"],
+    ".ogg": ["-c:a", "libopus", "-b:a", "24k"],
+    ".opus": ["-c:a", "libopus", "-b:a", "24k"],
+    ".flac": ["-c:a", "flac"],
+}
 
 
-def extract_audio_from_video(video_path, output_audio_path):
-    """Extracts audio from the video file and saves it as MP3."""
-    # Load the video file
-    video = mp.VideoFileClip(video_path)
-    # Create a temporary path for the WAV file
-    audio_path = output_audio_path.replace(".mp3", ".wav")
-    # Extract and save the audio as a WAV file
-    video.audio.write_audiofile(audio_path)
-    return audio_path
+@traced("extract_audio")
+def extract_audio_from_video(video_path, output_audio_path, mode="ffmpeg"):
+    """Extracts audio from the video file and saves it in a Whisper-friendly format.
+
+    In "ffmpeg" mode only the audio track is demuxed (no video frame is decoded) and it is
+    resampled to 16 kHz mono and encoded according to the extension of `output_audio_path`
+    (.mp3, .ogg/.opus or .flac). The "moviepy" mode keeps the former full-rate WAV export.
+    """
+    if mode == "moviepy":
+        import moviepy.editor as mp
+
+        # Load the video file
+        video = mp.VideoFileClip(video_path)
+        # Create a temporary path for the WAV file
+        audio_path = output_audio_path.replace(".mp3", ".wav")
+        # Extract and save the audio as a WAV file
+        video.audio.write_audiofile(audio_path)
+        return audio_path
+
+    extension = os.path.splitext(output_audio_path)[1].lower()
+    if extension not in AUDIO_CODECS:
+        raise ValueError(f"Unsupported audio format {extension}, expected one of {list(AUDIO_CODECS)}")
+    command = [
+        get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-i", video_path,
+        "-map", "0:a:0", "-vn", "-sn", "-dn",
+        "-ac", "1", "-ar", str(TRANSCRIPTION_SAMPLE_RATE),
+        *AUDIO_CODECS[extension],
+        output_audio_path,
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not extract the audio of {video_path}: {completed.stderr.strip()}")
+    return output_audio_path
+
+
+def _transcript_cache_key(video_path, video_hash=None):
+    return make_key("transcription", video_hash or file_hash(video_path), TRANSCRIPTION_MODEL)
+
+
+def get_cached_transcript(video_path, video_hash=None):
+    """Return the cached {"text", "segments"} transcript of the video, or None.
+
+    Pass `video_hash`, the SHA-256 of the video, when it is already known to skip reading the whole file.
+    """
+    return get_cache().get(_transcript_cache_key(video_path, video_hash))
+
+
+def transcribe_extracted_audio(video_path, audio_path, executor=None, video_hash=None):
+    """Transcribe the audio extracted from the video and cache the transcript under the video."""
+    transcript = transcribe_audio(audio_path, executor=executor)
+    get_cache().set(_transcript_cache_key(video_path, video_hash), transcript)
+    return transcript
+
+
+def transcribe_video(video_path, output_audio_path):
+    """Extract the audio of the video and transcribe it, reusing the cached transcript of identical videos.
+
+    Long audio is transcribed in concurrent chunks, see `transcription.transcribe_audio`.
+    """
+    transcript = get_cached_transcript(video_path)
+    if transcript is None:
+        audio_path = extract_audio_from_video(video_path, output_audio_path)
+        transcript = transcribe_extracted_audio(video_path, audio_path)
+    return transcript["text"]
 
 
 def transcribe_audio_with_whisper(audio_path):
-    """Transcribes the audio using the specified Whisper model."""
-    with open(audio_path, "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
-            file=(audio_path, audio_file.read()),
-            model="whisper-large-v3",
-            prompt="Specify context or spelling",
-            response_format="json",
-            temperature=0.0
-        )
-        return transcription.text
-
-
-def frame_to_base64(frame):
-    """Convert a video frame (OpenCV image) to a base64-encoded string."""
+    """Transcribe the audio file and return its text, see `transcription.transcribe_audio`."""
+    return transcribe_audio(audio_path)["text"]
+
+
+@traced("frame_to_base64")
+def frame_to_base64(frame, encoder=None):
+    """Convert a video frame (OpenCV image) to a base64-encoded string.
+
+    The crop, resolution, format and quality come from `encoder`, a `frame_encoding.FrameEncoder`;
+    without one the frame is encoded as is, in JPEG at quality 95.
+    """
     try:
-        _, buffer = cv2.imencode('.jpg', frame)
-        return base64.b64encode(buffer).decode('utf-8')
+        return (encoder or FrameEncoder(max_width=None, quality=95)).encode(frame)
     except Exception as e:
         print(f"Error converting frame to base64: {e}")
         return None
 
 
-def process_frame(base64_image):
-    """Processes the base64 image by sending it to the Groq API for text extraction."""
+@traced("process_frame")
+def process_frame(base64_image, rate_limiter=None, mime_type="image/jpeg", use_cache=True):
+    """Processes the base64 image by sending it to the Groq API for text extraction.
+
+    Results are cached by image content unless `use_cache` is False. Requests go through
+    `rate_limiter`, by default the shared limiter of the vision model.
+    """
     text_prompt = """
     Your task is to extract the text from the provided image, focusing on any small disclaimers or warnings written in small size.
     Ensure that you provide the extracted text in JSON format, using the following structure:
@@ -70,34 +152,45 @@ def process_frame(base64_image):
     }
     """
 
-    client = Groq(api_key=GROQ_API_KEY)
+    cache = get_cache()
+    cache_key = make_key("ocr", VISION_MODEL, text_prompt, content_hash(base64_image))
+    cached_text = cache.get(cache_key) if use_cache else None
+    if cached_text is not None:
+        return cached_text
+
+    client = get_groq_client()
     try:
-        # Send the image for processing to the Groq API
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": text_prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
+        (rate_limiter or get_rate_limiter(VISION_MODEL)).acquire()
+        with span("groq.vision", model=VISION_MODEL, bytes=len(base64_image)):
+            # Send the image for processing to the Groq API
+            chat_completion = client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": text_prompt},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:{mime_type};base64,{base64_image}",
+                                },
                             },
-                        },
-                    ],
-                }
-            ],
-            model="llama-3.2-11b-vision-preview",
-            response_format={"type": "json_object"},
-            temperature=0.1,
-            max_tokens=500,
-            stream=False,
-            stop=None,
-        )
+                        ],
+                    }
+                ],
+                model=VISION_MODEL,
+                response_format={"type": "json_object"},
+                temperature=0.1,
+                max_tokens=500,
+                stream=False,
+                stop=None,
+            )
+            record_usage(chat_completion, VISION_MODEL)
         
         # Parse the result
-        result = json.loads(chat_completion.choices[0].message.content)
+        with span("json_parse"):
+            result = json.loads(chat_completion.choices[0].message.content)
+        cache.set(cache_key, result["image_content"])
         return result["image_content"]
     
     except Exception as e:
@@ -105,51 +198,343 @@ def process_frame(base64_image):
         return None
 
 
-def extract_and_process_frames(video_path, interval_seconds=5):
-    """Extract frames from the video and process each frame for text extraction."""
-    # Open the video file
-    video = cv2.VideoCapture(video_path)
-    
-    # Get the frames per second (fps) of the video
-    fps = video.get(cv2.CAP_PROP_FPS)
-    frame_count = 0
-    success, frame = video.read()
+@traced("process_montage")
+def process_montage(base64_image, labels, rate_limiter=None, mime_type="image/jpeg"):
+    """Send a montage of labelled frames in a single vision request and return the text of each tile.
 
-    # List to store all extracted texts
-    extracted_texts = []
+    Returns a dict mapping each of `labels` to its text, or to None when the model left
+    the tile out of its answer. Results are cached by image content.
+    """
+    text_prompt = f"""
+    The provided image is a grid of {len(labels)} video frames. Each tile is under a strip holding its label ({", ".join(labels)}) and timestamp.
+    Your task is to extract the text of each tile separately, focusing on any small disclaimers or warnings written in small size.
+    Do not include the label strips in the extracted text.
+    Ensure that you provide the extracted text in JSON format, with one entry per tile, using the following structure:
+    {{
+        "tiles": [
+            {{"tile": "T1", "image_content": ""}}
+        ]
+    }}
 
-    while success:
-        # Calculate the current timestamp in seconds
-        current_time_sec = frame_count / fps
-        
-        # Extract frame every `interval_seconds`
-        if current_time_sec % interval_seconds == 0:
-            print(f"Processing frame at {int(current_time_sec)} seconds")
-            
-            # Convert the frame to base64
-            base64_image = frame_to_base64(frame)
-            
-            if base64_image:
+    If no text is presented in a tile, set its image_content to "{NO_TEXT_MESSAGE}".
+    """
+
+    cache = get_cache()
+    cache_key = make_key("ocr_montage", VISION_MODEL, text_prompt, content_hash(base64_image))
+    texts = cache.get(cache_key)
+    if texts is not None:
+        return texts
+
+    texts = {label: None for label in labels}
+    try:
+        (rate_limiter or get_rate_limiter(VISION_MODEL)).acquire()
+        with span("groq.vision", model=VISION_MODEL, bytes=len(base64_image), tiles=len(labels)):
+            chat_completion = get_groq_client().chat.completions.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": text_prompt},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:{mime_type};base64,{base64_image}",
+                                },
+                            },
+                        ],
+                    }
+                ],
+                model=VISION_MODEL,
+                response_format={"type": "json_object"},
+                temperature=0.1,
+                max_tokens=500 * len(labels),
+                stream=False,
+                stop=None,
+            )
+            record_usage(chat_completion, VISION_MODEL)
+        with span("json_parse"):
+            result = json.loads(chat_completion.choices[0].message.content)
+        for tile in result.get("tiles", []):
+            label = str(tile.get("tile", "")).strip().upper()
+            if label in texts and tile.get("image_content"):
+                texts[label] = tile["image_content"]
+        if all(text is not None for text in texts.values()):
+            cache.set(cache_key, texts)
+    except Exception as e:
+        print(f"Error processing montage: {e}")
+    return texts
+
+
+def iter_frame_texts(video_path, interval_seconds=5, policy="interval", num_frames=None, deduplicate=True,
+                     detect_text=False, crop_to_text=False, text_detection_params=None,
+                     max_workers=4, requests_per_minute=None, cancel_event=None, timestamps=None,
+                     montage_grid=None, tile_size=(MONTAGE_TILE_WIDTH, MONTAGE_TILE_HEIGHT), encoder=None,
+                     decode_processes=None):
+    """Yield a {"timestamp", "text"} dict for each sampled frame as soon as its text is known.
+
+    A decoder thread samples the frames and feeds a bounded queue, while `max_workers` threads
+    send the vision requests concurrently, so frame decoding and network I/O overlap.
+    Requests share the vision model's rate limit, or a dedicated `requests_per_minute` budget
+    when given. Frames are yielded in completion order, not in timestamp order.
+    When `deduplicate` is set, frames whose visual content did not change since a recently
+    processed frame are not sent to the vision model, they reuse the text of that frame.
+    When `detect_text` is set, frames without any likely text region are skipped locally,
+    and with `crop_to_text` only the area holding the text regions is sent.
+    Setting `cancel_event`, or closing the generator, stops decoding and pending requests.
+    Pass `timestamps` to sample an explicit list of timestamps, in that order, instead of a policy.
+    With `montage_grid` as (columns, rows), that many frames are tiled into one labelled image of
+    `tile_size` tiles and sent in a single vision request; tiles the model leaves out of its
+    answer are sent again on their own.
+    Frames are cropped, scaled and compressed by `encoder`, a `frame_encoding.FrameEncoder`
+    whose `stats()` report the bytes sent; by default the encoder's default settings are used.
+    With `decode_processes`, frames are decoded by that many processes, see
+    `frame_sampling.sample_frames_parallel`; useful for long or high-bitrate videos.
+    """
+    encoder = encoder or FrameEncoder()
+    columns, rows = montage_grid or (1, 1)
+    frames_per_request = columns * rows
+    rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else get_rate_limiter(VISION_MODEL)
+    frame_queue = queue.Queue(maxsize=2 * max_workers)
+    # Items sent to the workers: (timestamps, base64_image, tile frames or None for a single frame)
+    # Events sent to the consumer: ("text", timestamp, text), ("duplicate", timestamp, source),
+    # ("error", exception, None) and one ("done", None, None) per worker
+    result_queue = queue.Queue()
+    stop_event = threading.Event()
+
+    def cancelled():
+        return stop_event.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+    def send_frames(tiles):
+        """Queue a single frame, or a montage of the already prepared tile frames."""
+        tile_timestamps = [timestamp for timestamp, _ in tiles]
+        if frames_per_request == 1:
+            base64_image = frame_to_base64(tiles[0][1], encoder)
+            tile_frames = None
+        elif len(tiles) == 1:
+            base64_image = encoder.encode_image(tiles[0][1])
+            tile_frames = None
+        else:
+            tile_frames = [frame for _, frame in tiles]
+            with span("build_montage", tiles=len(tile_frames)):
+                montage = build_montage(tile_frames, [f"{timestamp:.1f}s" for timestamp in tile_timestamps],
+                                        columns, *tile_size)
+                base64_image = encoder.encode_image(montage)
+        if not base64_image:
+            print("no base64_image")
+            for timestamp in tile_timestamps:
+                result_queue.put(("text", timestamp, None))
+            return
+        frame_queue.put((tile_timestamps, base64_image, tile_frames))
+
+    def decode_frames():
+        deduplicator = FrameDeduplicator() if deduplicate else None
+        # Frames waiting for their montage to be complete
+        tiles = []
+        frames = None
+        try:
+            if decode_processes:
+                frames = sample_frames_parallel(video_path, policy, interval_seconds, num_frames, timestamps,
+                                                processes=decode_processes)
+            else:
+                frames = sample_frames(video_path, policy, interval_seconds, num_frames, timestamps)
+            for current_time_sec, frame in traced_iter(frames, "frame_decode"):
+                if cancelled():
+                    break
+                if deduplicator is not None:
+                    duplicate_of = deduplicator.check(current_time_sec, frame)
+                    if duplicate_of != current_time_sec:
+                        print(f"Frame at {current_time_sec:.2f} seconds unchanged since {duplicate_of:.2f} seconds")
+                        result_queue.put(("duplicate", current_time_sec, duplicate_of))
+                        continue
+
+                if detect_text or crop_to_text:
+                    regions = detect_text_regions(frame, **(text_detection_params or {}))
+                    if not regions:
+                        print(f"No text region detected in frame at {current_time_sec:.2f} seconds")
+                        result_queue.put(("text", current_time_sec, None))
+                        continue
+                    if crop_to_text:
+                        frame = crop_to_text_regions(frame, regions)
+
+                tiles.append((current_time_sec, frame if frames_per_request == 1 else encoder.prepare(frame)))
+                if len(tiles) == frames_per_request:
+                    send_frames(tiles)
+                    tiles = []
+            if tiles and not cancelled():
+                send_frames(tiles)
+        except Exception as e:
+            result_queue.put(("error", e, None))
+        finally:
+            if frames is not None:
+                # Stops the decoding processes when the scan ends early
+                frames.close()
+            # One stop marker per worker
+            for _ in range(max_workers):
+                frame_queue.put(None)
+
+    def process_frames():
+        while True:
+            item = frame_queue.get()
+            if item is None:
+                result_queue.put(("done", None, None))
+                return
+            if cancelled():
+                # Keep draining so the decoder is never blocked on a full queue
+                continue
+            tile_timestamps, base64_image, tile_frames = item
+            print(f"Processing frames at {', '.join(f'{timestamp:.2f}' for timestamp in tile_timestamps)} seconds")
+            try:
                 # Process the base64 image to extract text
-                extracted_text = process_frame(base64_image)
+                if tile_frames is None:
+                    extracted_texts = [process_frame(base64_image, rate_limiter, encoder.mime_type)]
+                else:
+                    labels = [tile_label(index) for index in range(len(tile_frames))]
+                    texts = process_montage(base64_image, labels, rate_limiter, encoder.mime_type)
+                    extracted_texts = [
+                        texts[label] if texts[label] is not None
+                        else process_frame(encoder.encode_image(tile_frame), rate_limiter, encoder.mime_type)
+                        for label, tile_frame in zip(labels, tile_frames)
+                    ]
+            except Exception as e:
+                result_queue.put(("error", e, None))
+                stop_event.set()
+                continue
+            for current_time_sec, extracted_text in zip(tile_timestamps, extracted_texts):
                 if extracted_text:
                     print(f"Text from frame: {extracted_text}")
-                    extracted_texts.append(extracted_text)  # Add the extracted text to the list
+                result_queue.put(("text", current_time_sec, extracted_text))
+
+    # The threads keep the caller's span as parent of their spans
+    threads = [traced_thread(decode_frames, name="frame-decoder")]
+    threads += [traced_thread(process_frames, name=f"frame-ocr-{i}") for i in range(max_workers)]
+    for thread in threads:
+        thread.start()
+
+    texts_by_timestamp = {}
+    # Duplicates whose source frame is still being processed
+    pending_duplicates = {}
+    finished_workers = 0
+    try:
+        while finished_workers < max_workers:
+            kind, timestamp, value = result_queue.get()
+            if kind == "done":
+                finished_workers += 1
+            elif kind == "error":
+                raise timestamp
+            elif kind == "duplicate":
+                if value in texts_by_timestamp:
+                    yield {"timestamp": timestamp, "text": texts_by_timestamp[value]}
+                else:
+                    pending_duplicates.setdefault(value, []).append(timestamp)
             else:
-                print("no base64_image")
-            
-        # Read the next frame
-        success, frame = video.read()
-        frame_count += 1
+                texts_by_timestamp[timestamp] = value
+                yield {"timestamp": timestamp, "text": value}
+                for duplicate_timestamp in pending_duplicates.pop(timestamp, []):
+                    yield {"timestamp": duplicate_timestamp, "text": value}
+    finally:
+        stop_event.set()
 
-    # Release the video capture object
-    video.release()
+
+def extract_frame_texts(video_path, interval_seconds=5, policy="interval", num_frames=None, deduplicate=True,
+                        detect_text=False, crop_to_text=False, text_detection_params=None,
+                        max_workers=4, requests_per_minute=None, montage_grid=None,
+                        tile_size=(MONTAGE_TILE_WIDTH, MONTAGE_TILE_HEIGHT), encoder=None,
+                        decode_processes=None):
+    """Extract the text of every sampled frame, returned as a list of {"timestamp", "text"} dicts.
+
+    Results are ordered by timestamp, see `iter_frame_texts` for the options.
+    """
+    frame_texts = iter_frame_texts(
+        video_path, interval_seconds, policy, num_frames, deduplicate,
+        detect_text, crop_to_text, text_detection_params,
+        max_workers, requests_per_minute,
+        montage_grid=montage_grid, tile_size=tile_size, encoder=encoder, decode_processes=decode_processes
+    )
+    return sorted(frame_texts, key=lambda frame_text: frame_text["timestamp"])
+
+
+def extract_and_process_frames(video_path, interval_seconds=5, policy="interval", num_frames=None, deduplicate=True,
+                               detect_text=False, crop_to_text=False, text_detection_params=None,
+                               max_workers=4, requests_per_minute=None, montage_grid=None,
+                               tile_size=(MONTAGE_TILE_WIDTH, MONTAGE_TILE_HEIGHT), encoder=None,
+                               decode_processes=None):
+    """Extract frames from the video and process each frame for text extraction.
+
+    Frames are sampled with `frame_sampling.sample_frames`, see there for the available policies.
+    """
+    frame_texts = extract_frame_texts(
+        video_path, interval_seconds, policy, num_frames, deduplicate,
+        detect_text, crop_to_text, text_detection_params,
+        max_workers, requests_per_minute, montage_grid, tile_size, encoder, decode_processes
+    )
 
     # Return the list of all extracted texts
-    return extracted_texts
+    return [frame_text["text"] for frame_text in frame_texts if frame_text["text"]]
+
 
+def check_encoding(video_path, encoder, num_frames=5, similarity_threshold=0.9, reference_encoder=None):
+    """Check that frames encoded by `encoder` are read as well as at reference quality.
 
-def check_and_extract_disclaimer(extracted_texts):
+    `num_frames` frames spread over the video are OCR'd twice, bypassing the cache: once
+    encoded by `reference_encoder` (by default full resolution, JPEG quality 95) and once by
+    `encoder`. Returns a report with the mean text similarity, the timestamps whose text
+    degraded below `similarity_threshold`, and the bytes and latency per request of both.
+    """
+    reference_encoder = reference_encoder or FrameEncoder(max_width=None, quality=95)
+    report = {
+        "settings": encoder.describe(),
+        "frames": 0,
+        "degraded": [],
+        "similarities": [],
+        "reference_bytes": [],
+        "bytes": [],
+        "reference_seconds": [],
+        "seconds": [],
+    }
+    for timestamp, frame in sample_frames(video_path, policy="count", num_frames=num_frames):
+        readings = []
+        for current_encoder, bytes_key, seconds_key in (
+            (reference_encoder, "reference_bytes", "reference_seconds"),
+            (encoder, "bytes", "seconds"),
+        ):
+            base64_image = frame_to_base64(frame, current_encoder)
+            start = time.perf_counter()
+            text = process_frame(base64_image, mime_type=current_encoder.mime_type, use_cache=False) or ""
+            report[seconds_key].append(time.perf_counter() - start)
+            report[bytes_key].append(len(base64_image))
+            readings.append(normalize_text(text))
+        similarity = difflib.SequenceMatcher(None, *readings).ratio()
+        report["frames"] += 1
+        report["similarities"].append(similarity)
+        if similarity < similarity_threshold:
+            report["degraded"].append(timestamp)
+
+    frames = max(report["frames"], 1)
+    summary = {
+        "settings": report["settings"],
+        "frames": report["frames"],
+        "mean_similarity": sum(report["similarities"]) / frames,
+        "degraded": report["degraded"],
+        "reference_bytes_per_request": sum(report["reference_bytes"]) / frames,
+        "bytes_per_request": sum(report["bytes"]) / frames,
+        "reference_seconds_per_request": sum(report["reference_seconds"]) / frames,
+        "seconds_per_request": sum(report["seconds"]) / frames,
+    }
+    if summary["degraded"]:
+        print(f"OCR degraded with {summary['settings']} on frames at {summary['degraded']} seconds")
+    return summary
+
+
+@traced("check_and_extract_disclaimer")
+def check_and_extract_disclaimer(extracted_texts, consolidate=True):
+    """Ask the text model whether the OCR'd texts hold a disclaimer and extract it.
+
+    `extracted_texts` holds strings or {"timestamp", "text"} dicts. With `consolidate`,
+    near-duplicate readings of the same text are merged locally first so each distinct text
+    is sent once; when timestamps are given, the result also holds the "disclaimer_timestamps"
+    of the frames the disclaimer was read on.
+    When the API call or its JSON fails, no disclaimer is reported and the result holds the "error".
+    """
     system_message = """
         You are tasked with reviewing a list of texts to identify any disclaimer or warning messages.
         Multiple texts in the list may be similar. 
@@ -166,36 +551,169 @@ def check_and_extract_disclaimer(extracted_texts):
             "disclaimer_text": ""
         }
         """
+    if consolidate:
+        clusters = consolidate_texts(extracted_texts)
+        texts = [cluster["text"] for cluster in clusters]
+        raw_texts = [item["text"] if isinstance(item, dict) else item for item in extracted_texts]
+        raw_tokens = estimate_tokens(f"{raw_texts}")
+        print(f"Consolidated {len(raw_texts)} texts into {len(texts)}, "
+              f"~{raw_tokens - estimate_tokens(f'{texts}')} of ~{raw_tokens} prompt tokens saved")
+    else:
+        clusters = None
+        texts = [item["text"] if isinstance(item, dict) else item for item in extracted_texts]
+
+    cache = get_cache()
+    cache_key = make_key("disclaimer", DISCLAIMER_MODEL, system_message, texts)
+    result = cache.get(cache_key)
+    if result is not None:
+        return _with_disclaimer_timestamps(result, clusters)
+
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"{system_message}"
-                },
-                {
-                    "role": "user",
-                    "content": f"This is the list that contains the extracted text: {extracted_texts}",
-                }
-            ],
-            model="llama-3.2-90b-text-preview",
-            response_format={"type": "json_object"},
-            temperature=0.1,
-            max_tokens=500,
-            stream=False,
-            stop=None,
-        )
+        get_rate_limiter(DISCLAIMER_MODEL).acquire(estimate_tokens(f"{system_message}{texts}"))
+        with span("groq.chat", model=DISCLAIMER_MODEL):
+            chat_completion = get_groq_client().chat.completions.create(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": f"{system_message}"
+                    },
+                    {
+                        "role": "user",
+                        "content": f"This is the list that contains the extracted text: {texts}",
+                    }
+                ],
+                model=DISCLAIMER_MODEL,
+                response_format={"type": "json_object"},
+                temperature=0.1,
+                max_tokens=500,
+                stream=False,
+                stop=None,
+            )
+            record_usage(chat_completion, DISCLAIMER_MODEL)
         print(chat_completion.choices[0].message.content)
-        result = json.loads(chat_completion.choices[0].message.content)
+        with span("json_parse"):
+            result = json.loads(chat_completion.choices[0].message.content)
+        cache.set(cache_key, result)
     except Exception as e:
         print(f"Error processing the list: {e}")
+        return {"disclaimer_is_exist": False, "disclaimer_text": "", "error": str(e)}
 
-    return result
+    return _with_disclaimer_timestamps(result, clusters)
 
 
-def video_media_processing(video_path):
-    extracted_texts = extract_and_process_frames(video_path)
-    result = check_and_extract_disclaimer(extracted_texts)
+def _with_disclaimer_timestamps(result, clusters):
+    """Add the timestamps of the cluster the extracted disclaimer comes from to the result."""
+    if not result or not result.get("disclaimer_is_exist") or not clusters:
+        return result
+    if not any(cluster["timestamps"] for cluster in clusters):
+        return result
+    disclaimer = normalize_text(result.get("disclaimer_text") or "")
+    best = max(clusters, key=lambda cluster: difflib.SequenceMatcher(None, normalize_text(cluster["text"]), disclaimer).ratio())
+    return {**result, "disclaimer_timestamps": best["timestamps"]}
+
+
+def is_text_bearing(text):
+    """True if the OCR result holds actual text."""
+    return bool(text) and text.strip().lower() != NO_TEXT_MESSAGE.lower()
+
+
+def looks_like_disclaimer(text):
+    """Cheap local check that a text reads like a disclaimer or warning."""
+    lowered = text.lower()
+    return any(keyword in lowered for keyword in DISCLAIMER_KEYWORDS)
+
+
+def scan_for_disclaimer(video_path, interval_seconds=5, stable_frames=3, end_card_first=True,
+                        on_frame=None, cancel_event=None):
+    """OCR frames incrementally and stop as soon as a complete disclaimer has been seen.
+
+    Frames are considered in sampling order, from the end of the video when `end_card_first`
+    is set since disclaimers usually sit in the last seconds. A candidate disclaimer is
+    confirmed with `check_and_extract_disclaimer` once a disclaimer-like text was read on
+    `stable_frames` consecutive text-bearing frames, every reading consolidating into the same
+    text; the remaining frames are then skipped. A candidate the check rejected is not sent
+    again. If no candidate is confirmed, every frame is processed and checked at the end,
+    including the frames held back behind a frame that could not be decoded.
+    The texts are always checked in video order, so the same frames give the same request.
+    `on_frame` is called with each {"timestamp", "text"} result.
+    """
+    timestamps = video_sample_timestamps(video_path, interval_seconds=interval_seconds)
+    if end_card_first:
+        timestamps = timestamps[::-1]
+    positions = {timestamp: position for position, timestamp in enumerate(timestamps)}
+
+    # Results arrive in completion order, they are released in sampling order
+    arrived = {}
+    next_position = 0
+    extracted_texts = []
+    candidate = None
+    streak = 0
+    # Candidates the disclaimer check did not confirm
+    rejected = []
+
+    def check():
+        return check_and_extract_disclaimer(sorted(extracted_texts, key=lambda item: item["timestamp"]))
+
+    def release(position):
+        # Returns the confirmed disclaimer, if this frame completes one
+        nonlocal candidate, streak
+        text = arrived.pop(position)
+        if not is_text_bearing(text):
+            return None
+        extracted_texts.append({"timestamp": timestamps[position], "text": text})
+        if candidate is not None and same_text(candidate, text):
+            streak += 1
+            # Keep the longest reading, OCR sometimes truncates small print
+            candidate = max(candidate, text, key=len)
+        else:
+            candidate, streak = text, 1
+
+        if streak < stable_frames or not looks_like_disclaimer(candidate):
+            return None
+        if any(same_text(candidate, rejected_text) for rejected_text in rejected):
+            return None
+        result = check()
+        if result.get("disclaimer_is_exist"):
+            print(f"Disclaimer confirmed after {position + 1} of {len(timestamps)} frames")
+            return result
+        # Not a disclaimer after all, keep scanning without sending this text again
+        rejected.append(candidate)
+        candidate, streak = None, 0
+        return None
+
+    with closing(iter_frame_texts(video_path, cancel_event=cancel_event, timestamps=timestamps)) as frame_texts:
+        for frame_text in frame_texts:
+            if on_frame is not None:
+                on_frame(frame_text)
+            arrived[positions[frame_text["timestamp"]]] = frame_text["text"]
+
+            while next_position in arrived:
+                next_position += 1
+                result = release(next_position - 1)
+                if result is not None:
+                    return result
+
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    # Frames that could not be decoded never arrive, release the results held back behind them
+    for position in sorted(arrived):
+        result = release(position)
+        if result is not None:
+            return result
+    return check()
+
+
+def video_media_processing(video_path, early_exit=False, stable_frames=3, end_card_first=True):
+    """Check that the video shows a disclaimer.
+
+    With `early_exit`, frames are scanned incrementally and scanning stops once a disclaimer
+    is confirmed, see `scan_for_disclaimer`. Otherwise every sampled frame is processed.
+    """
+    if early_exit:
+        result = scan_for_disclaimer(video_path, stable_frames=stable_frames, end_card_first=end_card_first)
+    else:
+        frame_texts = [frame_text for frame_text in extract_frame_texts(video_path) if frame_text["text"]]
+        result = check_and_extract_disclaimer(frame_texts)
     checker_flag = result['disclaimer_is_exist']
     disclaimer_text = result['disclaimer_text']
     print(f"---\n Disclaimer exist : {checker_flag},\n disclaimer text: {disclaimer_text}")